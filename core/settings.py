@@ -67,6 +67,17 @@ DATABASES = {
     }
 }
 
+# Costing rate tables are cached here under a version read from the database, so every
+# worker sees rate changes immediately with any backend. LocMemCache is per process; set
+# CACHE_BACKEND and CACHE_LOCATION to a shared cache (e.g.
+# django.core.cache.backends.redis.RedisCache) to build each version once for all workers
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'final-plan'),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -154,6 +165,9 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # Small reference tables opt out with pagination_class = None
+    'DEFAULT_PAGINATION_CLASS': 'organizations.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 
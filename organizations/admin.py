@@ -3,9 +3,9 @@ from django import forms
 from .models import (
     Organization, OrganizationUser, StrategicObjective, 
     Program, StrategicInitiative, PerformanceMeasure, MainActivity,
-    ActivityBudget, ActivityCostingAssumption, InitiativeFeed,
+    SubActivity, ActivityCostingAssumption, InitiativeFeed,
     Location, LandTransport, AirTransport, PerDiem, Accommodation,
-    ParticipantCost, SessionCost, PrintingCost, SupervisorCost,ProcurementItem,Plan
+    ParticipantCost, SessionCost, PrintingCost, SupervisorCost,ProcurementItem,Plan,PlanSnapshot
 )
 admin.site.register(Plan)
 class OrganizationAdminForm(forms.ModelForm):
@@ -140,14 +140,14 @@ class MainActivityAdmin(admin.ModelAdmin):
         }),
     )
 
-@admin.register(ActivityBudget)
-class ActivityBudgetAdmin(admin.ModelAdmin):
-    list_display = ('activity', 'budget_calculation_type', 'activity_type', 'created_at')
+@admin.register(SubActivity)
+class SubActivityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'main_activity', 'budget_calculation_type', 'activity_type', 'created_at')
     list_filter = ('budget_calculation_type', 'activity_type')
-    search_fields = ('activity__name',)
+    search_fields = ('name', 'main_activity__name')
     fieldsets = (
         (None, {
-            'fields': ('activity', 'budget_calculation_type', 'activity_type')
+            'fields': ('main_activity', 'name', 'budget_calculation_type', 'activity_type')
         }),
         ('Costs', {
             'fields': (
@@ -252,3 +252,10 @@ class ProcurementItemAdmin(admin.ModelAdmin):
             'fields': ('category', 'name', 'unit', 'unit_price')
         }),
     )
+
+@admin.register(PlanSnapshot)
+class PlanSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('plan', 'version', 'created_at')
+    search_fields = ('plan__organization__name',)
+    ordering = ('plan', '-version')
+    readonly_fields = ('plan', 'version', 'data', 'created_at')
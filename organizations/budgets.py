@@ -0,0 +1,78 @@
+"""
+Database expressions for budget figures so totals can be computed in SQL
+instead of looping over sub-activities in Python.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, When, F, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+
+MONEY = DecimalField(max_digits=20, decimal_places=2)
+
+FUNDING_SOURCES = ['government_treasury', 'sdg_funding', 'partners_funding', 'other_funding']
+
+# Budget columns of a sub-activity
+BUDGET_FIELDS = [
+    'budget_calculation_type', 'estimated_cost_with_tool', 'estimated_cost_without_tool',
+    *FUNDING_SOURCES,
+    'training_details', 'meeting_workshop_details', 'procurement_details',
+    'printing_details', 'supervision_details', 'partners_details',
+]
+
+
+def estimated_cost_expression(prefix=''):
+    """Effective estimated cost of a budget row based on its calculation type"""
+    return Case(
+        When(**{f'{prefix}budget_calculation_type': 'WITH_TOOL'}, then=F(f'{prefix}estimated_cost_with_tool')),
+        default=F(f'{prefix}estimated_cost_without_tool'),
+        output_field=MONEY
+    )
+
+
+def total_funding_expression(prefix=''):
+    """Sum of all funding sources of a budget row"""
+    return (
+        F(f'{prefix}government_treasury') +
+        F(f'{prefix}sdg_funding') +
+        F(f'{prefix}partners_funding') +
+        F(f'{prefix}other_funding')
+    )
+
+
+def money_sum(expression):
+    """Sum that returns 0 instead of NULL when there are no rows"""
+    return Coalesce(Sum(expression, output_field=MONEY), Value(Decimal('0')), output_field=MONEY)
+
+
+# Annotation names used for budget totals; they deliberately differ from the
+# total_budget/total_funding properties so querysets can be annotated safely
+BUDGET_TOTAL_FIELDS = [
+    'budget_total', 'funding_total',
+    'government_treasury_total', 'sdg_funding_total', 'partners_funding_total', 'other_funding_total',
+]
+
+
+def budget_total_annotations(prefix=''):
+    """Aggregates for estimated cost, total funding and each funding source"""
+    annotations = {
+        'budget_total': money_sum(estimated_cost_expression(prefix)),
+        'funding_total': money_sum(total_funding_expression(prefix)),
+    }
+    for source in FUNDING_SOURCES:
+        annotations[f'{source}_total'] = money_sum(F(f'{prefix}{source}'))
+    return annotations
+
+
+def budget_summary_values(totals):
+    """Map the budget_total_annotations names onto the public budget field names"""
+    values = {'estimated_cost': totals['budget_total']}
+    for source in FUNDING_SOURCES:
+        values[source] = totals[f'{source}_total']
+    values['total_funding'] = totals['funding_total']
+    values['funding_gap'] = totals['budget_total'] - totals['funding_total']
+    return values
+
+
+def annotate_main_activity_budgets(queryset):
+    """Annotate main activities with the budget totals of their sub-activities in one grouped query"""
+    return queryset.annotate(**budget_total_annotations('sub_activities__'))
@@ -0,0 +1,252 @@
+"""
+Bulk writes for planning rows.
+
+Performance measures and main activities share a weight budget per
+initiative: a batch is validated as a unit, related ids are resolved with one
+query each, the weight already used by other rows is read from the locked
+initiative weight ledgers, and the rows are written with bulk_create / bulk_update in a single
+transaction. Sub-activities of a main activity are upserted the same way
+together with their budget figures.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (
+    StrategicInitiative, Organization, PerformanceMeasure, MainActivity, SubActivity,
+    InitiativeWeightLedger
+)
+from .recosting import index_costing_dependencies
+from .rollups import ensure_budget_rollups, refresh_budget_rollups
+from .table_versions import table_changed
+from .weight_ledger import LEDGER_SPECS, lock_ledgers, apply_weight_deltas
+
+
+class BulkWriteError(Exception):
+    """Raised with the per-row and per-initiative errors of a rejected batch"""
+
+    def __init__(self, errors):
+        super().__init__('Bulk write rejected')
+        self.errors = errors
+
+
+def bulk_insert(model, instances, batch_size=1000):
+    """
+    bulk_create that always leaves primary keys set on the instances, in a fixed
+    number of queries. Backends that cannot return ids from a multi-row INSERT
+    (MySQL, MariaDB before 10.5) re-select the new rows by a batch key instead:
+    rows above the highest id seen before the insert whose created_at (set per
+    instance by bulk_create) belongs to the batch. A multi-row INSERT assigns
+    ascending ids in row order, so rows sharing a created_at are matched in
+    order. Must run inside the writer's transaction, whose snapshot hides other
+    writers' rows.
+    """
+    if connection.features.can_return_rows_from_bulk_insert or not instances:
+        return model.objects.bulk_create(instances, batch_size=batch_size)
+
+    last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(instances, batch_size=batch_size)
+    by_created = {}
+    for instance in instances:
+        by_created.setdefault(instance.created_at, []).append(instance)
+    rows = model.objects.filter(
+        pk__gt=last_pk, created_at__in=list(by_created)
+    ).order_by('pk').values_list('pk', 'created_at')
+    pending = {created_at: iter(batch) for created_at, batch in by_created.items()}
+    for pk, created_at in rows:
+        instance = next(pending[created_at], None)
+        if instance is not None:
+            instance.pk = pk
+    if any(instance.pk is None for instance in instances):
+        raise RuntimeError(f'Could not read back the ids of inserted {model.__name__} rows')
+    return instances
+
+
+def _updatable_fields(model):
+    return [
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key and field.name != 'created_at'
+    ]
+
+
+def _bulk_save_weighted_rows(model, rows, label):
+    """
+    Create the rows without an id and update the rows with one.
+    Returns (instances in input order, previous (initiative_id, organization_id) of updated rows).
+    """
+    initiative_ids = {row['initiative_id'] for row in rows}
+    initiatives = StrategicInitiative.objects.in_bulk(initiative_ids)
+    organization_ids = {row['organization_id'] for row in rows if row.get('organization_id')}
+    known_organizations = set(Organization.objects.filter(id__in=organization_ids).values_list('id', flat=True))
+    update_ids = [row['id'] for row in rows if row.get('id')]
+
+    with transaction.atomic():
+        # Lock the initiative ledgers before the child rows, the same order single saves use;
+        # the weight of rows being updated is moved out so only the rest counts against each cap
+        _, _, field = LEDGER_SPECS[model]
+        ledgers = lock_ledgers(InitiativeWeightLedger, initiatives)
+        existing = model.objects.select_for_update().in_bulk(update_ids)
+        ledgers.update(lock_ledgers(
+            InitiativeWeightLedger,
+            {instance.initiative_id for instance in existing.values()} - set(ledgers)
+        ))
+        deltas = {}
+        for instance in existing.values():
+            deltas[instance.initiative_id] = deltas.get(instance.initiative_id, Decimal('0')) - instance.weight
+        used = {
+            initiative_id: getattr(ledger, field) + deltas.get(initiative_id, Decimal('0'))
+            for initiative_id, ledger in ledgers.items()
+        }
+
+        errors, instances, previous_keys, batch_weights = [], [], set(), {}
+        for index, row in enumerate(rows):
+            row_errors = []
+            initiative = initiatives.get(row['initiative_id'])
+            if initiative is None:
+                row_errors.append(f"Initiative {row['initiative_id']} does not exist")
+            if row.get('organization_id') and row['organization_id'] not in known_organizations:
+                row_errors.append(f"Organization {row['organization_id']} does not exist")
+
+            if row.get('id'):
+                instance = existing.get(row['id'])
+                if instance is None:
+                    errors.append({'index': index, 'errors': [f"{model.__name__} {row['id']} does not exist"]})
+                    continue
+                previous_keys.add((instance.initiative_id, instance.organization_id))
+                for name, value in row.items():
+                    setattr(instance, name, value)
+            else:
+                instance = model(**row)
+
+            if initiative is not None:
+                instance.initiative = initiative
+                try:
+                    instance.validate_targets()
+                except DjangoValidationError as e:
+                    row_errors.extend(e.messages)
+                # For custom rows, inherit the organization from the initiative if not set
+                if not instance.organization_id and initiative.organization_id:
+                    instance.organization_id = initiative.organization_id
+                batch_weights[initiative.pk] = batch_weights.get(initiative.pk, Decimal('0')) + instance.weight
+
+            if row_errors:
+                errors.append({'index': index, 'errors': row_errors})
+            instances.append(instance)
+
+        for initiative_id, weight in batch_weights.items():
+            initiative = initiatives[initiative_id]
+            total = round(used.get(initiative_id, Decimal('0')) + weight, 2)
+            cap = model.weight_cap(initiative)
+            if total > cap:
+                errors.append({
+                    'initiative': initiative_id,
+                    'errors': [f'Total weight of {label} for {initiative.name} ({total}) cannot exceed {cap}'],
+                })
+
+        if errors:
+            raise BulkWriteError(errors)
+
+        created = [instance for instance in instances if instance.pk is None]
+        updated = [instance for instance in instances if instance.pk is not None]
+        bulk_insert(model, created)
+        now = timezone.now()
+        for instance in updated:
+            instance.updated_at = now
+        model.objects.bulk_update(updated, _updatable_fields(model))
+        # bulk writes send no signals
+        table_changed(model)
+
+        for instance in instances:
+            deltas[instance.initiative_id] = deltas.get(instance.initiative_id, Decimal('0')) + instance.weight
+        apply_weight_deltas(ledgers, field, deltas)
+
+    return instances, previous_keys
+
+
+def bulk_save_performance_measures(rows):
+    """Create or update a batch of performance measures against the 35% cap of each initiative"""
+    instances, _ = _bulk_save_weighted_rows(PerformanceMeasure, rows, 'performance measures')
+    return instances
+
+
+def bulk_save_main_activities(rows):
+    """Create or update a batch of main activities against the 65% cap of each initiative"""
+    with transaction.atomic():
+        instances, previous_keys = _bulk_save_weighted_rows(MainActivity, rows, 'activities')
+        # bulk writes send no signals, so keep the budget rollups in step here
+        ensure_budget_rollups(instances)
+        refresh_budget_rollups(
+            main_activity_ids=[instance.pk for instance in instances],
+            initiative_keys=previous_keys
+        )
+    return instances
+
+
+def budget_errors(sub_activities):
+    """
+    Check estimated cost > 0 and funding <= estimated cost for a whole batch in one pass.
+    Returns {position: [messages]}.
+    """
+    errors = {}
+    for position, sub_activity in enumerate(sub_activities):
+        cost, funding = sub_activity.estimated_cost, sub_activity.total_funding
+        if cost <= 0:
+            errors.setdefault(position, []).append('Estimated cost must be greater than 0')
+        if funding > cost:
+            errors.setdefault(position, []).append(
+                f'Total funding ({funding}) cannot exceed estimated cost ({cost})'
+            )
+    return errors
+
+
+def bulk_save_sub_activities(main_activity, rows):
+    """
+    Upsert a batch of sub-activities with their budgets under one main activity:
+    rows with an id update that sub-activity, the rest are created.
+    """
+    errors = []
+    update_ids = [row['id'] for row in rows if row.get('id')]
+
+    with transaction.atomic():
+        existing = SubActivity.objects.filter(main_activity=main_activity).in_bulk(update_ids)
+
+        instances, indexes = [], []
+        for index, row in enumerate(rows):
+            if row.get('id'):
+                instance = existing.get(row['id'])
+                if instance is None:
+                    errors.append({
+                        'index': index,
+                        'errors': [f"Sub-activity {row['id']} does not belong to main activity {main_activity.pk}"],
+                    })
+                    continue
+                for name, value in row.items():
+                    setattr(instance, name, value)
+            else:
+                instance = SubActivity(main_activity=main_activity, **row)
+            instances.append(instance)
+            indexes.append(index)
+
+        for position, messages in budget_errors(instances).items():
+            errors.append({'index': indexes[position], 'errors': messages})
+        if errors:
+            raise BulkWriteError(sorted(errors, key=lambda error: error['index']))
+
+        created = [instance for instance in instances if instance.pk is None]
+        updated = [instance for instance in instances if instance.pk is not None]
+        bulk_insert(SubActivity, created)
+        now = timezone.now()
+        for instance in updated:
+            instance.updated_at = now
+        SubActivity.objects.bulk_update(updated, _updatable_fields(SubActivity))
+
+        # bulk writes send no signals, so keep the costing dependency index, budget rollups and table version in step here
+        table_changed(SubActivity)
+        index_costing_dependencies(instances)
+        ensure_budget_rollups([main_activity])
+        refresh_budget_rollups(main_activity_ids=[main_activity.pk])
+
+    return instances
@@ -0,0 +1,85 @@
+"""
+Conditional GET for the API viewsets.
+
+Responses carry an ETag derived from cheap validators rather than from the
+serialized body: the version of the listed model's table for a list, the
+updated_at of a detail row, and the version of every table the serializer
+reads through relations (ConditionalGetMixin.conditional_models), read from
+organizations.table_versions in one query. A request whose If-None-Match
+still matches gets a 304 before anything is serialized.
+
+A list is not validated by its own rows: a COUNT and MAX(updated_at) over
+the filtered queryset costs about as much as the page itself on the large
+plan and activity lists. Any write to the table changes the ETag of every
+list of it, which only costs a full response.
+
+Every validator is read from the database, so all workers agree on it
+without a shared cache. Last-Modified is sent for information only: a
+deleted row does not move it, so only the ETag is trusted for revalidation.
+Responses are marked private and no-cache so browsers always revalidate
+instead of reusing a copy on their own heuristics.
+"""
+import calendar
+import hashlib
+from datetime import datetime
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .table_versions import table_versions
+
+
+def _latest(state):
+    latest = None
+    for value in state:
+        if isinstance(value, (list, tuple)):
+            value = _latest(value)
+        if isinstance(value, datetime) and (latest is None or value > latest):
+            latest = value
+    return latest
+
+
+def conditional_response(request, state, build):
+    """
+    304 when the request's If-None-Match matches the ETag of state, otherwise
+    build() with ETag, Last-Modified and Cache-Control set
+    """
+    renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+    validator = repr((getattr(request.user, 'pk', None), request.get_full_path(), renderer, state))
+    etag = quote_etag(hashlib.sha256(validator.encode('utf-8')).hexdigest()[:32])
+    latest = _latest(state)
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+        if not 200 <= response.status_code < 300:
+            return response
+    response['ETag'] = etag
+    if latest is not None:
+        response['Last-Modified'] = http_date(calendar.timegm(latest.utctimetuple()))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    ETag revalidation for list and retrieve. conditional_models lists the
+    tables a viewset's serializer reads besides its own model (related names,
+    nested rows, computed trees).
+    """
+    conditional_models = ()
+
+    def list_state(self):
+        """Versions of the listed model's table and of the tables its serializer reads"""
+        return table_versions((self.get_queryset().model, *self.conditional_models))
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request, self.list_state(), lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        state = [instance.pk, instance.updated_at, table_versions(self.conditional_models)]
+        return conditional_response(request, state, lambda: Response(self.get_serializer(instance).data))
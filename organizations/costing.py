@@ -0,0 +1,496 @@
+"""
+Server-side costing engine.
+
+Recomputes the cost of a training, meeting/workshop, supervision, printing or
+procurement sub-activity from the detail payload its costing tool stores
+(training_details, meeting_workshop_details, ...) against the rate tables,
+following the formulas of the matching component in src/components. Rates
+are read from rate_cache, so a batch of quotes reads no database.
+
+Transport routes keep the price the planner entered; a route without one is
+priced from the transport tables. The tools' built-in prices (printing per
+page, training participant/session costs) are used only when the rate table
+has no row for that type.
+"""
+from decimal import Decimal, InvalidOperation
+
+from .rate_cache import RateTables
+
+CENT = Decimal('0.01')
+
+# Fallback prices built into the costing tools
+TRAINING_PARTICIPANT_COSTS = {'FLASH_DISK': Decimal('500'), 'STATIONARY': Decimal('200'), 'ALL': Decimal('700')}
+TRAINING_SESSION_COSTS = {
+    'FLIP_CHART': Decimal('300'), 'MARKER': Decimal('150'), 'TONER_PAPER': Decimal('1000'), 'ALL': Decimal('1000'),
+}
+TRAINING_ACCOMMODATION_PRICES = {
+    'BED': Decimal('1500'), 'LUNCH': Decimal('400'), 'DINNER': Decimal('500'),
+    'FULL_BOARD': Decimal('2400'), 'HALL_REFRESHMENT': Decimal('800'),
+}
+PRINTING_PRICES_PER_PAGE = {
+    'MANUAL': Decimal('50'), 'BOOKLET': Decimal('40'), 'LEAFLET': Decimal('30'), 'BROCHURE': Decimal('35'),
+}
+LEGACY_LAND_TRANSPORT_PRICE = Decimal('1000')
+LEGACY_AIR_TRANSPORT_PRICE = Decimal('5000')
+
+# Cost components of a quote breakdown; a quote's total is their sum times 'sessions' (1 when absent)
+COST_COMPONENTS = [
+    'per_diem', 'accommodation', 'land_transport', 'air_transport', 'participant_costs',
+    'session_costs', 'supervisor_costs', 'printing', 'procurement', 'other_costs',
+]
+
+
+class CostingError(ValueError):
+    """Raised for an activity type without a costing tool or a malformed detail payload"""
+
+
+def _number(value, default=Decimal('0')):
+    """Decimal of value, or default when it is missing, zero or not a number (JavaScript's Number(x) || default)"""
+    if isinstance(value, bool) or value in (None, ''):
+        return default
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return default
+    if not number.is_finite() or number == 0:
+        return default
+    return number
+
+
+def _id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _list(details, key):
+    value = details.get(key)
+    return value if isinstance(value, list) else []
+
+
+def _cost_types(entries):
+    """Cost types of a tool's checklist: plain strings, or {'costType': ...} rows in the training tool"""
+    types = []
+    for entry in entries:
+        cost_type = entry.get('costType') if isinstance(entry, dict) else entry
+        if cost_type:
+            types.append(str(cost_type).upper())
+    return types
+
+
+def _locations(details):
+    return [location for location in _list(details, 'additionalLocations') if isinstance(location, dict)]
+
+
+class LineItems(list):
+    """Cost lines of a quote, each one unit price times a quantity in a cost category"""
+
+    def add(self, category, unit_price, quantity=Decimal('1'), location_id=None, detail='', location_name=None):
+        """Record a line and return its amount; transport lines name their destination instead of an id"""
+        amount = unit_price * quantity
+        if amount:
+            self.append({
+                'category': category, 'location': location_id, 'location_name': location_name,
+                'detail': str(detail or '')[:100], 'quantity': quantity, 'unit_price': unit_price, 'amount': amount,
+            })
+        return amount
+
+
+def _route_price(route, rates, table):
+    price = _number(route.get('price'))
+    if price:
+        return price
+    origin = rates.location_id(route.get('originName') or route.get('origin'))
+    destination = rates.location_id(route.get('destinationName') or route.get('destination'))
+    if table == 'land_transports':
+        row = rates.land_transport(origin, destination, route.get('tripType') or 'SINGLE')
+    else:
+        row = rates.air_transport(origin, destination)
+    return _number(row['price']) if row else Decimal('0')
+
+
+def _routes_total(details, rates, lines):
+    """(land, air) cost of the transport routes"""
+    totals = []
+    for key, table, category in (
+        ('landTransportRoutes', 'land_transports', 'land_transport'),
+        ('airTransportRoutes', 'air_transports', 'air_transport'),
+    ):
+        total = Decimal('0')
+        for route in _list(details, key):
+            if isinstance(route, dict):
+                total += lines.add(
+                    category, _route_price(route, rates, table), _number(route.get('participants'), Decimal('1')),
+                    detail=route.get('tripType') if table == 'land_transports' else '',
+                    location_name=route.get('destinationName') or route.get('destination')
+                )
+        totals.append(total)
+    return tuple(totals)
+
+
+def _transport(details, rates, lines, land_count_key=None, air_count_key=None):
+    """(land, air) transport cost; tools with legacy head counts price them when no route was added"""
+    zero = (Decimal('0'), Decimal('0'))
+    if not details.get('transportRequired'):
+        return zero
+    if land_count_key is None or _list(details, 'landTransportRoutes') or _list(details, 'airTransportRoutes'):
+        return _routes_total(details, rates, lines)
+    return (
+        lines.add('land_transport', LEGACY_LAND_TRANSPORT_PRICE, _number(details.get(land_count_key))),
+        lines.add('air_transport', LEGACY_AIR_TRANSPORT_PRICE, _number(details.get(air_count_key))),
+    )
+
+
+def _lodging(details, lodging):
+    """Breakdown entries for the per diem or accommodation cost, depending on the tool's cost mode"""
+    if details.get('costMode') == 'accommodation':
+        return {'per_diem': Decimal('0'), 'accommodation': lodging}
+    return {'per_diem': lodging, 'accommodation': Decimal('0')}
+
+
+def _table_sum(rates, table, price_field):
+    """Price of the 'ALL' option: the sum of every other row of the table"""
+    return sum(
+        (_number(row[price_field]) for key, row in rates.table(table).items() if key != 'ALL'),
+        Decimal('0')
+    )
+
+
+def _result(total, lines=(), **breakdown):
+    """Quote of a tool; its lines are repeated for each session so their amounts add up to the total"""
+    sessions = breakdown.get('sessions', Decimal('1'))
+    return {
+        'total': total.quantize(CENT),
+        'breakdown': {name: value.quantize(CENT) for name, value in breakdown.items()},
+        'lines': [
+            dict(
+                line, quantity=(line['quantity'] * sessions).quantize(CENT),
+                unit_price=line['unit_price'].quantize(CENT), amount=(line['amount'] * sessions).quantize(CENT)
+            )
+            for line in lines
+        ],
+    }
+
+
+def quote_training(details, rates):
+    """TrainingCostingTool: per diem or accommodation, transport, participant and session costs, times sessions"""
+    location = rates.get('locations', _id(details.get('trainingLocationId')))
+    if location is None:
+        return _result(Decimal('0'))
+    days = _number(details.get('numberOfDays'))
+    participants = _number(details.get('numberOfParticipants'))
+    sessions = _number(details.get('numberOfSessions'), Decimal('1'))
+    locations = [loc for loc in _locations(details) if loc.get('locationId')]
+    lines = LineItems()
+
+    lodging = Decimal('0')
+    if details.get('costMode') == 'accommodation':
+        service_type = details.get('selectedAccommodationType') or 'BED'
+
+        def accommodation_price(location_row):
+            row = rates.accommodation(location_row['id'] if location_row else None, service_type)
+            if row:
+                return _number(row['price'])
+            price = TRAINING_ACCOMMODATION_PRICES.get(service_type, TRAINING_ACCOMMODATION_PRICES['BED'])
+            return price * Decimal('1.1') if location_row and location_row['is_hardship_area'] else price
+
+        lodging = lines.add(
+            'accommodation', accommodation_price(location), participants * days, location['id'], service_type
+        )
+        for loc in locations:
+            lodging += lines.add(
+                'accommodation', accommodation_price(rates.get('locations', _id(loc['locationId']))),
+                _number(loc.get('participants')) * _number(loc.get('days')), _id(loc['locationId']), service_type
+            )
+    else:
+        def default_per_diem(location_row):
+            amount = Decimal('1200') if location_row and location_row['region'] == 'Addis Ababa' else Decimal('1100')
+            return amount + (Decimal('200') if location_row and location_row['is_hardship_area'] else Decimal('0'))
+
+        per_diem = rates.per_diem(location['id'])
+        if per_diem:
+            hardship = Decimal('200') if location['is_hardship_area'] else Decimal('0')
+            daily = _number(per_diem['amount'], Decimal('1200')) + _number(per_diem['hardship_allowance_amount'], hardship)
+        else:
+            daily = default_per_diem(location)
+        lodging = lines.add('per_diem', daily, participants * days, location['id'])
+        for loc in locations:
+            row = rates.per_diem(_id(loc['locationId']))
+            if row:
+                daily = _number(row['amount']) + _number(row['hardship_allowance_amount'])
+            else:
+                daily = default_per_diem(rates.get('locations', _id(loc['locationId'])))
+            lodging += lines.add(
+                'per_diem', daily, _number(loc.get('participants')) * _number(loc.get('days')), _id(loc['locationId'])
+            )
+
+    land_transport, air_transport = _transport(details, rates, lines)
+
+    def table_price(table, cost_type, fallbacks):
+        if cost_type == 'ALL' and rates.table(table):
+            return _table_sum(rates, table, 'price')
+        row = rates.get(table, cost_type)
+        return _number(row['price']) if row else fallbacks.get(cost_type, Decimal('0'))
+
+    participant_costs = sum((
+        lines.add(
+            'participant_costs', table_price('participant_costs', cost_type, TRAINING_PARTICIPANT_COSTS),
+            participants, detail=cost_type
+        )
+        for cost_type in _cost_types(_list(details, 'additionalParticipantCosts'))
+    ), Decimal('0'))
+    session_costs = sum((
+        lines.add(
+            'session_costs', table_price('session_costs', cost_type, TRAINING_SESSION_COSTS),
+            sessions, detail=cost_type
+        )
+        for cost_type in _cost_types(_list(details, 'additionalSessionCosts'))
+    ), Decimal('0'))
+    other = lines.add('other_costs', _number(details.get('otherCosts')))
+
+    subtotal = lodging + land_transport + air_transport + participant_costs + session_costs + other
+    return _result(
+        subtotal * sessions, lines, **_lodging(details, lodging),
+        land_transport=land_transport, air_transport=air_transport, participant_costs=participant_costs,
+        session_costs=session_costs, other_costs=other, subtotal=subtotal, sessions=sessions
+    )
+
+
+def quote_meeting_workshop(details, rates):
+    """MeetingWorkshopCostingTool: per diem or accommodation types, participant/session costs and transport, times sessions"""
+    location = rates.get('locations', _id(details.get('trainingLocation') or details.get('location')))
+    if location is None:
+        return _result(Decimal('0'))
+    days = _number(details.get('numberOfDays'))
+    participants = _number(details.get('numberOfParticipants'))
+    sessions = _number(details.get('numberOfSessions'), Decimal('1'))
+    locations = _locations(details)
+    lines = LineItems()
+
+    # As in the tool, extra locations are only costed when the main location has a rate
+    lodging = Decimal('0')
+    if details.get('costMode', 'perdiem') == 'perdiem':
+        per_diem = rates.per_diem(location['id'])
+        if per_diem:
+            lodging = lines.add(
+                'per_diem', _number(per_diem['amount']) + _number(per_diem['hardship_allowance_amount']),
+                participants * days, location['id']
+            )
+            for loc in locations:
+                row = rates.per_diem(_id(loc.get('locationId')))
+                if loc.get('locationId') and row:
+                    lodging += lines.add(
+                        'per_diem', _number(row['amount']) + _number(row['hardship_allowance_amount']),
+                        _number(loc.get('participants')) * _number(loc.get('days')), _id(loc['locationId'])
+                    )
+    else:
+        for service_type in _list(details, 'selectedAccommodationTypes'):
+            accommodation = rates.accommodation(location['id'], service_type)
+            if not accommodation:
+                continue
+            lodging += lines.add(
+                'accommodation', _number(accommodation['price']), participants * days, location['id'], service_type
+            )
+            for loc in locations:
+                row = rates.accommodation(_id(loc.get('locationId')), service_type)
+                if loc.get('locationId') and row:
+                    lodging += lines.add(
+                        'accommodation', _number(row['price']),
+                        _number(loc.get('participants')) * _number(loc.get('days')), _id(loc['locationId']),
+                        service_type
+                    )
+
+    extra_participants = sum((_number(loc.get('participants')) for loc in locations), Decimal('0'))
+    participant_types = _cost_types(_list(details, 'additionalParticipantCosts'))
+    if 'ALL' in participant_types:
+        participant_costs = lines.add(
+            'participant_costs', _table_sum(rates, 'participant_costs', 'price'),
+            participants + extra_participants, detail='ALL'
+        )
+    else:
+        participant_costs = Decimal('0')
+        for cost_type in participant_types:
+            row = rates.get('participant_costs', cost_type)
+            if row:
+                participant_costs += lines.add(
+                    'participant_costs', _number(row['price']), participants + extra_participants, detail=cost_type
+                )
+
+    session_types = _cost_types(_list(details, 'additionalSessionCosts'))
+    if 'ALL' in session_types:
+        session_costs = lines.add('session_costs', _table_sum(rates, 'session_costs', 'price'), sessions, detail='ALL')
+    else:
+        session_costs = Decimal('0')
+        for cost_type in session_types:
+            row = rates.get('session_costs', cost_type)
+            if row:
+                session_costs += lines.add('session_costs', _number(row['price']), sessions, detail=cost_type)
+
+    land_transport, air_transport = _transport(
+        details, rates, lines, 'landTransportParticipants', 'airTransportParticipants'
+    )
+    other = lines.add('other_costs', _number(details.get('otherCosts')))
+
+    subtotal = lodging + participant_costs + session_costs + land_transport + air_transport + other
+    return _result(
+        subtotal * sessions, lines, **_lodging(details, lodging),
+        land_transport=land_transport, air_transport=air_transport, participant_costs=participant_costs,
+        session_costs=session_costs, other_costs=other, subtotal=subtotal, sessions=sessions
+    )
+
+
+def quote_supervision(details, rates):
+    """SupervisionCostingTool: per diem, bed for all but the last day, transport and supervisor costs, times sessions"""
+    location = rates.get('locations', _id(details.get('trainingLocation')))
+    if location is None:
+        return _result(Decimal('0'))
+    days = _number(details.get('numberOfDays'))
+    supervisors = _number(details.get('numberOfSupervisors'))
+    sessions = _number(details.get('numberOfSessions'), Decimal('1'))
+    locations = [loc for loc in _locations(details) if loc.get('locationId')]
+    lines = LineItems()
+
+    per_diem_total = Decimal('0')
+    per_diem = rates.per_diem(location['id'])
+    if per_diem:
+        per_diem_total = lines.add(
+            'per_diem', _number(per_diem['amount']) + _number(per_diem['hardship_allowance_amount']),
+            supervisors * days, location['id']
+        )
+        for loc in locations:
+            row = rates.per_diem(_id(loc['locationId']))
+            if row:
+                per_diem_total += lines.add(
+                    'per_diem', _number(row['amount']) + _number(row['hardship_allowance_amount']),
+                    _number(loc.get('supervisors')) * _number(loc.get('days')), _id(loc['locationId'])
+                )
+
+    accommodation_total = Decimal('0')
+    bed = rates.accommodation(location['id'], 'BED')
+    if days > 1 and bed:
+        accommodation_total = lines.add(
+            'accommodation', _number(bed['price']), supervisors * (days - 1), location['id'], 'BED'
+        )
+        for loc in locations:
+            loc_days = _number(loc.get('days'))
+            row = rates.accommodation(_id(loc['locationId']), 'BED')
+            if loc_days > 1 and row:
+                accommodation_total += lines.add(
+                    'accommodation', _number(row['price']), _number(loc.get('supervisors')) * (loc_days - 1),
+                    _id(loc['locationId']), 'BED'
+                )
+
+    land_transport, air_transport = _transport(
+        details, rates, lines, 'landTransportSupervisors', 'airTransportSupervisors'
+    )
+
+    extra_supervisors = sum((_number(loc.get('supervisors')) for loc in locations), Decimal('0'))
+    cost_types = _cost_types(_list(details, 'additionalSupervisorCosts'))
+    if 'ALL' in cost_types:
+        supervisor_costs = lines.add(
+            'supervisor_costs', _table_sum(rates, 'supervisor_costs', 'amount'),
+            supervisors + extra_supervisors, detail='ALL'
+        )
+    else:
+        supervisor_costs = Decimal('0')
+        for cost_type in cost_types:
+            row = rates.get('supervisor_costs', cost_type)
+            if row:
+                supervisor_costs += lines.add(
+                    'supervisor_costs', _number(row['amount']), supervisors + extra_supervisors, detail=cost_type
+                )
+    other = lines.add('other_costs', _number(details.get('otherCosts')))
+
+    subtotal = per_diem_total + accommodation_total + land_transport + air_transport + supervisor_costs + other
+    return _result(
+        subtotal * sessions, lines,
+        per_diem=per_diem_total, accommodation=accommodation_total,
+        land_transport=land_transport, air_transport=air_transport,
+        supervisor_costs=supervisor_costs, other_costs=other, subtotal=subtotal, sessions=sessions
+    )
+
+
+def quote_printing(details, rates):
+    """PrintingCostingTool: price per page of the document type times pages and copies"""
+    document_type = str(details.get('documentType') or '').upper()
+    row = rates.get('printing_costs', document_type)
+    price_per_page = _number(row['price_per_page']) if row else PRINTING_PRICES_PER_PAGE.get(document_type, Decimal('0'))
+    lines = LineItems()
+    printing = lines.add(
+        'printing', price_per_page, _number(details.get('numberOfPages')) * _number(details.get('numberOfCopies')),
+        detail=document_type
+    )
+    other = lines.add('other_costs', _number(details.get('otherCosts')))
+    return _result(printing + other, lines, printing=printing, other_costs=other)
+
+
+def quote_procurement(details, rates):
+    """ProcurementCostingTool: quantity times unit price of each catalogue item"""
+    lines = LineItems()
+    items_total = Decimal('0')
+    for item in _list(details, 'items'):
+        if not isinstance(item, dict) or not item.get('itemId') or not item.get('quantity'):
+            continue
+        row = rates.get('procurement_items', _id(item['itemId']))
+        if row:
+            items_total += lines.add(
+                'procurement', _number(row['unit_price']), _number(item['quantity']), detail=row['name']
+            )
+    other = lines.add('other_costs', _number(details.get('otherCosts')))
+    return _result(items_total + other, lines, procurement=items_total, other_costs=other)
+
+
+# activity type -> (detail field on SubActivity, quote function)
+COSTING_TOOLS = {
+    'Training': ('training_details', quote_training),
+    'Meeting': ('meeting_workshop_details', quote_meeting_workshop),
+    'Workshop': ('meeting_workshop_details', quote_meeting_workshop),
+    'Supervision': ('supervision_details', quote_supervision),
+    'Printing': ('printing_details', quote_printing),
+    'Procurement': ('procurement_details', quote_procurement),
+}
+
+
+def quote(activity_type, details, rates=None):
+    """{'total', 'breakdown'} for one detail payload"""
+    if activity_type not in COSTING_TOOLS:
+        raise CostingError(f'No costing tool for activity type {activity_type!r}')
+    if not isinstance(details, dict):
+        raise CostingError('Cost details must be an object')
+    _, quote_function = COSTING_TOOLS[activity_type]
+    return quote_function(details, rates or RateTables())
+
+
+def quote_sub_activity(sub_activity, rates=None):
+    """
+    Quote of a costing-tool sub-activity against its stored
+    estimated_cost_with_tool, or None when it was not costed with a tool.
+    """
+    if sub_activity.budget_calculation_type != 'WITH_TOOL' or sub_activity.activity_type not in COSTING_TOOLS:
+        return None
+    field, _ = COSTING_TOOLS[sub_activity.activity_type]
+    details = getattr(sub_activity, field) or {}
+    computed = quote(sub_activity.activity_type, details, rates)
+    stored = Decimal(str(sub_activity.estimated_cost_with_tool or 0)).quantize(CENT)
+    return {
+        'id': sub_activity.pk,
+        'activity_type': sub_activity.activity_type,
+        'stored': stored,
+        'computed': computed['total'],
+        'difference': computed['total'] - stored,
+        'matches': abs(computed['total'] - stored) <= CENT,
+        'breakdown': computed['breakdown'],
+        'lines': computed['lines'],
+    }
+
+
+def quote_sub_activities(sub_activities, rates=None):
+    """Quotes for a batch of sub-activities against one set of rates; rows without a costing tool are skipped"""
+    rates = rates or RateTables()
+    quotes = []
+    for sub_activity in sub_activities:
+        result = quote_sub_activity(sub_activity, rates)
+        if result is not None:
+            quotes.append(result)
+    return quotes
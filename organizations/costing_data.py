@@ -0,0 +1,87 @@
+"""
+Costing reference data: the rate tables the costing tools load (locations,
+transport, per diem, accommodation, participant/session/supervisor costs,
+printing and procurement) served as one bundle.
+
+The bundle is serialized once per data version and kept in Django's cache
+together with a content hash that clients revalidate with If-None-Match.
+The version is derived from the rate tables' counters in
+organizations.table_versions, which every save or delete of a rate row
+bumps, so all workers agree on it whichever cache backend is configured.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import (
+    Location, LandTransport, AirTransport, PerDiem, Accommodation,
+    ParticipantCost, SessionCost, PrintingCost, SupervisorCost, ProcurementItem, ActivityCostingAssumption
+)
+from .serializers import (
+    LocationSerializer, LandTransportSerializer, AirTransportSerializer,
+    PerDiemSerializer, AccommodationSerializer, ParticipantCostSerializer,
+    SessionCostSerializer, PrintingCostSerializer, SupervisorCostSerializer,
+    ProcurementItemSerializer
+)
+from .table_versions import table_versions
+
+# bundle key -> (model, serializer, relations the serializer reads)
+RATE_TABLES = {
+    'locations': (Location, LocationSerializer, ()),
+    'land_transports': (LandTransport, LandTransportSerializer, ('origin', 'destination')),
+    'air_transports': (AirTransport, AirTransportSerializer, ('origin', 'destination')),
+    'per_diems': (PerDiem, PerDiemSerializer, ('location',)),
+    'accommodations': (Accommodation, AccommodationSerializer, ('location',)),
+    'participant_costs': (ParticipantCost, ParticipantCostSerializer, ()),
+    'session_costs': (SessionCost, SessionCostSerializer, ()),
+    'printing_costs': (PrintingCost, PrintingCostSerializer, ()),
+    'supervisor_costs': (SupervisorCost, SupervisorCostSerializer, ()),
+    'procurement_items': (ProcurementItem, ProcurementItemSerializer, ()),
+}
+
+RATE_MODELS = [model for model, _, _ in RATE_TABLES.values()]
+
+# Models whose writes change the costing data version
+CACHED_RATE_MODELS = RATE_MODELS + [ActivityCostingAssumption]
+
+BUNDLE_CACHE_KEY = 'costing_data:bundle:{version}'
+# Bundles of versions that are no longer current expire after this many seconds
+BUNDLE_TIMEOUT = 300
+
+
+def costing_data_version():
+    """Current version of the rate tables, read from their table versions in one query"""
+    versions = repr(table_versions(CACHED_RATE_MODELS))
+    return hashlib.sha256(versions.encode('utf-8')).hexdigest()[:16]
+
+
+def build_costing_tables():
+    """{bundle key: serialized rows} for every rate table, one query per table"""
+    return {
+        name: serializer_class(
+            model.objects.select_related(*relations).order_by('pk'), many=True
+        ).data
+        for name, (model, serializer_class, relations) in RATE_TABLES.items()
+    }
+
+
+def costing_bundle():
+    """
+    {'etag', 'body'} for the current version, where body is the encoded
+    JSON response and etag the hash of the tables it contains.
+    """
+    key = BUNDLE_CACHE_KEY.format(version=costing_data_version())
+    bundle = cache.get(key)
+    if bundle is None:
+        tables = json.dumps(
+            build_costing_tables(), cls=JSONEncoder, sort_keys=True, separators=(',', ':')
+        ).encode('utf-8')
+        etag = hashlib.sha256(tables).hexdigest()[:32]
+        bundle = {
+            'etag': etag,
+            'body': b'{"etag":"' + etag.encode('ascii') + b'","tables":' + tables + b'}',
+        }
+        cache.set(key, bundle, BUNDLE_TIMEOUT)
+    return bundle
@@ -0,0 +1,103 @@
+"""
+Sparse fieldsets for the API serializers.
+
+GET requests may narrow a response with ?fields=a,b and opt into heavy
+fields with ?expand=x,y:
+
+- no parameters: the full default shape, expandable fields included;
+- ?expand= alone: every regular field plus only the named expandable ones;
+- ?fields=: only the named fields, plus any named in ?expand=.
+
+Serializers declare their expandable fields (nested rows, plan trees) and
+which relation each field reads, so the viewset's queryset only joins
+(select_related) and prefetches what the requested shape renders; a
+dropdown asking for ?fields=id,name costs one query without joins. Only
+the top-level serializer is narrowed; nested rows keep their full shape.
+"""
+from rest_framework import serializers
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def _names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(request):
+    """(fields, expand) name sets from the query string; either is None when absent"""
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+    return _names(request, 'fields'), _names(request, 'expand')
+
+
+def field_included(name, serializer_class, request):
+    """Whether a field of serializer_class is part of the shape the request asks for"""
+    fields, expand = requested_fields(request)
+    if fields is not None:
+        return name in fields or name in (expand or ())
+    if expand is not None and name in serializer_class.expandable_fields:
+        return name in expand
+    return True
+
+
+def any_field_included(names, serializer_class, request):
+    return any(field_included(name, serializer_class, request) for name in names)
+
+
+def shape_queryset(queryset, serializer_class, request):
+    """
+    Join and prefetch the relations the requested fields read. The default
+    shape only adds to what the queryset already loads; a narrowed one
+    replaces it.
+    """
+    select = getattr(serializer_class, 'select_fields', {})
+    prefetch = getattr(serializer_class, 'prefetch_fields', {})
+    fields, expand = requested_fields(request)
+    if fields is None and expand is None:
+        return queryset.select_related(*set(select.values())).prefetch_related(*set(prefetch.values()))
+
+    selected = {path for name, path in select.items() if field_included(name, serializer_class, request)}
+    prefetched = {path for name, path in prefetch.items() if field_included(name, serializer_class, request)}
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if selected:
+        queryset = queryset.select_related(*selected)
+    if prefetched:
+        queryset = queryset.prefetch_related(*prefetched)
+    return queryset
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin narrowing the top-level serializer to ?fields= / ?expand=.
+    select_fields and prefetch_fields map a field to the relation it reads.
+    """
+    expandable_fields = ()
+    select_fields = {}
+    prefetch_fields = {}
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self._is_root():
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if field_included(name, type(self), request)
+        }
+
+
+class SparseFieldsViewMixin:
+    """Viewset mixin loading only the relations of the requested serializer shape"""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return shape_queryset(queryset, self.get_serializer_class(), self.request)
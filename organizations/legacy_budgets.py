@@ -0,0 +1,64 @@
+"""
+Compatibility path for the legacy budget endpoints.
+
+Budgets used to be duplicated into ActivityBudget rows; they now live only
+on SubActivity. The legacy endpoints (main-activities/<pk>/budget/,
+sub-activities/<pk>/add-budget/, activity-budgets/, ...) read and write
+those columns through ActivityBudgetSerializer, which keeps the old
+response shape. The activity-level budget of a main activity is its
+sub-activity marked is_legacy_budget.
+
+They keep the former ActivityBudget validation too: funding may not exceed
+the estimated cost, but a zero-cost budget is accepted, which
+SubActivity.clean() would refuse.
+"""
+from rest_framework import serializers
+
+from .budgets import BUDGET_FIELDS
+from .models import SubActivity
+from .serializers import ActivityBudgetSerializer
+
+
+def activity_budgets(main_activity_id):
+    """Sub-activities holding the activity-level budget of a main activity"""
+    return SubActivity.objects.filter(main_activity_id=main_activity_id, is_legacy_budget=True)
+
+
+def legacy_budget_sub_activity(activity, data):
+    """The sub-activity holding an activity-level budget, unsaved when the activity has none yet"""
+    sub_activity = activity_budgets(activity.pk).order_by('pk').first()
+    if sub_activity is None:
+        sub_activity = SubActivity(
+            main_activity=activity,
+            name=activity.name,
+            activity_type=data.get('activity_type') or 'Other',
+            is_legacy_budget=True
+        )
+    return sub_activity
+
+
+def save_budget(sub_activity, data):
+    """Validate budget columns from a legacy payload, write them onto the sub-activity and save it"""
+    serializer = ActivityBudgetSerializer(sub_activity, data=data, partial=True)
+    serializer.is_valid(raise_exception=True)
+    for field, value in serializer.validated_data.items():
+        setattr(sub_activity, field, value)
+    if sub_activity.total_funding > sub_activity.estimated_cost:
+        raise serializers.ValidationError([
+            f'Total funding ({sub_activity.total_funding}) cannot exceed '
+            f'estimated cost ({sub_activity.estimated_cost})'
+        ])
+    sub_activity.save()
+    return sub_activity
+
+
+def has_budget(sub_activity):
+    return bool(sub_activity.estimated_cost or sub_activity.total_funding)
+
+
+def clear_budget(sub_activity):
+    """Reset the budget columns of a sub-activity to their defaults"""
+    for field in BUDGET_FIELDS:
+        setattr(sub_activity, field, SubActivity._meta.get_field(field).get_default())
+    sub_activity.save()
+    return sub_activity
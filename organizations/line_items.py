@@ -0,0 +1,84 @@
+"""
+Normalized cost lines of costing-tool rows.
+
+The costing engine itemizes every quote (per diem at a location, each
+transport route, participant cost type, procurement item, ...). Those lines
+are stored as CostingLineItem rows for each sub-activity costed with a
+tool, so totals per category, location or region are one
+GROUP BY instead of parsing every details blob.
+
+Lines are replaced whenever a row's rate dependencies are indexed or it is
+re-costed (see recosting.py); `recost_sub_activities --reindex` backfills
+them for existing rows.
+"""
+from django.db.models import Count, Sum
+
+from .costing import CostingError
+from .models import CostingLineItem
+from .rate_cache import rate_index
+
+# report grouping name -> lookup from CostingLineItem
+LINE_ITEM_GROUPS = {
+    'category': 'category',
+    'detail': 'detail',
+    'location': 'location_id',
+    'region': 'location__region',
+    'activity_type': 'sub_activity__activity_type',
+    'main_activity': 'sub_activity__main_activity_id',
+    'organization': 'sub_activity__main_activity__organization_id',
+}
+
+
+def _line_location(line, locations, location_ids):
+    if line['location'] in locations:
+        return line['location']
+    return location_ids.get(line['location_name'])
+
+
+def replace_line_items(quotes, version=None):
+    """
+    Replace the line items of sub-activities from {pk: quote or None}; rows without a quote get none.
+    version is the costing data version the quotes were computed at.
+    """
+    CostingLineItem.objects.filter(sub_activity_id__in=list(quotes)).delete()
+    if not any(quotes.values()):
+        return
+    locations = rate_index('locations', version)
+    location_ids = {row['name']: location_id for location_id, row in locations.items()}
+    CostingLineItem.objects.bulk_create([
+        CostingLineItem(
+            category=line['category'],
+            location_id=_line_location(line, locations, location_ids),
+            detail=line['detail'],
+            quantity=line['quantity'],
+            unit_price=line['unit_price'],
+            amount=line['amount'],
+            sub_activity_id=pk
+        )
+        for pk, quote in quotes.items() if quote
+        for line in quote['lines']
+    ], batch_size=1000)
+
+
+def line_item_totals(group_by, sub_activities=None):
+    """
+    Amount, quantity and line count of line items grouped by the named
+    LINE_ITEM_GROUPS, optionally limited to a sub-activity queryset
+    """
+    unknown = set(group_by) - set(LINE_ITEM_GROUPS)
+    if unknown:
+        raise CostingError(f'Unknown line item groups: {", ".join(sorted(unknown))}')
+    queryset = CostingLineItem.objects.all()
+    if sub_activities is not None:
+        queryset = queryset.filter(sub_activity__in=sub_activities.values('pk'))
+    lookups = [LINE_ITEM_GROUPS[name] for name in group_by]
+    rows = queryset.order_by().values(*lookups).annotate(
+        amount_total=Sum('amount'), quantity_total=Sum('quantity'), line_count=Count('pk')
+    ).order_by(*lookups)
+    return [
+        dict(
+            {name: row[lookup] for name, lookup in zip(group_by, lookups)},
+            amount=row['amount_total'], quantity=row['quantity_total'], lines=row['line_count']
+        )
+        for row in rows
+    ]
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from organizations.models import Organization
+from organizations.org_tree import descendant_ids, rebuild_organization_closure
+
+
+class Command(BaseCommand):
+    help = (
+        'Build a synthetic organization tree inside a rolled-back transaction and compare '
+        'subtree lookups through the ancestry index with per-level children lookups'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=5000, help='Number of synthetic organizations')
+        parser.add_argument('--branching', type=int, default=6, help='Children per organization')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per strategy')
+
+    def handle(self, *args, **options):
+        size, branching, repeat = options['size'], options['branching'], options['repeat']
+
+        with transaction.atomic():
+            root = self._build_tree(size, branching)
+            rebuild_organization_closure()
+
+            self._report('ancestry index', repeat, lambda: list(
+                Organization.objects.filter(id__in=descendant_ids(root.pk)).values_list('id', flat=True)
+            ))
+            self._report('children walk', repeat, lambda: self._walk_children(root))
+
+            transaction.set_rollback(True)
+
+    def _build_tree(self, size, branching):
+        types = [choice for choice, _ in Organization.ORGANIZATION_TYPES]
+        root = Organization.objects.create(name='Benchmark root', type=types[0])
+        frontier, created, level = [root], 1, 1
+        while created < size:
+            children = []
+            for parent in frontier:
+                for _ in range(branching):
+                    if created + len(children) >= size:
+                        break
+                    children.append(Organization(
+                        name=f'Benchmark {created + len(children)}',
+                        type=types[min(level, len(types) - 1)],
+                        parent=parent
+                    ))
+            frontier = Organization.objects.bulk_create(children)
+            created += len(frontier)
+            level += 1
+        self.stdout.write(f'Built {created} organizations over {level} levels')
+        return root
+
+    def _walk_children(self, organization):
+        ids, stack = [], [organization]
+        while stack:
+            current = stack.pop()
+            ids.append(current.pk)
+            stack.extend(current.children.all())
+        return ids
+
+    def _report(self, label, repeat, lookup):
+        timings, query_count = [], [0]
+
+        def count_queries(execute, sql, params, many, context):
+            query_count[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = lookup()
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f'{label:>15}: {len(result)} organizations, {query_count[0] // repeat} queries, '
+            f'best {min(timings) * 1000:.1f} ms, mean {sum(timings) / len(timings) * 1000:.1f} ms'
+        )
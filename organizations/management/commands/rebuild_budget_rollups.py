@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from organizations.rollups import rebuild_budget_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute all main activity and initiative budget rollups from sub-activities'
+
+    def handle(self, *args, **options):
+        activities, initiatives = rebuild_budget_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rollups for {activities} main activities and {initiatives} initiative/organization pairs'
+        ))
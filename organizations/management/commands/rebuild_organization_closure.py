@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from organizations.org_tree import rebuild_organization_closure
+
+
+class Command(BaseCommand):
+    help = 'Recompute the organization ancestry index (OrganizationClosure) from Organization.parent'
+
+    def handle(self, *args, **options):
+        count = rebuild_organization_closure()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ancestry index for {count} organizations'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from organizations.weight_ledger import rebuild_weight_ledgers
+
+
+class Command(BaseCommand):
+    help = 'Recompute the initiative and objective weight ledgers from their child rows'
+
+    def handle(self, *args, **options):
+        counts = rebuild_weight_ledgers()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt weight ledgers for {counts['InitiativeWeightLedger']} initiatives "
+            f"and {counts['ObjectiveWeightLedger']} objectives"
+        ))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from organizations.recosting import recost_pending, recost_all, reindex_costing_dependencies
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-cost the sub-activities that depend on rates changed since the last run '
+        '(run periodically, e.g. from cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='Re-cost every costing-tool row, not just the affected ones')
+        parser.add_argument(
+            '--reindex', action='store_true',
+            help='Only rebuild the rate dependency index and cost line items (e.g. after upgrading), without changing costs'
+        )
+
+    def handle(self, *args, **options):
+        if options['reindex']:
+            indexed = reindex_costing_dependencies(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Indexed rate dependencies and line items of {indexed} rows'))
+            return
+
+        if options['all']:
+            counts = recost_all(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Re-costed {counts['checked']} rows, {counts['changed']} changed"
+            ))
+            return
+
+        counts = recost_pending(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['keys']} changed rate keys: re-costed {counts['checked']} dependent rows, "
+            f"{counts['changed']} changed"
+        ))
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from organizations.costing import quote_sub_activities
+from organizations.models import SubActivity
+from organizations.rate_cache import RateTables
+
+
+class Command(BaseCommand):
+    help = 'Recompute the cost of every costing-tool sub-activity and report those that differ from the stored cost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='Only sub-activities of this organization')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--show', type=int, default=20, help='Mismatches to list')
+
+    def handle(self, *args, **options):
+        queryset = SubActivity.objects.filter(budget_calculation_type='WITH_TOOL').order_by('pk')
+        if options['organization']:
+            queryset = queryset.filter(main_activity__organization_id=options['organization'])
+
+        rates = RateTables()
+        checked, mismatches, drift = 0, [], Decimal('0')
+        for quoted in quote_sub_activities(queryset.iterator(chunk_size=options['chunk_size']), rates):
+            checked += 1
+            if not quoted['matches']:
+                mismatches.append(quoted)
+                drift += quoted['difference']
+
+        for quoted in mismatches[:options['show']]:
+            self.stdout.write(
+                f"Sub-activity {quoted['id']} ({quoted['activity_type']}): "
+                f"stored {quoted['stored']}, computed {quoted['computed']}"
+            )
+        style = self.style.SUCCESS if not mismatches else self.style.WARNING
+        self.stdout.write(style(
+            f'Checked {checked} sub-activities: {len(mismatches)} differ from the rate tables '
+            f'(net difference {drift})'
+        ))
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.10 on 2026-10-17 00:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BUDGET_FIELDS = [
+    'budget_calculation_type', 'estimated_cost_with_tool', 'estimated_cost_without_tool',
+    'government_treasury', 'sdg_funding', 'partners_funding', 'other_funding',
+    'training_details', 'meeting_workshop_details', 'procurement_details',
+    'printing_details', 'supervision_details', 'partners_details',
+]
+
+
+def attach_legacy_budgets(apps, schema_editor):
+    """Give every legacy activity-level budget its own sub-activity"""
+    ActivityBudget = apps.get_model('organizations', 'ActivityBudget')
+    SubActivity = apps.get_model('organizations', 'SubActivity')
+
+    # Budgets attached to nothing cannot be kept once sub_activity is required
+    ActivityBudget.objects.filter(sub_activity__isnull=True, activity__isnull=True).delete()
+
+    for budget in ActivityBudget.objects.filter(sub_activity__isnull=True).select_related('activity'):
+        sub_activity = SubActivity.objects.create(
+            main_activity=budget.activity,
+            name=budget.activity.name,
+            activity_type=budget.activity_type or 'Other',
+            **{field: getattr(budget, field) for field in BUDGET_FIELDS}
+        )
+        budget.sub_activity = sub_activity
+        budget.save(update_fields=['sub_activity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0018_plan_selected_objectives_weights'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitybudget',
+            name='activity',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='legacy_budgets', to='organizations.mainactivity'),
+        ),
+        migrations.CreateModel(
+            name='SubActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('activity_type', models.CharField(choices=[('Training', 'Training'), ('Meeting', 'Meeting'), ('Workshop', 'Workshop'), ('Printing', 'Printing'), ('Supervision', 'Supervision'), ('Procurement', 'Procurement'), ('Other', 'Other')], default='Other', max_length=20)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('budget_calculation_type', models.CharField(choices=[('WITH_TOOL', 'With Tool'), ('WITHOUT_TOOL', 'Without Tool')], default='WITHOUT_TOOL', max_length=20)),
+                ('estimated_cost_with_tool', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('estimated_cost_without_tool', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('government_treasury', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('sdg_funding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('partners_funding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('other_funding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('training_details', models.JSONField(blank=True, null=True)),
+                ('meeting_workshop_details', models.JSONField(blank=True, null=True)),
+                ('procurement_details', models.JSONField(blank=True, null=True)),
+                ('printing_details', models.JSONField(blank=True, null=True)),
+                ('supervision_details', models.JSONField(blank=True, null=True)),
+                ('partners_details', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('main_activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sub_activities', to='organizations.mainactivity')),
+            ],
+            options={
+                'verbose_name': 'Sub Activity',
+                'verbose_name_plural': 'Sub Activities',
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='activitybudget',
+            name='sub_activity',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='budget', to='organizations.subactivity'),
+        ),
+        migrations.RunPython(attach_legacy_budgets, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='activitybudget',
+            name='sub_activity',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='budget', to='organizations.subactivity'),
+        ),
+    ]
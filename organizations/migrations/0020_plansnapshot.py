@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-17 00:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0019_alter_activitybudget_activity_subactivity_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('data', models.JSONField(help_text='Rendered objectives/initiatives/measures/activities payload')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='organizations.plan')),
+            ],
+            options={
+                'ordering': ['-version'],
+                'unique_together': {('plan', 'version')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.10 on 2026-10-17 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0020_plansnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitybudget',
+            index=models.Index(fields=['created_at', 'id'], name='idx_budget_created'),
+        ),
+        migrations.AddIndex(
+            model_name='mainactivity',
+            index=models.Index(fields=['created_at', 'id'], name='idx_activity_created'),
+        ),
+        migrations.AddIndex(
+            model_name='performancemeasure',
+            index=models.Index(fields=['created_at', 'id'], name='idx_measure_created'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['created_at', 'id'], name='idx_plan_created'),
+        ),
+        migrations.AddIndex(
+            model_name='planreview',
+            index=models.Index(fields=['reviewed_at', 'id'], name='idx_review_reviewed'),
+        ),
+        migrations.AddIndex(
+            model_name='strategicinitiative',
+            index=models.Index(fields=['created_at', 'id'], name='idx_initiative_created'),
+        ),
+        migrations.AddIndex(
+            model_name='subactivity',
+            index=models.Index(fields=['created_at', 'id'], name='idx_subactivity_created'),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 4.2.10 on 2026-10-17 00:37
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Case, F, Sum, When
+
+FUNDING_SOURCES = ['government_treasury', 'sdg_funding', 'partners_funding', 'other_funding']
+TOTAL_FIELDS = ['estimated_cost', *FUNDING_SOURCES, 'total_funding', 'funding_gap']
+
+
+def build_budget_rollups(apps, schema_editor):
+    MainActivity = apps.get_model('organizations', 'MainActivity')
+    SubActivity = apps.get_model('organizations', 'SubActivity')
+    MainActivityBudgetRollup = apps.get_model('organizations', 'MainActivityBudgetRollup')
+    InitiativeBudgetRollup = apps.get_model('organizations', 'InitiativeBudgetRollup')
+
+    money = models.DecimalField(max_digits=20, decimal_places=2)
+    rows = SubActivity.objects.order_by().values('main_activity_id').annotate(
+        estimated_cost=Sum(Case(
+            When(budget_calculation_type='WITH_TOOL', then=F('estimated_cost_with_tool')),
+            default=F('estimated_cost_without_tool'),
+            output_field=money
+        )),
+        **{source: Sum(source) for source in FUNDING_SOURCES}
+    )
+    totals = {}
+    for row in rows:
+        values = {field: row[field] or Decimal('0') for field in ['estimated_cost', *FUNDING_SOURCES]}
+        values['total_funding'] = sum(values[source] for source in FUNDING_SOURCES)
+        values['funding_gap'] = values['estimated_cost'] - values['total_funding']
+        totals[row['main_activity_id']] = values
+
+    zero = {field: Decimal('0') for field in TOTAL_FIELDS}
+    activity_rollups = []
+    initiative_totals = {}
+    for activity_id, initiative_id, organization_id in MainActivity.objects.values_list(
+        'id', 'initiative_id', 'organization_id'
+    ):
+        values = totals.get(activity_id, zero)
+        activity_rollups.append(MainActivityBudgetRollup(main_activity_id=activity_id, **values))
+        summed = initiative_totals.setdefault((initiative_id, organization_id), dict(zero))
+        for field, value in values.items():
+            summed[field] += value
+
+    MainActivityBudgetRollup.objects.bulk_create(activity_rollups, batch_size=1000)
+    InitiativeBudgetRollup.objects.bulk_create([
+        InitiativeBudgetRollup(initiative_id=initiative_id, organization_id=organization_id, **values)
+        for (initiative_id, organization_id), values in initiative_totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0021_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MainActivityBudgetRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estimated_cost', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('government_treasury', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('sdg_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('partners_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('other_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('funding_gap', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('main_activity', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='budget_rollup', to='organizations.mainactivity')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='InitiativeBudgetRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estimated_cost', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('government_treasury', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('sdg_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('partners_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('other_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_funding', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('funding_gap', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('initiative', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budget_rollups', to='organizations.strategicinitiative')),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='initiative_budget_rollups', to='organizations.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization'], name='idx_initiative_rollup_org')],
+                'unique_together': {('initiative', 'organization')},
+            },
+        ),
+        migrations.RunPython(build_budget_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.10 on 2026-10-17 00:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_closure(apps, schema_editor):
+    Organization = apps.get_model('organizations', 'Organization')
+    OrganizationClosure = apps.get_model('organizations', 'OrganizationClosure')
+
+    parents = dict(Organization.objects.values_list('id', 'parent_id'))
+    rows = []
+    for organization_id in parents:
+        current, depth, seen = organization_id, 0, set()
+        while current is not None and current not in seen:
+            seen.add(current)
+            rows.append(OrganizationClosure(ancestor_id=current, descendant_id=organization_id, depth=depth))
+            current, depth = parents.get(current), depth + 1
+    OrganizationClosure.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0022_budget_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='organizations.organization')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='organizations.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='idx_closure_descendant')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
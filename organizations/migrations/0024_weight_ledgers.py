@@ -0,0 +1,66 @@
+# Generated by Django 4.2.10 on 2026-10-17 00:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def build_weight_ledgers(apps, schema_editor):
+    StrategicInitiative = apps.get_model('organizations', 'StrategicInitiative')
+    PerformanceMeasure = apps.get_model('organizations', 'PerformanceMeasure')
+    MainActivity = apps.get_model('organizations', 'MainActivity')
+    InitiativeWeightLedger = apps.get_model('organizations', 'InitiativeWeightLedger')
+    ObjectiveWeightLedger = apps.get_model('organizations', 'ObjectiveWeightLedger')
+
+    def totals(model, parent_field):
+        rows = model.objects.exclude(**{f'{parent_field}__isnull': True}).order_by().values(
+            parent_field
+        ).annotate(total=Sum('weight'))
+        return {row[parent_field]: row['total'] or 0 for row in rows}
+
+    measures = totals(PerformanceMeasure, 'initiative_id')
+    activities = totals(MainActivity, 'initiative_id')
+    InitiativeWeightLedger.objects.bulk_create([
+        InitiativeWeightLedger(
+            initiative_id=initiative_id,
+            measures_weight=measures.get(initiative_id, 0),
+            activities_weight=activities.get(initiative_id, 0)
+        )
+        for initiative_id in StrategicInitiative.objects.values_list('id', flat=True)
+    ], batch_size=1000)
+
+    initiatives = totals(StrategicInitiative, 'strategic_objective_id')
+    ObjectiveWeightLedger.objects.bulk_create([
+        ObjectiveWeightLedger(strategic_objective_id=objective_id, initiatives_weight=weight)
+        for objective_id, weight in initiatives.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0023_organizationclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectiveWeightLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('initiatives_weight', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('strategic_objective', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='weight_ledger', to='organizations.strategicobjective')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InitiativeWeightLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('measures_weight', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('activities_weight', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('initiative', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='weight_ledger', to='organizations.strategicinitiative')),
+            ],
+        ),
+        migrations.RunPython(build_weight_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-17 00:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0024_weight_ledgers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRecost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rate_table', models.CharField(max_length=30)),
+                ('rate_key', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('rate_table', 'rate_key')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CostingDependency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rate_table', models.CharField(max_length=30)),
+                ('rate_key', models.CharField(max_length=100)),
+                ('activity_budget', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='costing_dependencies', to='organizations.activitybudget')),
+                ('sub_activity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='costing_dependencies', to='organizations.subactivity')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rate_table', 'rate_key'], name='idx_costing_dependency_rate')],
+            },
+        ),
+    ]
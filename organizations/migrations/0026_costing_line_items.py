@@ -0,0 +1,31 @@
+# Generated by Django 4.2.10 on 2026-10-17 01:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0025_costing_dependencies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostingLineItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=30)),
+                ('detail', models.CharField(blank=True, default='', max_length=100)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('activity_budget', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='costing_line_items', to='organizations.activitybudget')),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='costing_line_items', to='organizations.location')),
+                ('sub_activity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='costing_line_items', to='organizations.subactivity')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'location'], name='idx_line_item_category_loc')],
+            },
+        ),
+    ]
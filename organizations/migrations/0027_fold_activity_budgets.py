@@ -0,0 +1,130 @@
+import logging
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+logger = logging.getLogger(__name__)
+
+BUDGET_FIELDS = [
+    'budget_calculation_type', 'estimated_cost_with_tool', 'estimated_cost_without_tool',
+    'government_treasury', 'sdg_funding', 'partners_funding', 'other_funding',
+    'training_details', 'meeting_workshop_details', 'procurement_details',
+    'printing_details', 'supervision_details', 'partners_details',
+]
+
+
+def _budget_defaults(SubActivity):
+    return {field: SubActivity._meta.get_field(field).get_default() for field in BUDGET_FIELDS}
+
+
+def fold_activity_budgets(apps, schema_editor):
+    """
+    Copy each legacy budget onto its sub-activity wherever the budget columns
+    differ, and mark the sub-activity of every budget that carried the legacy
+    activity link as is_legacy_budget (the lowest one per main activity).
+    Sub-activities whose own figures are overwritten are logged so they can be
+    checked by hand.
+    """
+    ActivityBudget = apps.get_model('organizations', 'ActivityBudget')
+    SubActivity = apps.get_model('organizations', 'SubActivity')
+    CostingDependency = apps.get_model('organizations', 'CostingDependency')
+    CostingLineItem = apps.get_model('organizations', 'CostingLineItem')
+
+    # Dependencies and line items of legacy budgets go with them
+    CostingDependency.objects.filter(sub_activity__isnull=True).delete()
+    CostingLineItem.objects.filter(sub_activity__isnull=True).delete()
+
+    defaults = _budget_defaults(SubActivity)
+    changed = []
+    legacy = {}
+    budgets = ActivityBudget.objects.select_related('sub_activity').order_by('sub_activity_id')
+    for budget in budgets.iterator(chunk_size=500):
+        sub_activity = budget.sub_activity
+        if budget.activity_id is not None:
+            legacy.setdefault(budget.activity_id, sub_activity.pk)
+        current = {field: getattr(sub_activity, field) for field in BUDGET_FIELDS}
+        folded = {field: getattr(budget, field) for field in BUDGET_FIELDS}
+        if current == folded:
+            continue
+        if current != defaults:
+            logger.warning(
+                'Sub-activity %s had budget figures that differed from its ActivityBudget %s '
+                'and were overwritten by it: %s',
+                sub_activity.pk, budget.pk, ', '.join(
+                    f'{field}={current[field]}' for field in BUDGET_FIELDS
+                    if current[field] != defaults[field] and not field.endswith('_details')
+                )
+            )
+        for field, value in folded.items():
+            setattr(sub_activity, field, value)
+        if budget.activity_type:
+            sub_activity.activity_type = budget.activity_type
+        sub_activity.updated_at = max(sub_activity.updated_at, budget.updated_at)
+        changed.append(sub_activity)
+    SubActivity.objects.bulk_update(changed, BUDGET_FIELDS + ['activity_type', 'updated_at'], batch_size=500)
+
+    ids = list(legacy.values())
+    for start in range(0, len(ids), 500):
+        SubActivity.objects.filter(pk__in=ids[start:start + 500]).update(is_legacy_budget=True)
+
+
+def restore_activity_budgets(apps, schema_editor):
+    """
+    Recreate an ActivityBudget for every sub-activity holding budget figures,
+    linked to its main activity when it is the legacy activity-level budget.
+    Their costing dependencies and line items are rebuilt by
+    recost_sub_activities --reindex.
+    """
+    ActivityBudget = apps.get_model('organizations', 'ActivityBudget')
+    SubActivity = apps.get_model('organizations', 'SubActivity')
+
+    defaults = _budget_defaults(SubActivity)
+    budgets = []
+    for sub_activity in SubActivity.objects.order_by('pk').iterator(chunk_size=500):
+        values = {field: getattr(sub_activity, field) for field in BUDGET_FIELDS}
+        if values == defaults and not sub_activity.is_legacy_budget:
+            continue
+        budgets.append(ActivityBudget(
+            sub_activity_id=sub_activity.pk,
+            activity_id=sub_activity.main_activity_id if sub_activity.is_legacy_budget else None,
+            activity_type=sub_activity.activity_type,
+            **values
+        ))
+    ActivityBudget.objects.bulk_create(budgets, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0026_costing_line_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subactivity',
+            name='is_legacy_budget',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fold_activity_budgets, restore_activity_budgets),
+        migrations.RemoveField(
+            model_name='costingdependency',
+            name='activity_budget',
+        ),
+        migrations.RemoveField(
+            model_name='costinglineitem',
+            name='activity_budget',
+        ),
+        migrations.AlterField(
+            model_name='costingdependency',
+            name='sub_activity',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='costing_dependencies', to='organizations.subactivity'),
+        ),
+        migrations.AlterField(
+            model_name='costinglineitem',
+            name='sub_activity',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='costing_line_items', to='organizations.subactivity'),
+        ),
+        migrations.DeleteModel(
+            name='ActivityBudget',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-17 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0027_fold_activity_budgets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organizationuser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='planreview',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from decimal import Decimal
 from django.utils import timezone
@@ -37,9 +37,41 @@ class Organization(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def clean(self):
+        super().clean()
+        from .org_tree import is_in_subtree
+        if self.pk and self.parent_id and is_in_subtree(self.parent_id, self.pk):
+            raise ValidationError('An organization cannot be placed under itself or one of its descendants')
+    
     def __str__(self):
         return self.name
 
+class OrganizationClosure(models.Model):
+    """
+    Ancestry index for the Organization tree: one row per (ancestor, descendant)
+    pair including the depth-0 self row. Maintained by organizations.signals.
+    """
+    ancestor = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='descendant_links'
+    )
+    descendant = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='ancestor_links'
+    )
+    depth = models.PositiveIntegerField()
+    
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='idx_closure_descendant'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
 class OrganizationUser(models.Model):
     ROLES = [
         ('ADMIN', 'Admin'),
@@ -51,6 +83,7 @@ class OrganizationUser(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='users')
     role = models.CharField(max_length=20, choices=ROLES)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ('user', 'organization', 'role')
@@ -201,6 +234,7 @@ class StrategicInitiative(models.Model):
         indexes = [
             models.Index(fields=['program'], name='idx_initiative_program'),
             models.Index(fields=['organization'], name='idx_initiative_organization'),
+            models.Index(fields=['created_at', 'id'], name='idx_initiative_created'),
         ]
     
     def clean(self):
@@ -226,14 +260,9 @@ class StrategicInitiative(models.Model):
             effective_weight = self.strategic_objective.get_effective_weight()
             
             # When parent has planner_weight, ensure initiatives' total weight equals effective_weight
-            initiatives = StrategicInitiative.objects.filter(strategic_objective=self.strategic_objective)
-            
-            # Exclude self if already saved
-            if self.pk:
-                initiatives = initiatives.exclude(pk=self.pk)
-            
-            # Calculate total weight of existing initiatives
-            total_weight = initiatives.aggregate(models.Sum('weight'))['weight__sum'] or 0
+            # Weight of the other initiatives comes from the objective's weight ledger
+            from .weight_ledger import allocated_to_siblings
+            total_weight = allocated_to_siblings(self)
             
             # Add the current initiative's weight
             total_weight += self.weight
@@ -252,6 +281,13 @@ class StrategicInitiative(models.Model):
                     f"({effective_weight}) exactly"
                 )
     
+    def save(self, *args, **kwargs):
+        from .weight_ledger import lock_parent_ledgers, record_weight
+        with transaction.atomic():
+            lock_parent_ledgers(self)
+            super().save(*args, **kwargs)
+            record_weight(self)
+    
     def __str__(self):
         return self.name
 
@@ -323,7 +359,15 @@ class PerformanceMeasure(models.Model):
     
     def clean(self):
         super().clean()
+        self.validate_targets()
+        self.validate_weight_total()
         
+        # For custom performance measures, inherit the organization from the initiative if not set
+        if not self.organization and self.initiative and self.initiative.organization:
+            self.organization = self.initiative.organization
+    
+    def validate_targets(self):
+        """Row-level rules (weight, periods, quarterly targets) that need no queries"""
         # Validate weight is positive
         if self.weight <= 0:
             raise ValidationError('Weight must be positive')
@@ -379,25 +423,32 @@ class PerformanceMeasure(models.Model):
             if not (self.q1_target == self.annual_target and self.q2_target == self.annual_target and 
                    self.q3_target == self.annual_target and self.q4_target == self.annual_target):
                 raise ValidationError('For constant targets, all quarterly targets must equal annual target')
-        
-        
+    
+    @staticmethod
+    def weight_cap(initiative):
+        """Upper bound for the summed weight of an initiative's performance measures"""
+        return Decimal('35')
+    
+    def validate_weight_total(self):
         # Validate measure weight against total for initiative (total should be 35%)
-        total_weight = PerformanceMeasure.objects.filter(
-            initiative=self.initiative
-        ).exclude(id=self.id).aggregate(
-            total=models.Sum('weight')
-        )['total'] or Decimal('0')
+        # Weight of the other measures comes from the initiative's ledger row, locked until the save commits
+        from .weight_ledger import allocated_to_siblings
+        total_weight = allocated_to_siblings(self)
         
-        if total_weight + self.weight > 35:
+        if total_weight + self.weight > self.weight_cap(self.initiative):
             raise ValidationError(f'Total weight of performance measures ({total_weight + self.weight}%) cannot exceed 35%')
-
-        # For custom performance measures, inherit the organization from the initiative if not set
-        if not self.organization and self.initiative and self.initiative.organization:
-            self.organization = self.initiative.organization
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='idx_measure_created'),
+        ]
     
     def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+        from .weight_ledger import record_weight
+        with transaction.atomic():
+            self.clean()
+            super().save(*args, **kwargs)
+            record_weight(self)
     
     def __str__(self):
         return self.name
@@ -468,29 +519,43 @@ class MainActivity(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def budget_totals(self):
+        """
+        Budget totals of all sub-activities. Uses the values from
+        annotate_main_activity_budgets when present, otherwise runs one aggregate query.
+        """
+        from .budgets import BUDGET_TOTAL_FIELDS, budget_total_annotations
+        if all(hasattr(self, field) for field in BUDGET_TOTAL_FIELDS):
+            return {field: getattr(self, field) for field in BUDGET_TOTAL_FIELDS}
+        return self.sub_activities.aggregate(**budget_total_annotations())
+    
     @property
     def total_budget(self):
         """Calculate total budget from all sub-activities"""
-        return sum(sub.budget.estimated_cost for sub in self.sub_activities.all() if hasattr(sub, 'budget'))
+        return self.budget_totals()['budget_total']
     
     @property 
     def total_funding(self):
         """Calculate total funding from all sub-activities"""
-        total = 0
-        for sub in self.sub_activities.all():
-            if hasattr(sub, 'budget'):
-                total += (sub.budget.government_treasury + sub.budget.sdg_funding + 
-                         sub.budget.partners_funding + sub.budget.other_funding)
-        return total
+        return self.budget_totals()['funding_total']
     
     @property
     def funding_gap(self):
         """Calculate total funding gap from all sub-activities"""
-        return max(0, self.total_budget - self.total_funding)
+        totals = self.budget_totals()
+        return max(0, totals['budget_total'] - totals['funding_total'])
     
     def clean(self):
         super().clean()
+        self.validate_targets()
+        self.validate_weight_total()
         
+        # For custom activities, inherit the organization from the initiative if not set
+        if not self.organization and self.initiative and self.initiative.organization:
+            self.organization = self.initiative.organization
+    
+    def validate_targets(self):
+        """Row-level rules (weight, periods, quarterly targets) that need no queries"""
         # Validate weight is positive
         if self.weight <= 0:
             raise ValidationError('Weight must be positive')
@@ -546,14 +611,17 @@ class MainActivity(models.Model):
             if not (self.q1_target == self.annual_target and self.q2_target == self.annual_target and 
                    self.q3_target == self.annual_target and self.q4_target == self.annual_target):
                 raise ValidationError('For constant targets, all quarterly targets must equal annual target')
-        
-        
+    
+    @staticmethod
+    def weight_cap(initiative):
+        """Upper bound for the summed weight of an initiative's main activities (65% of its weight)"""
+        return round(Decimal(str(initiative.weight)) * Decimal('0.65'), 2)
+    
+    def validate_weight_total(self):
         # Validate activity weight against total for initiative (total should be 65% of initiative weight)
-        total_weight = MainActivity.objects.filter(
-            initiative=self.initiative
-        ).exclude(id=self.id).aggregate(
-            total=models.Sum('weight')
-        )['total'] or Decimal('0')
+        # Weight of the other activities comes from the initiative's ledger row, locked until the save commits
+        from .weight_ledger import allocated_to_siblings
+        total_weight = allocated_to_siblings(self)
         
         # Get the expected weight (65% of initiative weight)
         # initiative_weight = float(self.initiative.weight)
@@ -570,13 +638,18 @@ class MainActivity(models.Model):
                  f'Total weight of activities ({total_weight_after}) cannot exceed {max_allowed_weight} '
                   f'(65% of initiative weight {initiative_weight})'
              )
-        # For custom activities, inherit the organization from the initiative if not set
-        if not self.organization and self.initiative and self.initiative.organization:
-            self.organization = self.initiative.organization
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='idx_activity_created'),
+        ]
     
     def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+        from .weight_ledger import record_weight
+        with transaction.atomic():
+            self.clean()
+            super().save(*args, **kwargs)
+            record_weight(self)
     
     def __str__(self):
         return self.name
@@ -613,6 +686,8 @@ class SubActivity(models.Model):
         default='Other'
     )
     description = models.TextField(null=True, blank=True)
+    # Holds the activity-level budget written through the legacy main activity budget endpoints
+    is_legacy_budget = models.BooleanField(default=False)
     
     # Budget fields
     budget_calculation_type = models.CharField(
@@ -706,141 +781,169 @@ class SubActivity(models.Model):
         verbose_name = "Sub Activity"
         verbose_name_plural = "Sub Activities"
         ordering = ['created_at']
-class ActivityBudget(models.Model):
-    BUDGET_CALCULATION_TYPES = [
-        ('WITH_TOOL', 'With Tool'),
-        ('WITHOUT_TOOL', 'Without Tool')
-    ]
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='idx_subactivity_created'),
+        ]
+class BudgetRollup(models.Model):
+    """
+    Persisted budget totals maintained from SubActivity rows by organizations.rollups
+    """
+    estimated_cost = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    government_treasury = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    sdg_funding = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    partners_funding = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    other_funding = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_funding = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    funding_gap = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
     
-    ACTIVITY_TYPES = [
-        ('Training', 'Training'),
-        ('Meeting', 'Meeting'),
-        ('Workshop', 'Workshop'),
-        ('Printing', 'Printing'),
-        ('Supervision', 'Supervision'),
-        ('Procurement', 'Procurement'),
-        ('Other', 'Other')
+    TOTAL_FIELDS = [
+        'estimated_cost', 'government_treasury', 'sdg_funding', 'partners_funding',
+        'other_funding', 'total_funding', 'funding_gap'
     ]
+    
+    class Meta:
+        abstract = True
 
-    sub_activity = models.OneToOneField(
-        'SubActivity',
+class MainActivityBudgetRollup(BudgetRollup):
+    main_activity = models.OneToOneField(
+        MainActivity,
         on_delete=models.CASCADE,
-        related_name='budget'
+        related_name='budget_rollup'
     )
-    # Keep activity field for backward compatibility during migration
-    activity = models.ForeignKey(
-        'MainActivity',
+    
+    def __str__(self):
+        return f"Budget rollup for {self.main_activity}"
+
+class InitiativeBudgetRollup(BudgetRollup):
+    initiative = models.ForeignKey(
+        StrategicInitiative,
         on_delete=models.CASCADE,
-        related_name='legacy_budgets',
-        null=True,
-        blank=True
-    )
-    budget_calculation_type = models.CharField(
-        max_length=20,
-        choices=BUDGET_CALCULATION_TYPES,
-        default='WITHOUT_TOOL'
+        related_name='budget_rollups'
     )
-    activity_type = models.CharField(
-        max_length=20,
-        choices=ACTIVITY_TYPES,
+    organization = models.ForeignKey(
+        Organization,
+        on_delete=models.CASCADE,
+        related_name='initiative_budget_rollups',
         null=True,
         blank=True
     )
-    estimated_cost_with_tool = models.DecimalField(
-        max_digits=12,
-        decimal_places=2,
-        default=0
-    )
-    estimated_cost_without_tool = models.DecimalField(
-        max_digits=12,
-        decimal_places=2,
-        default=0
-    )
-    government_treasury = models.DecimalField(
-        max_digits=12,
-        decimal_places=2,
-        default=0
-    )
-    sdg_funding = models.DecimalField(
-        max_digits=12,
-        decimal_places=2,
-        default=0
-    )
-    partners_funding = models.DecimalField(
-        max_digits=12,
-        decimal_places=2,
-        default=0
+    
+    class Meta:
+        unique_together = ('initiative', 'organization')
+        indexes = [
+            models.Index(fields=['organization'], name='idx_initiative_rollup_org'),
+        ]
+    
+    def __str__(self):
+        return f"Budget rollup for {self.initiative} ({self.organization})"
+
+class InitiativeWeightLedger(models.Model):
+    """
+    Weight allocated to the performance measures and main activities of an
+    initiative, maintained by organizations.weight_ledger under row locks
+    """
+    initiative = models.OneToOneField(
+        StrategicInitiative,
+        on_delete=models.CASCADE,
+        related_name='weight_ledger'
     )
-    other_funding = models.DecimalField(
-        max_digits=12,
-        decimal_places=2,
-        default=0
+    measures_weight = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    activities_weight = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Weight ledger for {self.initiative}"
+
+class ObjectiveWeightLedger(models.Model):
+    """
+    Weight allocated to the initiatives of a strategic objective, maintained
+    by organizations.weight_ledger under row locks
+    """
+    strategic_objective = models.OneToOneField(
+        StrategicObjective,
+        on_delete=models.CASCADE,
+        related_name='weight_ledger'
     )
-    training_details = models.JSONField(null=True, blank=True)
-    meeting_workshop_details = models.JSONField(null=True, blank=True)
-    procurement_details = models.JSONField(null=True, blank=True)
-    printing_details = models.JSONField(null=True, blank=True)
-    supervision_details = models.JSONField(null=True, blank=True)
-    partners_details = models.JSONField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    initiatives_weight = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Weight ledger for {self.strategic_objective}"
 
-    def clean(self):
-        super().clean()
+class CostingDependency(models.Model):
+    """
+    A rate table natural key read when a costing-tool sub-activity was last
+    costed, maintained by organizations.recosting
+    """
+    rate_table = models.CharField(max_length=30)
+    rate_key = models.CharField(max_length=100)
+    sub_activity = models.ForeignKey(
+        SubActivity,
+        on_delete=models.CASCADE,
+        related_name='costing_dependencies'
+    )
 
-        # Get the estimated cost based on calculation type
-        estimated_cost = (
-            self.estimated_cost_with_tool 
-            if self.budget_calculation_type == 'WITH_TOOL'
-            else self.estimated_cost_without_tool
-        )
+    class Meta:
+        indexes = [
+            models.Index(fields=['rate_table', 'rate_key'], name='idx_costing_dependency_rate'),
+        ]
 
-        # Calculate total funding
-        total_funding = (
-            self.government_treasury +
-            self.sdg_funding +
-            self.partners_funding +
-            self.other_funding
-        )
+    def __str__(self):
+        return f"{self.rate_table}[{self.rate_key}]"
 
-        # Validate total funding against estimated cost
-        if total_funding > estimated_cost:
-            raise ValidationError(
-                f'Total funding ({total_funding}) cannot exceed estimated cost ({estimated_cost})'
-            )
+class PendingRecost(models.Model):
+    """A rate key that changed after its dependent rows were costed, waiting for the re-cost job"""
+    rate_table = models.CharField(max_length=30)
+    rate_key = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+    class Meta:
+        unique_together = ('rate_table', 'rate_key')
 
     def __str__(self):
-        if self.sub_activity:
-            return f"Budget for {self.sub_activity.main_activity.name} - {self.sub_activity.name}"
-        elif self.activity:
-            return f"Budget for {self.activity.name} (Legacy)"
-        else:
-            return "Budget (No Activity)"
+        return f"{self.rate_table}[{self.rate_key}]"
 
-    @property
-    def total_funding(self):
-        return (
-            self.government_treasury +
-            self.sdg_funding +
-            self.partners_funding +
-            self.other_funding
-        )
+class TableVersion(models.Model):
+    """Count of committed writes to one model's table, maintained by organizations.table_versions"""
+    table = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
-    @property
-    def estimated_cost(self):
-        return (
-            self.estimated_cost_with_tool 
-            if self.budget_calculation_type == 'WITH_TOOL'
-            else self.estimated_cost_without_tool
-        )
+    def __str__(self):
+        return f"{self.table} v{self.version}"
 
-    @property
-    def funding_gap(self):
-        return self.estimated_cost - self.total_funding
+class CostingLineItem(models.Model):
+    """
+    One cost line of a costing-tool sub-activity (per diem at a location, a
+    transport route, a procurement item, ...) derived from its details JSON
+    by organizations.line_items for SQL reporting
+    """
+    sub_activity = models.ForeignKey(
+        SubActivity,
+        on_delete=models.CASCADE,
+        related_name='costing_line_items'
+    )
+    category = models.CharField(max_length=30)
+    location = models.ForeignKey(
+        'Location',
+        on_delete=models.SET_NULL,
+        related_name='costing_line_items',
+        null=True,
+        blank=True
+    )
+    detail = models.CharField(max_length=100, blank=True, default='')
+    quantity = models.DecimalField(max_digits=14, decimal_places=2)
+    unit_price = models.DecimalField(max_digits=14, decimal_places=2)
+    amount = models.DecimalField(max_digits=16, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'location'], name='idx_line_item_category_loc'),
+        ]
+
+    def __str__(self):
+        return f"{self.category}: {self.amount}"
 
 class ActivityCostingAssumption(models.Model):
     ACTIVITY_TYPES = [
@@ -1169,6 +1272,11 @@ class Plan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='idx_plan_created'),
+        ]
+    
     def __str__(self):
         return f"{self.organization.name} - {self.strategic_objective} - {self.fiscal_year}"
         
@@ -1225,6 +1333,12 @@ class PlanReview(models.Model):
     status = models.CharField(max_length=20, choices=REVIEW_STATUS)
     feedback = models.TextField()
     reviewed_at = models.DateTimeField(default=timezone.now)  # Set default to current time
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['reviewed_at', 'id'], name='idx_review_reviewed'),
+        ]
     
     def clean(self):
         super().clean()
@@ -1246,4 +1360,25 @@ class PlanReview(models.Model):
         super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"Review of {self.plan} by {self.evaluator.user.username}" if self.evaluator else f"Review of {self.plan}"
\ No newline at end of file
+        return f"Review of {self.plan} by {self.evaluator.user.username}" if self.evaluator else f"Review of {self.plan}"
+
+class PlanSnapshot(models.Model):
+    """
+    Frozen copy of a plan's objectives tree taken each time the plan is submitted.
+    Reviewers read the latest snapshot instead of rebuilding the live tree.
+    """
+    plan = models.ForeignKey(
+        Plan,
+        on_delete=models.CASCADE,
+        related_name='snapshots'
+    )
+    version = models.PositiveIntegerField()
+    data = models.JSONField(help_text="Rendered objectives/initiatives/measures/activities payload")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('plan', 'version')
+        ordering = ['-version']
+    
+    def __str__(self):
+        return f"Snapshot v{self.version} of {self.plan}"
@@ -0,0 +1,195 @@
+"""
+Helpers for questions asked across the Organization hierarchy
+(Minister -> State Minister -> ... -> Desk).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from .budgets import BUDGET_TOTAL_FIELDS, budget_total_annotations, budget_summary_values
+from .models import Organization, OrganizationClosure, Plan, SubActivity
+
+
+def closure_rows(parents):
+    """
+    Yield (ancestor_id, descendant_id, depth) for a {organization_id: parent_id} map.
+    A parent chain that loops back on itself is cut where the loop starts.
+    """
+    for organization_id in parents:
+        current, depth, seen = organization_id, 0, set()
+        while current is not None and current not in seen:
+            seen.add(current)
+            yield current, organization_id, depth
+            current, depth = parents.get(current), depth + 1
+
+
+def rebuild_organization_closure():
+    """Recompute the whole ancestry index from Organization.parent"""
+    parents = dict(Organization.objects.values_list('id', 'parent_id'))
+    with transaction.atomic():
+        OrganizationClosure.objects.all().delete()
+        OrganizationClosure.objects.bulk_create(
+            [
+                OrganizationClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+                for ancestor_id, descendant_id, depth in closure_rows(parents)
+            ],
+            batch_size=5000
+        )
+    return len(parents)
+
+
+def descendant_ids(organization_id, include_self=True):
+    """Ids of an organization's subtree as a lazy queryset usable inside __in filters"""
+    links = OrganizationClosure.objects.filter(ancestor_id=organization_id)
+    if not include_self:
+        links = links.filter(depth__gt=0)
+    return links.values('descendant_id')
+
+
+def ancestor_ids(organization_id, include_self=True):
+    """Ids of an organization's ancestors as a lazy queryset usable inside __in filters"""
+    links = OrganizationClosure.objects.filter(descendant_id=organization_id)
+    if not include_self:
+        links = links.filter(depth__gt=0)
+    return links.values('ancestor_id')
+
+
+def evaluator_organization_ids(user):
+    """Organizations, with their whole subtrees, where the user holds the EVALUATOR role"""
+    return OrganizationClosure.objects.filter(
+        ancestor__users__user=user,
+        ancestor__users__role='EVALUATOR'
+    ).values('descendant_id')
+
+
+def is_in_subtree(candidate_id, organization_id):
+    """Whether candidate_id is organization_id itself or one of its descendants"""
+    return OrganizationClosure.objects.filter(ancestor_id=organization_id, descendant_id=candidate_id).exists()
+
+
+def _link_subtree(subtree, parent_id):
+    """Connect subtree [(descendant_id, depth below root)] under parent_id and all its ancestors"""
+    if parent_id is None:
+        return
+    ancestors = list(OrganizationClosure.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth'))
+    OrganizationClosure.objects.bulk_create([
+        OrganizationClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+        for ancestor_id, ancestor_depth in ancestors
+        for descendant_id, depth in subtree
+    ])
+
+
+def _unlink_subtree(organization_id):
+    """Remove the links between an organization's subtree and everything above it"""
+    subtree_ids = list(descendant_ids(organization_id).values_list('descendant_id', flat=True))
+    above_ids = list(ancestor_ids(organization_id, include_self=False).values_list('ancestor_id', flat=True))
+    if above_ids:
+        OrganizationClosure.objects.filter(ancestor_id__in=above_ids, descendant_id__in=subtree_ids).delete()
+    return subtree_ids
+
+
+def add_organization(organization):
+    """Index a newly created organization"""
+    OrganizationClosure.objects.create(ancestor=organization, descendant=organization, depth=0)
+    _link_subtree([(organization.pk, 0)], organization.parent_id)
+
+
+def move_organization(organization):
+    """Re-index an organization's subtree after its parent changed"""
+    _unlink_subtree(organization.pk)
+    subtree = list(
+        OrganizationClosure.objects.filter(ancestor_id=organization.pk).values_list('descendant_id', 'depth')
+    )
+    _link_subtree(subtree, organization.parent_id)
+
+
+def detach_organization_children(organization):
+    """
+    Before an organization is deleted its children become roots (parent is SET_NULL),
+    so unlink each child's subtree from the deleted organization's ancestors.
+    """
+    above_ids = list(ancestor_ids(organization.pk).values_list('ancestor_id', flat=True))
+    below_ids = list(descendant_ids(organization.pk, include_self=False).values_list('descendant_id', flat=True))
+    if below_ids:
+        OrganizationClosure.objects.filter(ancestor_id__in=above_ids, descendant_id__in=below_ids).delete()
+
+
+def _empty_totals():
+    return {field: Decimal('0') for field in BUDGET_TOTAL_FIELDS}
+
+
+def organization_budget_rollup(fiscal_year, statuses=None):
+    """
+    Budget and funding gap totals of every organization for a fiscal year,
+    both for the organization itself and for its whole subtree.
+
+    Direct totals come from one GROUP BY over sub-activities that belong to a
+    plan of the fiscal year; subtree totals are accumulated in a single
+    bottom-up pass over the organization tree.
+    """
+    plans = Plan.objects.filter(fiscal_year=fiscal_year)
+    if statuses:
+        plans = plans.filter(status__in=statuses)
+
+    # A sub-activity counts once even if its organization has several plans selecting the objective
+    in_plan = plans.filter(
+        organization=OuterRef('main_activity__organization'),
+        selected_objectives=OuterRef('main_activity__initiative__strategic_objective')
+    )
+    direct_rows = SubActivity.objects.filter(Exists(in_plan)).filter(
+        Q(main_activity__initiative__is_default=True) |
+        Q(main_activity__initiative__organization=F('main_activity__organization'))
+    ).order_by().values('main_activity__organization').annotate(**budget_total_annotations())
+    direct = {row['main_activity__organization']: row for row in direct_rows}
+
+    plan_counts = dict(
+        plans.order_by().values('organization').annotate(count=Count('id')).values_list('organization', 'count')
+    )
+
+    organizations = list(Organization.objects.values('id', 'name', 'type', 'parent_id'))
+    children = {}
+    for organization in organizations:
+        children.setdefault(organization['parent_id'], []).append(organization['id'])
+
+    nodes = {}
+    for organization in organizations:
+        own = direct.get(organization['id'])
+        nodes[organization['id']] = dict(
+            organization,
+            plan_count=plan_counts.get(organization['id'], 0),
+            own={field: own[field] for field in BUDGET_TOTAL_FIELDS} if own else _empty_totals(),
+            subtree=_empty_totals(),
+        )
+
+    # Depth-first order from the roots; reversing it visits children before their parents
+    order, stack, seen = [], list(children.get(None, [])), set()
+    while stack:
+        organization_id = stack.pop()
+        if organization_id in seen:
+            continue
+        seen.add(organization_id)
+        order.append(organization_id)
+        stack.extend(children.get(organization_id, []))
+
+    for organization_id in reversed(order):
+        node = nodes[organization_id]
+        for field in BUDGET_TOTAL_FIELDS:
+            node['subtree'][field] += node['own'][field]
+        parent = nodes.get(node['parent_id'])
+        if parent is not None:
+            for field in BUDGET_TOTAL_FIELDS:
+                parent['subtree'][field] += node['subtree'][field]
+
+    return [
+        {
+            'id': node['id'],
+            'name': node['name'],
+            'type': node['type'],
+            'parent': node['parent_id'],
+            'plan_count': node['plan_count'],
+            'own': budget_summary_values(node['own']),
+            'subtree': budget_summary_values(node['subtree']),
+        }
+        for node in (nodes[organization_id] for organization_id in order)
+    ]
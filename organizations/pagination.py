@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination over the indexed (created_at, id) columns.
+    Each page is an indexed range scan, so deep pages cost the same as the first.
+    Viewsets whose model has no created_at can set `keyset_ordering`.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('created_at', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'keyset_ordering', self.ordering)
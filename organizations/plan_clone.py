@@ -0,0 +1,167 @@
+"""
+Copying a plan into a new fiscal year.
+
+Cloning for another organization copies the plan header (selected objectives
+and weights) and the org-scoped tree level by level with bulk_create,
+remapping ids as each level is inserted.
+
+Initiatives, measures, activities and sub-activities are scoped by organization
+rather than by plan or fiscal year, so a clone for the same organization
+cannot get its own tree: both years would read and edit the same rows. Such a
+clone is refused unless the caller asks for the plan header alone.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import (
+    Plan, StrategicObjective, StrategicInitiative, PerformanceMeasure, MainActivity, SubActivity,
+    InitiativeWeightLedger, ObjectiveWeightLedger
+)
+from .bulk import bulk_insert
+from .plan_tree import scoped_initiatives, scoped_performance_measures, scoped_main_activities
+from .recosting import index_costing_dependencies
+from .rollups import ensure_budget_rollups, refresh_budget_rollups
+from .table_versions import table_changed
+from .weight_ledger import lock_ledgers, apply_weight_deltas
+
+# Plan header fields carried over to the clone
+PLAN_FIELDS = [
+    'planner_name', 'type', 'executive_name', 'strategic_objective_id', 'program_id', 'selected_objectives_weights'
+]
+
+
+def copy_instance(instance, **changes):
+    """Unsaved copy of a model instance without its id and timestamps"""
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in ('created_at', 'updated_at')
+    }
+    values.update(changes)
+    return type(instance)(**values)
+
+
+def _bulk_copy(model, instances, **remap):
+    """
+    Insert copies of instances with each remap[attname] applied as a function of the
+    source instance, returning {source id: copy id}.
+    """
+    copies = [
+        copy_instance(instance, **{attname: mapper(instance) for attname, mapper in remap.items()})
+        for instance in instances
+    ]
+    bulk_insert(model, copies)
+    return {instance.pk: copy.pk for instance, copy in zip(instances, copies)}
+
+
+def _weight_deltas(instances, parent_attr):
+    deltas = {}
+    for instance in instances:
+        parent_id = getattr(instance, parent_attr)
+        deltas[parent_id] = deltas.get(parent_id, Decimal('0')) + instance.weight
+    return deltas
+
+
+def copy_plan_tree(plan, organization_id):
+    """Copy the plan's organization-scoped tree to another organization; returns row counts per level"""
+    source_id = plan.organization_id
+    objective_ids = list(plan.selected_objectives.values_list('id', flat=True))
+
+    initiatives = list(scoped_initiatives(source_id).filter(strategic_objective_id__in=objective_ids))
+    custom = [initiative for initiative in initiatives if initiative.organization_id == source_id]
+    shared_ids = [initiative.pk for initiative in initiatives if initiative.organization_id != source_id]
+
+    # Lock the ledgers that gain weight before any child rows are inserted
+    objective_ledgers = lock_ledgers(ObjectiveWeightLedger, objective_ids)
+    initiative_ledgers = lock_ledgers(InitiativeWeightLedger, shared_ids)
+
+    # The copied weights are checked against each parent's cap under the same locks
+    objective_caps = {
+        objective.pk: objective.get_effective_weight()
+        for objective in StrategicObjective.objects.filter(pk__in=objective_ids)
+    }
+    shared = StrategicInitiative.objects.in_bulk(shared_ids)
+    measure_caps = {pk: PerformanceMeasure.weight_cap(initiative) for pk, initiative in shared.items()}
+    activity_caps = {pk: MainActivity.weight_cap(initiative) for pk, initiative in shared.items()}
+
+    apply_weight_deltas(
+        objective_ledgers, 'initiatives_weight', _weight_deltas(custom, 'strategic_objective_id'), objective_caps
+    )
+    initiative_map = {initiative_id: initiative_id for initiative_id in shared_ids}
+    initiative_map.update(_bulk_copy(
+        StrategicInitiative, custom,
+        organization_id=lambda initiative: organization_id
+    ))
+
+    measures = list(scoped_performance_measures(source_id).filter(initiative_id__in=initiative_map.keys()))
+    _bulk_copy(
+        PerformanceMeasure, measures,
+        initiative_id=lambda measure: initiative_map[measure.initiative_id],
+        organization_id=lambda measure: organization_id
+    )
+
+    activities = list(scoped_main_activities(source_id).filter(initiative_id__in=initiative_map.keys()))
+    activity_map = _bulk_copy(
+        MainActivity, activities,
+        initiative_id=lambda activity: initiative_map[activity.initiative_id],
+        organization_id=lambda activity: organization_id
+    )
+
+    sub_activities = list(SubActivity.objects.filter(main_activity_id__in=activity_map.keys()))
+    sub_activity_map = _bulk_copy(
+        SubActivity, sub_activities,
+        main_activity_id=lambda sub_activity: activity_map[sub_activity.main_activity_id]
+    )
+
+    # Shared initiatives gain the copied weights; ledgers of the new custom initiatives are built from their rows
+    apply_weight_deltas(initiative_ledgers, 'measures_weight', _weight_deltas(measures, 'initiative_id'), measure_caps)
+    apply_weight_deltas(
+        initiative_ledgers, 'activities_weight', _weight_deltas(activities, 'initiative_id'), activity_caps
+    )
+    lock_ledgers(InitiativeWeightLedger, [initiative_map[initiative.pk] for initiative in custom])
+
+    # bulk_create sends no signals
+    table_changed(StrategicInitiative, PerformanceMeasure, MainActivity, SubActivity)
+    index_costing_dependencies(list(SubActivity.objects.filter(pk__in=sub_activity_map.values())))
+
+    new_activities = list(MainActivity.objects.filter(pk__in=activity_map.values()))
+    ensure_budget_rollups(new_activities)
+    refresh_budget_rollups(main_activity_ids=activity_map.values())
+
+    return {
+        'initiatives': len(custom),
+        'performance_measures': len(measures),
+        'main_activities': len(activities),
+        'sub_activities': len(sub_activities),
+    }
+
+
+def clone_plan(plan, fiscal_year, from_date, to_date, organization_id=None, header_only=False):
+    """
+    Create a DRAFT copy of the plan for another fiscal year, optionally for another
+    organization. Returns (new plan, row counts copied per level), the counts being
+    None for a header-only clone.
+    """
+    organization_id = organization_id or plan.organization_id
+    if organization_id == plan.organization_id and not header_only:
+        raise ValidationError(
+            "The plan's initiatives, measures and activities belong to its organization, not to the plan, "
+            'so a clone for the same organization would share them with this plan. '
+            'Clone for another organization, or ask for header_only to copy the plan header alone.'
+        )
+    with transaction.atomic():
+        new_plan = Plan(
+            organization_id=organization_id,
+            fiscal_year=fiscal_year,
+            from_date=from_date,
+            to_date=to_date,
+            status='DRAFT',
+            **{field: getattr(plan, field) for field in PLAN_FIELDS}
+        )
+        new_plan.save()
+        new_plan.selected_objectives.set(plan.selected_objectives.all())
+
+        copied = None if header_only else copy_plan_tree(plan, organization_id)
+    return new_plan, copied
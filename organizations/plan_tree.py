@@ -0,0 +1,153 @@
+"""
+Query helpers for loading the organization-scoped objective tree of a plan.
+
+The whole tree (objectives -> initiatives -> performance measures / main
+activities -> sub-activities) is fetched with a fixed
+number of queries regardless of how many rows the plan contains.
+"""
+from decimal import Decimal
+
+from django.db.models import Prefetch, Q, F, OuterRef, Subquery, Value, ExpressionWrapper
+from django.db.models.functions import Coalesce
+
+from .budgets import (
+    MONEY, estimated_cost_expression, total_funding_expression, money_sum,
+    annotate_main_activity_budgets, budget_total_annotations, budget_summary_values, BUDGET_TOTAL_FIELDS
+)
+from .models import (
+    StrategicInitiative, PerformanceMeasure, MainActivity, SubActivity
+)
+
+
+def scoped_initiatives(organization_id):
+    """Initiatives visible to an organization: default ones plus its own custom ones"""
+    return StrategicInitiative.objects.filter(
+        Q(is_default=True) | Q(organization_id=organization_id)
+    ).exclude(
+        Q(organization__isnull=False) & ~Q(organization_id=organization_id)
+    )
+
+
+def scoped_performance_measures(organization_id):
+    """Performance measures created by the organization"""
+    return PerformanceMeasure.objects.filter(organization_id=organization_id)
+
+
+def scoped_main_activities(organization_id):
+    """Main activities created by the organization"""
+    return MainActivity.objects.filter(organization_id=organization_id)
+
+
+def plan_objectives_queryset(plan):
+    """
+    Return the plan's selected objectives with the organization-scoped
+    initiatives, measures, activities and budgets prefetched.
+    """
+    organization_id = plan.organization_id
+
+    measures = scoped_performance_measures(organization_id).select_related('organization')
+    activities = annotate_main_activity_budgets(
+        scoped_main_activities(organization_id)
+    ).select_related('organization').prefetch_related('sub_activities')
+    initiatives = scoped_initiatives(organization_id).select_related('organization').prefetch_related(
+        Prefetch('performance_measures', queryset=measures),
+        Prefetch('main_activities', queryset=activities),
+    )
+
+    return plan.selected_objectives.prefetch_related(
+        Prefetch('initiatives', queryset=initiatives)
+    )
+
+
+def _plan_sub_activity_total(expression):
+    """
+    Correlated subquery summing an expression over the sub-activities of the outer plan,
+    scoped like plan_sub_activities
+    """
+    sub_activities = SubActivity.objects.filter(
+        main_activity__organization=OuterRef('organization'),
+        main_activity__initiative__strategic_objective__selected_in_plans=OuterRef('pk')
+    ).filter(
+        Q(main_activity__initiative__is_default=True) |
+        Q(main_activity__initiative__organization_id=OuterRef('organization'))
+    ).exclude(
+        Q(main_activity__initiative__organization__isnull=False) &
+        ~Q(main_activity__initiative__organization_id=OuterRef('organization'))
+    ).order_by().values('main_activity__organization').annotate(
+        total=money_sum(expression)
+    ).values('total')[:1]
+    return Coalesce(Subquery(sub_activities, output_field=MONEY), Value(Decimal('0')), output_field=MONEY)
+
+
+def annotate_plan_budget_totals(queryset):
+    """Annotate plans with total_budget, total_funding and funding_gap computed in SQL"""
+    return queryset.annotate(
+        total_budget=_plan_sub_activity_total(estimated_cost_expression()),
+        total_funding=_plan_sub_activity_total(total_funding_expression()),
+    ).annotate(
+        funding_gap=ExpressionWrapper(F('total_budget') - F('total_funding'), output_field=MONEY)
+    )
+
+
+def plan_sub_activities(plan):
+    """Sub-activities that make up the plan: the organization's activities under its selected objectives"""
+    organization_id = plan.organization_id
+    return SubActivity.objects.filter(
+        main_activity__organization_id=organization_id,
+        main_activity__initiative__strategic_objective__in=plan.selected_objectives.all()
+    ).filter(
+        Q(main_activity__initiative__is_default=True) |
+        Q(main_activity__initiative__organization_id=organization_id)
+    ).exclude(
+        Q(main_activity__initiative__organization__isnull=False) &
+        ~Q(main_activity__initiative__organization_id=organization_id)
+    )
+
+
+def plan_budget_summary(plan):
+    """
+    Budget totals for a plan grouped by objective, initiative and activity type,
+    computed with a single GROUP BY over its sub-activities.
+    """
+    rows = plan_sub_activities(plan).order_by().values(
+        'main_activity__initiative__strategic_objective_id',
+        'main_activity__initiative__strategic_objective__title',
+        'main_activity__initiative_id',
+        'main_activity__initiative__name',
+        'activity_type',
+    ).annotate(**budget_total_annotations())
+
+    def add(groups, key, extra, row):
+        group = groups.setdefault(key, dict(extra, **{field: Decimal('0') for field in BUDGET_TOTAL_FIELDS}))
+        for field in BUDGET_TOTAL_FIELDS:
+            group[field] += row[field]
+
+    totals, objectives, initiatives, activity_types = {}, {}, {}, {}
+    for row in rows:
+        objective_id = row['main_activity__initiative__strategic_objective_id']
+        initiative_id = row['main_activity__initiative_id']
+        add(totals, 'plan', {}, row)
+        add(objectives, objective_id, {
+            'objective_id': objective_id,
+            'title': row['main_activity__initiative__strategic_objective__title'],
+        }, row)
+        add(initiatives, initiative_id, {
+            'initiative_id': initiative_id,
+            'objective_id': objective_id,
+            'name': row['main_activity__initiative__name'],
+        }, row)
+        add(activity_types, row['activity_type'], {'activity_type': row['activity_type']}, row)
+
+    def present(group):
+        labels = {key: value for key, value in group.items() if key not in BUDGET_TOTAL_FIELDS}
+        return dict(labels, **budget_summary_values(group))
+
+    empty = {field: Decimal('0') for field in BUDGET_TOTAL_FIELDS}
+    return {
+        'plan': plan.pk,
+        'organization': plan.organization_id,
+        'totals': budget_summary_values(totals.get('plan', empty)),
+        'by_objective': [present(group) for group in objectives.values()],
+        'by_initiative': [present(group) for group in initiatives.values()],
+        'by_activity_type': [present(group) for group in activity_types.values()],
+    }
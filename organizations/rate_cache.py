@@ -0,0 +1,112 @@
+"""
+Rate lookups for costing without database reads.
+
+Each rate table is loaded once into a dict keyed by its natural key (per diem
+by location, accommodation by location and service type, transport by
+origin/destination, costing assumptions by activity type/location/cost type)
+and stored in Django's cache under the costing data version. Saving or
+deleting a rate row moves that version, which is read from the database, so
+the next lookup in any worker reloads the table whichever cache backend is
+configured.
+
+Rows are plain dicts of the model's columns. Where a natural key is not
+unique in the table, the most recently created row wins.
+"""
+from django.core.cache import cache
+
+from .costing_data import costing_data_version
+from .models import (
+    Location, LandTransport, AirTransport, PerDiem, Accommodation, ParticipantCost, SessionCost,
+    PrintingCost, SupervisorCost, ProcurementItem, ActivityCostingAssumption
+)
+
+# table name -> (model, natural key fields)
+RATE_INDEXES = {
+    'locations': (Location, ('id',)),
+    'per_diems': (PerDiem, ('location_id',)),
+    'accommodations': (Accommodation, ('location_id', 'service_type')),
+    'land_transports': (LandTransport, ('origin_id', 'destination_id', 'trip_type')),
+    'air_transports': (AirTransport, ('origin_id', 'destination_id')),
+    'participant_costs': (ParticipantCost, ('cost_type',)),
+    'session_costs': (SessionCost, ('cost_type',)),
+    'printing_costs': (PrintingCost, ('document_type',)),
+    'supervisor_costs': (SupervisorCost, ('cost_type',)),
+    'procurement_items': (ProcurementItem, ('id',)),
+    'costing_assumptions': (ActivityCostingAssumption, ('activity_type', 'location', 'cost_type')),
+}
+
+RATE_CACHE_KEY = 'costing_data:rates:{name}:{version}'
+# Indexes of versions that are no longer current expire after this many seconds
+RATE_CACHE_TIMEOUT = 300
+
+# table name -> (version, index); saves unpickling from a shared cache on every lookup
+_local_indexes = {}
+
+
+def _index_key(row, fields):
+    return row[fields[0]] if len(fields) == 1 else tuple(row[field] for field in fields)
+
+
+def load_rate_index(name):
+    """{natural key: row dict} for one rate table, read from the database"""
+    model, fields = RATE_INDEXES[name]
+    columns = [field.attname for field in model._meta.concrete_fields]
+    return {_index_key(row, fields): row for row in model.objects.order_by('pk').values(*columns)}
+
+
+def rate_index(name, version=None):
+    """The cached index of a rate table at the given (default: current) costing data version"""
+    version = costing_data_version() if version is None else version
+    entry = _local_indexes.get(name)
+    if entry and entry[0] == version:
+        return entry[1]
+
+    key = RATE_CACHE_KEY.format(name=name, version=version)
+    index = cache.get(key)
+    if index is None:
+        index = load_rate_index(name)
+        cache.set(key, index, RATE_CACHE_TIMEOUT)
+    _local_indexes[name] = (version, index)
+    return index
+
+
+class RateTables:
+    """
+    Rate indexes pinned to the costing data version current when a costing
+    run starts; each table is fetched from the cache at most once per run.
+    """
+
+    def __init__(self, version=None):
+        self.version = costing_data_version() if version is None else version
+        self._indexes = {}
+        self._location_ids = None
+
+    def table(self, name):
+        if name not in self._indexes:
+            self._indexes[name] = rate_index(name, self.version)
+        return self._indexes[name]
+
+    def get(self, name, *key):
+        """Row for a natural key, or None"""
+        return self.table(name).get(key[0] if len(key) == 1 else key)
+
+    def location_id(self, name):
+        """Id of the location with the given name, or None"""
+        if self._location_ids is None:
+            self._location_ids = {row['name']: location_id for location_id, row in self.table('locations').items()}
+        return self._location_ids.get(name)
+
+    def per_diem(self, location_id):
+        return self.get('per_diems', location_id)
+
+    def accommodation(self, location_id, service_type):
+        return self.get('accommodations', location_id, service_type)
+
+    def land_transport(self, origin_id, destination_id, trip_type='SINGLE'):
+        return self.get('land_transports', origin_id, destination_id, trip_type)
+
+    def air_transport(self, origin_id, destination_id):
+        return self.get('air_transports', origin_id, destination_id)
+
+    def costing_assumption(self, activity_type, location, cost_type):
+        return self.get('costing_assumptions', activity_type, location, cost_type)
@@ -0,0 +1,190 @@
+"""
+Incremental re-costing of costing-tool rows after a rate change.
+
+Every time a sub-activity is costed, the rate table keys
+its quote read (per diem of a location, accommodation of a location and
+service type, a transport route, ...) are stored as CostingDependency rows.
+When a rate row changes, its old and new keys are queued in PendingRecost;
+recost_pending() resolves the queue through the dependency index and
+recomputes only the affected rows, in batches, refreshing their rollups.
+
+A quote that reads a whole table (the 'ALL' cost options, route lookup by
+location name) depends on the wildcard key '*' of that table.
+
+The quote's line items (line_items.py) are replaced together with the
+dependencies, so they always reflect the row's current cost.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .costing import COSTING_TOOLS, CostingError, quote_sub_activity
+from .line_items import replace_line_items
+from .models import SubActivity, CostingDependency, PendingRecost
+from .rate_cache import RATE_INDEXES, RateTables
+from .rollups import refresh_budget_rollups
+from .table_versions import table_changed
+
+ALL_KEYS = '*'
+
+RATE_TABLE_NAMES = {model: name for name, (model, _) in RATE_INDEXES.items()}
+
+
+
+def rate_key(parts):
+    return '|'.join(str(part) for part in parts)
+
+
+def rate_keys_of(instance):
+    """(table, key) pairs a rate row is looked up by, including the table wildcard"""
+    name = RATE_TABLE_NAMES[type(instance)]
+    _, fields = RATE_INDEXES[name]
+    return {(name, rate_key(getattr(instance, field) for field in fields)), (name, ALL_KEYS)}
+
+
+class RecordingRateTables(RateTables):
+    """RateTables that remembers which (table, key) pairs were read since the last reset"""
+
+    def __init__(self, version=None):
+        super().__init__(version)
+        self.reads = set()
+
+    def table(self, name):
+        self.reads.add((name, ALL_KEYS))
+        return super().table(name)
+
+    def get(self, name, *key):
+        if None not in key:
+            self.reads.add((name, rate_key(key)))
+        return super().table(name).get(key[0] if len(key) == 1 else key)
+
+
+def _costed(instance):
+    return instance.budget_calculation_type == 'WITH_TOOL' and instance.activity_type in COSTING_TOOLS
+
+
+def _quote_and_record(instances, rates):
+    """
+    {instance pk: (quote, reads)} for the instances costed with a tool. A row
+    whose details cannot be quoted (free-form JSON saved before the costing
+    engine) gets no quote and no dependencies, and keeps its stored cost.
+    """
+    results = {}
+    for instance in instances:
+        rates.reads = set()
+        results[instance.pk] = (None, set())
+        if _costed(instance):
+            try:
+                results[instance.pk] = (quote_sub_activity(instance, rates), rates.reads)
+            except CostingError:
+                pass
+    return results
+
+
+def _replace_dependencies(results, rates):
+    """Store the rate keys and line items of sub-activities freshly quoted with rates"""
+    replace_line_items({pk: quoted for pk, (quoted, _) in results.items()}, rates.version)
+    CostingDependency.objects.filter(sub_activity_id__in=list(results)).delete()
+    CostingDependency.objects.bulk_create([
+        CostingDependency(rate_table=table, rate_key=key, sub_activity_id=pk)
+        for pk, (_, reads) in results.items()
+        for table, key in reads
+    ], batch_size=1000)
+
+
+def index_costing_dependencies(sub_activities, rates=None):
+    """Record the rate keys the sub-activities depend on"""
+    sub_activities = [sub_activity for sub_activity in sub_activities if sub_activity.pk]
+    if not sub_activities:
+        return
+    rates = rates or RecordingRateTables()
+    _replace_dependencies(_quote_and_record(sub_activities, rates), rates)
+
+
+def queue_recost(keys):
+    """Queue changed (table, key) pairs for the re-cost job"""
+    PendingRecost.objects.bulk_create(
+        [PendingRecost(rate_table=table, rate_key=key) for table, key in keys],
+        ignore_conflicts=True
+    )
+
+
+def recost_rows(ids, batch_size=500, rates=None):
+    """
+    Recompute estimated_cost_with_tool of the given sub-activities in batches, refreshing
+    their dependencies and rollups. Returns (rows checked, rows whose cost changed).
+    """
+    rates = rates or RecordingRateTables()
+    ids = sorted(ids)
+    checked = changed = 0
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            instances = list(SubActivity.objects.filter(pk__in=ids[start:start + batch_size]).select_for_update())
+            results = _quote_and_record(instances, rates)
+            now = timezone.now()
+            updated = []
+            for instance in instances:
+                quoted, _ = results[instance.pk]
+                if quoted is not None and not quoted['matches']:
+                    instance.estimated_cost_with_tool = quoted['computed']
+                    instance.updated_at = now
+                    updated.append(instance)
+            SubActivity.objects.bulk_update(updated, ['estimated_cost_with_tool', 'updated_at'])
+            _replace_dependencies(results, rates)
+            if updated:
+                # bulk writes send no signals, so keep the budget rollups and table version in step here
+                table_changed(SubActivity)
+                refresh_budget_rollups(main_activity_ids={instance.main_activity_id for instance in updated})
+        checked += len(instances)
+        changed += len(updated)
+    return checked, changed
+
+
+def dependent_ids(keys):
+    """Ids of the sub-activities that depend on any of the (table, key) pairs"""
+    by_table = {}
+    for table, key in keys:
+        by_table.setdefault(table, set()).add(key)
+    condition = Q()
+    for table, table_keys in by_table.items():
+        condition |= Q(rate_table=table, rate_key__in=table_keys)
+    if not condition:
+        return set()
+    return set(CostingDependency.objects.filter(condition).values_list('sub_activity_id', flat=True))
+
+
+def recost_pending(batch_size=500):
+    """Drain the queue: re-cost every row depending on a changed rate key. Returns counts."""
+    pending = list(PendingRecost.objects.order_by('pk'))
+    counts = {'keys': len(pending), 'checked': 0, 'changed': 0}
+    if not pending:
+        return counts
+
+    # Claim the keys before reading any rate, so a change committed from here on queues its key again
+    keys = {(entry.rate_table, entry.rate_key) for entry in pending}
+    PendingRecost.objects.filter(pk__in=[entry.pk for entry in pending]).delete()
+    try:
+        counts['checked'], counts['changed'] = recost_rows(dependent_ids(keys), batch_size, RecordingRateTables())
+    except Exception:
+        queue_recost(keys)
+        raise
+    return counts
+
+
+def recost_all(batch_size=500):
+    """Re-cost and re-index every costing-tool row"""
+    ids = SubActivity.objects.filter(
+        budget_calculation_type='WITH_TOOL', activity_type__in=list(COSTING_TOOLS)
+    ).values_list('pk', flat=True)
+    checked, changed = recost_rows(list(ids), batch_size)
+    return {'checked': checked, 'changed': changed}
+
+
+def reindex_costing_dependencies(batch_size=500):
+    """Rebuild the dependency index and line items of every row without changing any cost; returns rows indexed"""
+    rates = RecordingRateTables()
+    ids = list(SubActivity.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            index_costing_dependencies(SubActivity.objects.filter(pk__in=ids[start:start + batch_size]), rates)
+    return len(ids)
@@ -0,0 +1,143 @@
+"""
+Maintenance of the persisted budget rollups (MainActivityBudgetRollup and
+InitiativeBudgetRollup).
+
+Rollup rows are created when a main activity is saved (ensure_budget_rollups)
+and are afterwards only updated in place (refresh_budget_rollups), so the
+signal handlers never insert rows for parents that are in the middle of a
+cascade delete.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from .budgets import BUDGET_TOTAL_FIELDS, budget_summary_values, annotate_main_activity_budgets
+from .models import MainActivity, MainActivityBudgetRollup, InitiativeBudgetRollup, BudgetRollup
+
+
+def _activity_totals(main_activity_ids):
+    """Budget totals per main activity in one grouped query"""
+    return annotate_main_activity_budgets(
+        MainActivity.objects.filter(pk__in=main_activity_ids)
+    ).values('pk', 'initiative_id', 'organization_id', *BUDGET_TOTAL_FIELDS)
+
+
+def _initiative_totals(initiative_ids):
+    """Sum main activity rollups per (initiative, organization) in one grouped query"""
+    rows = MainActivityBudgetRollup.objects.filter(
+        main_activity__initiative_id__in=initiative_ids
+    ).values(
+        'main_activity__initiative_id', 'main_activity__organization_id'
+    ).annotate(
+        **{f'sum_{field}': Sum(field) for field in BudgetRollup.TOTAL_FIELDS}
+    )
+    return {
+        (row['main_activity__initiative_id'], row['main_activity__organization_id']): {
+            field: row[f'sum_{field}'] or Decimal('0') for field in BudgetRollup.TOTAL_FIELDS
+        }
+        for row in rows
+    }
+
+
+def ensure_budget_rollups(main_activities):
+    """Create missing rollup rows for the given main activities and their initiatives"""
+    MainActivityBudgetRollup.objects.bulk_create(
+        [MainActivityBudgetRollup(main_activity_id=activity.pk) for activity in main_activities],
+        ignore_conflicts=True
+    )
+
+    # Unique constraints do not catch NULL organizations, so check existing keys explicitly
+    keys = {(activity.initiative_id, activity.organization_id) for activity in main_activities}
+    existing = set(
+        InitiativeBudgetRollup.objects.filter(
+            initiative_id__in={initiative_id for initiative_id, _ in keys}
+        ).values_list('initiative_id', 'organization_id')
+    )
+    InitiativeBudgetRollup.objects.bulk_create(
+        [
+            InitiativeBudgetRollup(initiative_id=initiative_id, organization_id=organization_id)
+            for initiative_id, organization_id in keys - existing
+        ],
+        ignore_conflicts=True
+    )
+
+
+def refresh_budget_rollups(main_activity_ids=(), initiative_keys=()):
+    """
+    Recompute the rollups of the given main activities and of the
+    (initiative_id, organization_id) pairs they belong to, plus any extra
+    initiative_keys (e.g. the previous parent of a moved or deleted activity).
+    """
+    main_activity_ids = set(main_activity_ids)
+    initiative_keys = set(initiative_keys)
+
+    with transaction.atomic():
+        if main_activity_ids:
+            totals_by_activity = {}
+            for row in _activity_totals(main_activity_ids):
+                totals_by_activity[row['pk']] = budget_summary_values(row)
+                initiative_keys.add((row['initiative_id'], row['organization_id']))
+
+            rollups = list(
+                MainActivityBudgetRollup.objects.select_for_update().filter(
+                    main_activity_id__in=totals_by_activity.keys()
+                )
+            )
+            for rollup in rollups:
+                for field, value in totals_by_activity[rollup.main_activity_id].items():
+                    setattr(rollup, field, value)
+            MainActivityBudgetRollup.objects.bulk_update(rollups, BudgetRollup.TOTAL_FIELDS)
+
+        if initiative_keys:
+            initiative_ids = {initiative_id for initiative_id, _ in initiative_keys}
+            totals_by_key = _initiative_totals(initiative_ids)
+            zero = {field: Decimal('0') for field in BudgetRollup.TOTAL_FIELDS}
+
+            rollups = [
+                rollup for rollup in InitiativeBudgetRollup.objects.select_for_update().filter(
+                    initiative_id__in=initiative_ids
+                )
+                if (rollup.initiative_id, rollup.organization_id) in initiative_keys
+            ]
+            for rollup in rollups:
+                totals = totals_by_key.get((rollup.initiative_id, rollup.organization_id), zero)
+                for field, value in totals.items():
+                    setattr(rollup, field, value)
+            InitiativeBudgetRollup.objects.bulk_update(rollups, BudgetRollup.TOTAL_FIELDS)
+
+
+def rebuild_budget_rollups():
+    """Drop and recompute every rollup row from the SubActivity table"""
+    with transaction.atomic():
+        MainActivityBudgetRollup.objects.all().delete()
+        InitiativeBudgetRollup.objects.all().delete()
+
+        activity_rows = list(
+            annotate_main_activity_budgets(MainActivity.objects.all()).values(
+                'pk', 'initiative_id', 'organization_id', *BUDGET_TOTAL_FIELDS
+            )
+        )
+        MainActivityBudgetRollup.objects.bulk_create(
+            [
+                MainActivityBudgetRollup(main_activity_id=row['pk'], **budget_summary_values(row))
+                for row in activity_rows
+            ],
+            batch_size=1000
+        )
+
+        keys = {(row['initiative_id'], row['organization_id']) for row in activity_rows}
+        totals_by_key = _initiative_totals({initiative_id for initiative_id, _ in keys})
+        InitiativeBudgetRollup.objects.bulk_create(
+            [
+                InitiativeBudgetRollup(
+                    initiative_id=initiative_id,
+                    organization_id=organization_id,
+                    **totals_by_key[(initiative_id, organization_id)]
+                )
+                for initiative_id, organization_id in keys
+            ],
+            batch_size=1000
+        )
+
+        return len(activity_rows), len(keys)
@@ -0,0 +1,272 @@
+"""
+Transport route graph over Location built from LandTransport and AirTransport.
+
+Each rate row is an edge between two locations; a row without a stored
+reverse row is also used in the other direction. Cheapest paths from every
+location to every other are precomputed (Dijkstra from each source) per
+mode ('land', 'air' or 'any' to mix both) and trip type:
+
+- SINGLE uses single-trip land rows and air rows;
+- ROUND chains round-trip land rows and out-and-back single edges, or goes
+  out and back along the cheapest single paths, whichever is cheaper.
+
+Each graph is solved from the cached rate indexes on first use and kept
+until the costing data version changes (any transport or location save
+bumps it), so a quote is a dictionary lookup.
+"""
+import heapq
+from decimal import Decimal
+
+from .costing import CENT
+from .costing_data import costing_data_version
+from .rate_cache import rate_index
+
+ROUTE_MODES = ('land', 'air', 'any')
+TRIP_TYPES = ('SINGLE', 'ROUND')
+
+# version -> RouteGraphs
+_local_graphs = {}
+
+
+class RouteError(ValueError):
+    """Raised for an unknown location, mode or trip type, or an unreachable destination"""
+
+
+def _add_edge(edges, origin, destination, price, hop, explicit):
+    """Keep the cheapest edge per direction; a stored row beats the reverse of another row"""
+    current = edges.get((origin, destination))
+    if current is None or (explicit, -price) > (current[2], -current[0]):
+        edges[(origin, destination)] = (price, hop, explicit)
+
+
+def _edges(rows, mode, trip_type):
+    """{(origin, destination): (price, hop, stored)} for a set of rate rows, reverse directions included"""
+    edges = {}
+    for row in rows:
+        price = Decimal(str(row['price']))
+        origin, destination = row['origin_id'], row['destination_id']
+        if origin == destination:
+            continue
+        _add_edge(edges, origin, destination, price, (mode, trip_type, row['id']), True)
+        _add_edge(edges, destination, origin, price, (mode, trip_type, row['id']), False)
+    return edges
+
+
+def _merge(*edge_sets):
+    merged = {}
+    for edges in edge_sets:
+        for key, (price, hop, explicit) in edges.items():
+            if key not in merged or price < merged[key][0]:
+                merged[key] = (price, hop, explicit)
+    return merged
+
+
+class RouteGraph:
+    """All-pairs cheapest paths of one edge set"""
+
+    def __init__(self, edges):
+        adjacency = {}
+        for (origin, destination), (price, hop, _) in edges.items():
+            adjacency.setdefault(origin, []).append((destination, price, hop))
+        self.costs = {}
+        self.previous = {}
+        for source in adjacency:
+            costs, previous = self._dijkstra(source, adjacency)
+            for target, cost in costs.items():
+                if target != source:
+                    self.costs[(source, target)] = cost
+                    self.previous[(source, target)] = previous[target]
+
+    @staticmethod
+    def _dijkstra(source, adjacency):
+        costs = {source: Decimal('0')}
+        previous = {}
+        queue = [(Decimal('0'), source)]
+        while queue:
+            cost, node = heapq.heappop(queue)
+            if cost > costs[node]:
+                continue
+            for neighbour, price, hop in adjacency.get(node, ()):
+                candidate = cost + price
+                if neighbour not in costs or candidate < costs[neighbour]:
+                    costs[neighbour] = candidate
+                    previous[neighbour] = (node, price, hop)
+                    heapq.heappush(queue, (candidate, neighbour))
+        return costs, previous
+
+    def cost(self, origin, destination):
+        """Cheapest cost from origin to destination, or None when unreachable"""
+        if origin == destination:
+            return Decimal('0')
+        return self.costs.get((origin, destination))
+
+    def legs(self, origin, destination):
+        """[(from, to, price, (mode, trip type, rate row id))] along the cheapest path"""
+        legs = []
+        node = destination
+        while node != origin:
+            previous, price, hop = self.previous[(origin, node)]
+            legs.append((previous, node, price, hop))
+            node = previous
+        return legs[::-1]
+
+
+def _round_edges(single_edges, round_rows):
+    """Round-trip rows, plus going out and back over each single edge"""
+    edges = _edges(round_rows, 'land', 'ROUND')
+    for (origin, destination), (price, hop, _) in single_edges.items():
+        back = single_edges.get((destination, origin))
+        if back is not None:
+            _add_edge(edges, origin, destination, price + back[0], ('out_and_back', (price, hop), back[:2]), True)
+    return edges
+
+
+def route_edges(version=None):
+    """{(mode, trip type): edges} from the cached land and air transport indexes"""
+    land = list(rate_index('land_transports', version).values())
+    air = list(rate_index('air_transports', version).values())
+    land_single = _edges([row for row in land if row['trip_type'] == 'SINGLE'], 'land', 'SINGLE')
+    land_round = [row for row in land if row['trip_type'] == 'ROUND']
+    air_single = _edges(air, 'air', 'SINGLE')
+
+    any_single = _merge(land_single, air_single)
+    return {
+        ('land', 'SINGLE'): land_single,
+        ('air', 'SINGLE'): air_single,
+        ('any', 'SINGLE'): any_single,
+        ('land', 'ROUND'): _round_edges(land_single, land_round),
+        ('air', 'ROUND'): _round_edges(air_single, []),
+        ('any', 'ROUND'): _round_edges(any_single, land_round),
+    }
+
+
+class RouteGraphs:
+    """Route graphs of one costing data version; each (mode, trip type) graph is solved on first use"""
+
+    def __init__(self, version=None):
+        self.version = costing_data_version() if version is None else version
+        self.edges = route_edges(self.version)
+        self._graphs = {}
+
+    def __getitem__(self, key):
+        if key not in self._graphs:
+            self._graphs[key] = RouteGraph(self.edges[key])
+        return self._graphs[key]
+
+
+def route_graphs():
+    """Route graphs of the current costing data version, kept per version and process"""
+    version = costing_data_version()
+    graphs = _local_graphs.get(version)
+    if graphs is None:
+        graphs = RouteGraphs(version)
+        _local_graphs.clear()
+        _local_graphs[version] = graphs
+    return graphs
+
+
+def _location_id(value, locations):
+    try:
+        location_id = int(value)
+    except (TypeError, ValueError):
+        raise RouteError(f'Invalid location {value!r}')
+    if location_id not in locations:
+        raise RouteError(f'Unknown location {location_id}')
+    return location_id
+
+
+def _option(value, choices, name, default):
+    value = value or default
+    if value not in choices:
+        raise RouteError(f'{name} must be one of {", ".join(choices)}')
+    return value
+
+
+def _hop(origin, destination, price, hop):
+    mode, trip_type, rate_id = hop
+    return {
+        'origin': origin, 'destination': destination, 'mode': mode, 'trip_type': trip_type,
+        'rate_id': rate_id, 'price': price.quantize(CENT),
+    }
+
+
+def _hops(graph, origin, destination):
+    """Hops of a path, with out-and-back edges expanded into their two single hops"""
+    hops = []
+    for start, end, price, hop in graph.legs(origin, destination):
+        if hop[0] == 'out_and_back':
+            _, (out_price, out_hop), (back_price, back_hop) = hop
+            hops.append(_hop(start, end, out_price, out_hop))
+            hops.append(_hop(end, start, back_price, back_hop))
+        else:
+            hops.append(_hop(start, end, price, hop))
+    return hops
+
+
+def _round_trip(graphs, mode, origin, destination):
+    """(cost, hops) of the cheapest round trip: chained round legs, or out and back on single paths"""
+    single, round_graph = graphs[(mode, 'SINGLE')], graphs[(mode, 'ROUND')]
+    chained = round_graph.cost(origin, destination)
+    out, back = single.cost(origin, destination), single.cost(destination, origin)
+    if out is not None and back is not None and (chained is None or out + back < chained):
+        return out + back, _hops(single, origin, destination) + _hops(single, destination, origin)
+    if chained is None:
+        return None, []
+    return chained, _hops(round_graph, origin, destination)
+
+
+def quote_route(stops, mode='any', trip_type='SINGLE', participants=1):
+    """
+    Cheapest cost of travelling through stops (location ids) in order. A ROUND trip
+    over two stops is priced as a round trip; over more stops it returns to the
+    first stop. Returns per-leg paths, the cost per person and the total.
+    """
+    mode = _option(mode, ROUTE_MODES, 'mode', 'any')
+    trip_type = _option(trip_type, TRIP_TYPES, 'trip_type', 'SINGLE')
+    if not isinstance(stops, list) or len(stops) < 2:
+        raise RouteError('A route needs at least two stops')
+    try:
+        participants = int(participants or 1)
+    except (TypeError, ValueError):
+        raise RouteError('participants must be a whole number')
+    if participants < 1:
+        raise RouteError('participants must be at least 1')
+
+    # One costing data version for the whole quote
+    graphs = route_graphs()
+    locations = rate_index('locations', graphs.version)
+    stops = [_location_id(stop, locations) for stop in stops]
+    single = graphs[(mode, 'SINGLE')]
+    round_pair = trip_type == 'ROUND' and len(stops) == 2
+    if trip_type == 'ROUND' and not round_pair:
+        stops = stops + [stops[0]]
+
+    legs = []
+    for origin, destination in zip(stops, stops[1:]):
+        if round_pair:
+            cost, hops = _round_trip(graphs, mode, origin, destination)
+        else:
+            cost = single.cost(origin, destination)
+            hops = _hops(single, origin, destination) if cost is not None else []
+        if cost is None:
+            raise RouteError(
+                f'No {mode} route from {locations[origin]["name"]} to {locations[destination]["name"]}'
+            )
+        legs.append({
+            'origin': origin,
+            'destination': destination,
+            'price': cost.quantize(CENT),
+            'direct': len(hops) == 1 and hops[0]['trip_type'] == trip_type,
+            'hops': hops,
+        })
+
+    per_person = sum((leg['price'] for leg in legs), Decimal('0'))
+    return {
+        'mode': mode,
+        'trip_type': trip_type,
+        'participants': participants,
+        'stops': stops,
+        'legs': legs,
+        'price_per_person': per_person.quantize(CENT),
+        'total': (per_person * participants).quantize(CENT),
+    }
@@ -0,0 +1,307 @@
+"""
+What-if budget scenarios for a fiscal year.
+
+The sub-activities of every plan in the fiscal year are costed once into
+columnar arrays: one array per cost component of the costing tools (per diem,
+accommodation, land and air transport, ...) plus the cost of rows entered
+without a tool, their funding and the ids used for grouping. Components are
+scaled so each row adds up to its stored estimated cost, which keeps the
+baseline equal to the figures planners see.
+
+A scenario then multiplies the component columns by per-category factors
+and each row by its location and activity type factors, and sums the result
+per sub-activity, main activity and organization in a single pass over the
+arrays, without touching the database or the costing tools again. The
+loaded base is kept per process until the fiscal year's sub-activities,
+plans or rates change; only the SCENARIO_BASE_LIMIT most recently used
+fiscal years are kept.
+"""
+import threading
+from array import array
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db.models import Q, F, Count, Max
+
+from .budgets import FUNDING_SOURCES
+from .costing import CENT, COST_COMPONENTS, COSTING_TOOLS, CostingError, quote_sub_activity
+from .costing_data import costing_data_version
+from .models import Plan, SubActivity
+from .rate_cache import RateTables
+
+# Cost of rows budgeted without a costing tool; category multipliers do not apply to it
+WITHOUT_TOOL = 'without_tool'
+SCENARIO_CATEGORIES = COST_COMPONENTS + [WITHOUT_TOOL]
+
+# Detail fields holding the main location of each costing tool
+LOCATION_FIELDS = ('trainingLocationId', 'trainingLocation', 'location')
+
+# fiscal year -> (fingerprint, base), least recently used first; a new fingerprint replaces the year's base
+_local_bases = OrderedDict()
+SCENARIO_BASE_LIMIT = 3
+_local_bases_lock = threading.Lock()
+
+
+class ScenarioError(ValueError):
+    """Raised for a malformed scenario request"""
+
+
+def _float(value):
+    return float(value or 0)
+
+
+def _location_id(details):
+    for field in LOCATION_FIELDS:
+        try:
+            return int(details[field])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return None
+
+
+def fiscal_year_sub_activities(fiscal_year):
+    """Sub-activities of every plan of the fiscal year: each organization's activities under its selected objectives"""
+    selections = Plan.selected_objectives.through.objects.filter(
+        plan__fiscal_year=fiscal_year
+    ).values_list('plan__organization_id', 'strategicobjective_id')
+
+    objectives_by_organization = {}
+    for organization_id, objective_id in selections:
+        objectives_by_organization.setdefault(organization_id, set()).add(objective_id)
+    if not objectives_by_organization:
+        return SubActivity.objects.none()
+
+    condition = Q()
+    for organization_id, objective_ids in objectives_by_organization.items():
+        condition |= Q(
+            main_activity__organization_id=organization_id,
+            main_activity__initiative__strategic_objective_id__in=objective_ids
+        )
+    # Same scoping as plan_tree.plan_sub_activities: default initiatives or the organization's own
+    return SubActivity.objects.filter(condition).filter(
+        Q(main_activity__initiative__is_default=True, main_activity__initiative__organization__isnull=True) |
+        Q(main_activity__initiative__organization_id=F('main_activity__organization_id'))
+    ).distinct()
+
+
+def _fingerprint(fiscal_year, queryset):
+    """Changes whenever a row, a plan of the fiscal year or a rate table changes"""
+    rows = queryset.order_by().aggregate(count=Count('pk', distinct=True), updated=Max('updated_at'))
+    plans = Plan.objects.filter(fiscal_year=fiscal_year).aggregate(count=Count('pk'), updated=Max('updated_at'))
+    return (rows['count'], rows['updated'], plans['count'], plans['updated'], costing_data_version())
+
+
+def _components(sub_activity, rates):
+    """{category: cost} of a row, adding up to its stored estimated cost"""
+    if sub_activity.budget_calculation_type != 'WITH_TOOL':
+        return {WITHOUT_TOOL: _float(sub_activity.estimated_cost_without_tool)}
+    stored = _float(sub_activity.estimated_cost_with_tool)
+    try:
+        quoted = quote_sub_activity(sub_activity, rates)
+    except CostingError:
+        # details the costing tools cannot read; the stored cost is kept uncategorised
+        quoted = None
+    if quoted is None or not quoted['computed']:
+        return {'other_costs': stored}
+
+    breakdown = quoted['breakdown']
+    sessions = _float(breakdown.get('sessions', 1))
+    scale = stored / float(quoted['computed'])
+    return {
+        category: float(breakdown[category]) * sessions * scale
+        for category in COST_COMPONENTS if breakdown.get(category)
+    }
+
+
+def load_scenario_base(fiscal_year):
+    """Cost the fiscal year's sub-activities into columnar arrays (one query for the rows)"""
+    queryset = fiscal_year_sub_activities(fiscal_year)
+    rows = list(queryset.select_related('main_activity__organization').order_by('pk'))
+    rates = RateTables()
+
+    columns = {category: array('d', bytes(8 * len(rows))) for category in SCENARIO_CATEGORIES}
+    funding = array('d', bytes(8 * len(rows)))
+    base = {
+        'fiscal_year': fiscal_year,
+        'ids': array('q', (row.pk for row in rows)),
+        'names': [row.name for row in rows],
+        'main_activities': array('q', (row.main_activity_id for row in rows)),
+        'organizations': array('q', (row.main_activity.organization_id or 0 for row in rows)),
+        'activity_types': [row.activity_type for row in rows],
+        'locations': [],
+        'columns': columns,
+        'funding': funding,
+        'main_activity_names': {},
+        'organization_names': {},
+    }
+    for index, row in enumerate(rows):
+        for category, cost in _components(row, rates).items():
+            columns[category][index] = cost
+        funding[index] = sum(_float(getattr(row, source)) for source in FUNDING_SOURCES)
+        field, _ = COSTING_TOOLS.get(row.activity_type, (None, None))
+        details = getattr(row, field) if field else None
+        base['locations'].append(_location_id(details) if isinstance(details, dict) else None)
+        base['main_activity_names'][row.main_activity_id] = row.main_activity.name
+        organization = row.main_activity.organization
+        if organization is not None:
+            base['organization_names'][organization.pk] = organization.name
+    return base
+
+
+def scenario_base(fiscal_year):
+    """The loaded base of a fiscal year, rebuilt when its fingerprint changes"""
+    fingerprint = _fingerprint(fiscal_year, fiscal_year_sub_activities(fiscal_year))
+    with _local_bases_lock:
+        entry = _local_bases.get(fiscal_year)
+        if entry and entry[0] == fingerprint:
+            _local_bases.move_to_end(fiscal_year)
+            return entry[1]
+        # Drop the stale base before loading, so a worker never holds two bases of one year
+        _local_bases.pop(fiscal_year, None)
+    base = load_scenario_base(fiscal_year)
+    with _local_bases_lock:
+        _local_bases[fiscal_year] = (fingerprint, base)
+        _local_bases.move_to_end(fiscal_year)
+        while len(_local_bases) > SCENARIO_BASE_LIMIT:
+            _local_bases.popitem(last=False)
+    return base
+
+
+def _factors(values, name, key_type=str):
+    """Validated {key: multiplier} from a request"""
+    if values in (None, ''):
+        return {}
+    if not isinstance(values, dict):
+        raise ScenarioError(f'{name} must be an object of multipliers')
+    factors = {}
+    for key, value in values.items():
+        try:
+            factor = float(value)
+            key = key_type(key)
+        except (TypeError, ValueError):
+            raise ScenarioError(f'Invalid {name} multiplier for {key!r}')
+        if factor < 0 or factor != factor or factor == float('inf'):
+            raise ScenarioError(f'{name} multipliers must be non-negative numbers')
+        factors[key] = factor
+    return factors
+
+
+def parse_multipliers(multipliers):
+    """{'categories', 'locations', 'activity_types'} multipliers of a scenario request"""
+    if multipliers in (None, ''):
+        multipliers = {}
+    if not isinstance(multipliers, dict):
+        raise ScenarioError('multipliers must be an object')
+    categories = _factors(multipliers.get('categories'), 'categories')
+    unknown = set(categories) - set(SCENARIO_CATEGORIES)
+    if unknown:
+        raise ScenarioError(f'Unknown cost categories: {", ".join(sorted(unknown))}')
+    return {
+        'categories': categories,
+        'locations': _factors(multipliers.get('locations'), 'locations', int),
+        'activity_types': _factors(multipliers.get('activity_types'), 'activity_types'),
+    }
+
+
+def _money(value):
+    return Decimal(repr(value)).quantize(CENT)
+
+
+def _figures(baseline, scenario, funding):
+    return {
+        'baseline_cost': _money(baseline),
+        'scenario_cost': _money(scenario),
+        'change': _money(scenario - baseline),
+        'total_funding': _money(funding),
+        'baseline_funding_gap': _money(baseline - funding),
+        'scenario_funding_gap': _money(scenario - funding),
+    }
+
+
+def simulate(base, multipliers, include_sub_activities=False):
+    """Apply parsed multipliers to a loaded base; returns totals per organization, main activity and category"""
+    columns = base['columns']
+    size = len(base['ids'])
+
+    baseline = [0.0] * size
+    scenario = [0.0] * size
+    by_category = {}
+    for category, column in columns.items():
+        factor = multipliers['categories'].get(category, 1.0)
+        baseline = [total + cost for total, cost in zip(baseline, column)]
+        scenario = (
+            [total + cost for total, cost in zip(scenario, column)] if factor == 1.0
+            else [total + cost * factor for total, cost in zip(scenario, column)]
+        )
+        by_category[category] = (sum(column), sum(column) * factor)
+
+    row_factors = None
+    if multipliers['locations'] or multipliers['activity_types']:
+        locations, activity_types = multipliers['locations'], multipliers['activity_types']
+        row_factors = [
+            locations.get(location, 1.0) * activity_types.get(activity_type, 1.0)
+            for location, activity_type in zip(base['locations'], base['activity_types'])
+        ]
+        scenario = [cost * factor for cost, factor in zip(scenario, row_factors)]
+        for category, column in columns.items():
+            factor = multipliers['categories'].get(category, 1.0)
+            by_category[category] = (
+                by_category[category][0], sum(cost * row for cost, row in zip(column, row_factors)) * factor
+            )
+
+    funding = base['funding']
+    totals = [0.0, 0.0, 0.0]
+    main_activities, organizations = {}, {}
+    for main_activity_id, organization_id, old, new, funded in zip(
+        base['main_activities'], base['organizations'], baseline, scenario, funding
+    ):
+        for groups, key in ((main_activities, main_activity_id), (organizations, organization_id)):
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [old, new, funded]
+            else:
+                group[0] += old
+                group[1] += new
+                group[2] += funded
+        totals[0] += old
+        totals[1] += new
+        totals[2] += funded
+
+    organization_of = dict(zip(base['main_activities'], base['organizations']))
+    result = {
+        'fiscal_year': base['fiscal_year'],
+        'multipliers': multipliers,
+        'sub_activity_count': size,
+        'totals': _figures(*totals),
+        'by_category': [
+            dict(category=category, baseline_cost=_money(old), scenario_cost=_money(new), change=_money(new - old))
+            for category, (old, new) in by_category.items()
+        ],
+        'organizations': [
+            dict(organization=key or None, name=base['organization_names'].get(key), **_figures(*figures))
+            for key, figures in organizations.items()
+        ],
+        'main_activities': [
+            dict(
+                main_activity=key, name=base['main_activity_names'].get(key),
+                organization=organization_of[key] or None, **_figures(*figures)
+            )
+            for key, figures in main_activities.items()
+        ],
+    }
+    if include_sub_activities:
+        result['sub_activities'] = [
+            dict(sub_activity=pk, name=name, main_activity=main_activity_id, **_figures(old, new, funded))
+            for pk, name, main_activity_id, old, new, funded in zip(
+                base['ids'], base['names'], base['main_activities'], baseline, scenario, funding
+            )
+        ]
+    return result
+
+
+def run_scenario(fiscal_year, multipliers=None, include_sub_activities=False):
+    """Simulate a scenario for a fiscal year, loading its base on first use"""
+    if not fiscal_year:
+        raise ScenarioError('fiscal_year is required')
+    parsed = parse_multipliers(multipliers)
+    return simulate(scenario_base(str(fiscal_year)), parsed, include_sub_activities)
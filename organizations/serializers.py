@@ -1,26 +1,41 @@
+import json
+
 from rest_framework import serializers
+from rest_framework.utils.encoders import JSONEncoder
 from django.db import transaction
+from django.db.models import Max
 from .models import (
     Organization, OrganizationUser, StrategicObjective, 
     Program, StrategicInitiative, PerformanceMeasure, MainActivity,
-    ActivityBudget, SubActivity, ActivityCostingAssumption, Plan, PlanReview, InitiativeFeed,
+    SubActivity, InitiativeBudgetRollup, ActivityCostingAssumption, Plan, PlanReview, PlanSnapshot, InitiativeFeed,
     Location, LandTransport, AirTransport, PerDiem, Accommodation,
     ParticipantCost, SessionCost, PrintingCost, SupervisorCost, ProcurementItem
 )
+from .budgets import FUNDING_SOURCES, BUDGET_FIELDS
+from .org_tree import is_in_subtree
+from .fieldsets import SparseFieldsMixin
+from .plan_tree import plan_objectives_queryset
 
-class OrganizationSerializer(serializers.ModelSerializer):
+class OrganizationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Organization
         fields = '__all__'
+    
+    def validate_parent(self, value):
+        if self.instance and value and is_in_subtree(value.pk, self.instance.pk):
+            raise serializers.ValidationError('An organization cannot be placed under itself or one of its descendants')
+        return value
 
-class OrganizationUserSerializer(serializers.ModelSerializer):
+class OrganizationUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     organization_name = serializers.CharField(source='organization.name', read_only=True)
     
+    select_fields = {'organization_name': 'organization'}
+    
     class Meta:
         model = OrganizationUser
         fields = '__all__'
 
-class StrategicObjectiveSerializer(serializers.ModelSerializer):
+class StrategicObjectiveSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     effective_weight = serializers.SerializerMethodField()
     
     class Meta:
@@ -30,41 +45,81 @@ class StrategicObjectiveSerializer(serializers.ModelSerializer):
     def get_effective_weight(self, obj):
         return obj.get_effective_weight()
 
-class ProgramSerializer(serializers.ModelSerializer):
+class ProgramSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     strategic_objective_title = serializers.CharField(source='strategic_objective.title', read_only=True)
     
+    select_fields = {'strategic_objective_title': 'strategic_objective'}
+    
     class Meta:
         model = Program
         fields = '__all__'
 
-class StrategicInitiativeSerializer(serializers.ModelSerializer):
+class StrategicInitiativeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     organization_name = serializers.CharField(source='organization.name', read_only=True)
     strategic_objective_title = serializers.CharField(source='strategic_objective.title', read_only=True)
     program_name = serializers.CharField(source='program.name', read_only=True)
     initiative_feed_name = serializers.CharField(source='initiative_feed.name', read_only=True)
     
+    select_fields = {
+        'organization_name': 'organization',
+        'strategic_objective_title': 'strategic_objective',
+        'program_name': 'program',
+        'initiative_feed_name': 'initiative_feed',
+    }
+    
     class Meta:
         model = StrategicInitiative
         fields = '__all__'
 
-class PerformanceMeasureSerializer(serializers.ModelSerializer):
+class InitiativeBudgetRollupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    organization_name = serializers.CharField(source='organization.name', read_only=True)
+    
+    select_fields = {'organization_name': 'organization'}
+    
+    class Meta:
+        model = InitiativeBudgetRollup
+        fields = '__all__'
+
+class PerformanceMeasureSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     initiative_name = serializers.CharField(source='initiative.name', read_only=True)
     organization_name = serializers.CharField(source='organization.name', read_only=True)
     
+    select_fields = {'initiative_name': 'initiative', 'organization_name': 'organization'}
+    
     class Meta:
         model = PerformanceMeasure
         fields = '__all__'
 
-class ActivityBudgetSerializer(serializers.ModelSerializer):
+class BulkPerformanceMeasureRowSerializer(serializers.ModelSerializer):
+    """Input row of a bulk write; related ids are checked for the whole batch at once"""
+    id = serializers.IntegerField(required=False)
+    initiative = serializers.IntegerField(source='initiative_id')
+    organization = serializers.IntegerField(source='organization_id', required=False, allow_null=True)
+    
+    class Meta:
+        model = PerformanceMeasure
+        exclude = ['created_at', 'updated_at']
+
+class ActivityBudgetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    The budget of a sub-activity in the shape of the former ActivityBudget rows,
+    for the legacy budget endpoints; id and sub_activity are both the sub-activity id
+    """
+    sub_activity = serializers.IntegerField(source='pk', read_only=True)
+    activity = serializers.IntegerField(source='main_activity_id', read_only=True)
     total_funding = serializers.SerializerMethodField()
     estimated_cost = serializers.SerializerMethodField()
     funding_gap = serializers.SerializerMethodField()
-    sub_activity_name = serializers.CharField(source='sub_activity.name', read_only=True)
-    sub_activity_type = serializers.CharField(source='sub_activity.activity_type', read_only=True)
+    sub_activity_name = serializers.CharField(source='name', read_only=True)
+    sub_activity_type = serializers.CharField(source='activity_type', read_only=True)
     
     class Meta:
-        model = ActivityBudget
-        fields = '__all__'
+        model = SubActivity
+        fields = [
+            'id', 'sub_activity', 'activity', 'activity_type', *BUDGET_FIELDS,
+            'total_funding', 'estimated_cost', 'funding_gap', 'sub_activity_name', 'sub_activity_type',
+            'created_at', 'updated_at',
+        ]
     
     def get_total_funding(self, obj):
         return obj.total_funding
@@ -75,15 +130,18 @@ class ActivityBudgetSerializer(serializers.ModelSerializer):
     def get_funding_gap(self, obj):
         return obj.funding_gap
 
-class SubActivitySerializer(serializers.ModelSerializer):
+class SubActivitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     main_activity_name = serializers.CharField(source='main_activity.name', read_only=True)
     estimated_cost = serializers.SerializerMethodField()
     total_funding = serializers.SerializerMethodField()
     funding_gap = serializers.SerializerMethodField()
     
+    select_fields = {'main_activity_name': 'main_activity'}
+    
     class Meta:
         model = SubActivity
         fields = '__all__'
+        read_only_fields = ['is_legacy_budget']
     
     def get_estimated_cost(self, obj):
         return obj.estimated_cost
@@ -93,68 +151,170 @@ class SubActivitySerializer(serializers.ModelSerializer):
     
     def get_funding_gap(self, obj):
         return obj.funding_gap
-class MainActivitySerializer(serializers.ModelSerializer):
+class BulkSubActivityRowSerializer(serializers.ModelSerializer):
+    """Input row of a bulk sub-activity write for one main activity"""
+    id = serializers.IntegerField(required=False)
+    
+    class Meta:
+        model = SubActivity
+        exclude = ['main_activity', 'is_legacy_budget', 'created_at', 'updated_at']
+    
+    def to_internal_value(self, data):
+        # Budgets may be sent nested, the way add_budget/update_budget receive them
+        if isinstance(data, dict) and isinstance(data.get('budget'), dict):
+            data = dict(data['budget'], **{key: value for key, value in data.items() if key != 'budget'})
+        return super().to_internal_value(data)
+
+class MainActivitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     initiative_name = serializers.CharField(source='initiative.name', read_only=True)
     organization_name = serializers.CharField(source='organization.name', read_only=True)
     sub_activities = SubActivitySerializer(many=True, read_only=True)
     total_budget = serializers.SerializerMethodField()
     total_funding = serializers.SerializerMethodField()
     funding_gap = serializers.SerializerMethodField()
+    funding_by_source = serializers.SerializerMethodField()
     # Keep legacy budget field for backward compatibility
-    budget = ActivityBudgetSerializer(read_only=True, source='legacy_budgets.first')
+    budget = serializers.SerializerMethodField()
+    
+    expandable_fields = ('sub_activities', 'budget')
+    select_fields = {'initiative_name': 'initiative', 'organization_name': 'organization'}
+    prefetch_fields = {'sub_activities': 'sub_activities', 'budget': 'sub_activities'}
+    # Filled by annotate_main_activity_budgets
+    budget_total_fields = ('total_budget', 'total_funding', 'funding_gap', 'funding_by_source')
     
     class Meta:
         model = MainActivity
         fields = '__all__'
     
+    def get_budget(self, obj):
+        # The activity-level budget lives on the sub-activity marked is_legacy_budget;
+        # read through .all() so the prefetched sub_activities are reused
+        for sub_activity in sorted(obj.sub_activities.all(), key=lambda sub_activity: sub_activity.pk):
+            if sub_activity.is_legacy_budget:
+                return ActivityBudgetSerializer(sub_activity).data
+        return None
+    
     def get_total_budget(self, obj):
-        # Calculate total budget from sub-activities + legacy budget
-        total = 0
-        
-        # Add from sub-activities
-        for sub_activity in obj.sub_activities.all():
-            total += sub_activity.estimated_cost
-        
-        # Add legacy budget if no sub-activities
-        if obj.sub_activities.count() == 0 and hasattr(obj, 'budget') and obj.budget:
-            legacy_cost = (obj.budget.estimated_cost_with_tool 
-                          if obj.budget.budget_calculation_type == 'WITH_TOOL'
-                          else obj.budget.estimated_cost_without_tool)
-            total += legacy_cost
-            
-        return total
+        # Totals come from annotate_main_activity_budgets when the queryset was annotated
+        return obj.budget_totals()['budget_total']
     
     def get_total_funding(self, obj):
-        # Calculate total funding from sub-activities + legacy budget
-        total = 0
-        
-        # Add from sub-activities
-        for sub_activity in obj.sub_activities.all():
-            total += sub_activity.total_funding
-        
-        # Add legacy budget funding if no sub-activities
-        if obj.sub_activities.count() == 0 and hasattr(obj, 'budget') and obj.budget:
-            total += (obj.budget.government_treasury + obj.budget.sdg_funding + 
-                     obj.budget.partners_funding + obj.budget.other_funding)
-            
-        return total
+        return obj.budget_totals()['funding_total']
     
     def get_funding_gap(self, obj):
-        return self.get_total_budget(obj) - self.get_total_funding(obj)
+        totals = obj.budget_totals()
+        return totals['budget_total'] - totals['funding_total']
+    
+    def get_funding_by_source(self, obj):
+        totals = obj.budget_totals()
+        return {source: totals[f'{source}_total'] for source in FUNDING_SOURCES}
 
-class ActivityCostingAssumptionSerializer(serializers.ModelSerializer):
+class BulkMainActivityRowSerializer(serializers.ModelSerializer):
+    """Input row of a bulk write; related ids are checked for the whole batch at once"""
+    id = serializers.IntegerField(required=False)
+    initiative = serializers.IntegerField(source='initiative_id')
+    organization = serializers.IntegerField(source='organization_id', required=False, allow_null=True)
+    
+    class Meta:
+        model = MainActivity
+        exclude = ['created_at', 'updated_at']
+
+class ActivityCostingAssumptionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ActivityCostingAssumption
         fields = '__all__'
 
-class PlanReviewSerializer(serializers.ModelSerializer):
+class PlanReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     evaluator_name = serializers.CharField(source='evaluator.user.username', read_only=True)
     
+    select_fields = {'evaluator_name': 'evaluator__user'}
+    
     class Meta:
         model = PlanReview
         fields = '__all__'
 
-class PlanSerializer(serializers.ModelSerializer):
+class PlanSnapshotSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PlanSnapshot
+        fields = '__all__'
+
+def build_plan_tree(plan):
+    """Assemble the plan's objectives tree from a single prefetched queryset"""
+    weights = plan.selected_objectives_weights or {}
+    objectives_data = []
+    
+    for objective in plan_objectives_queryset(plan):
+        # Get custom weight from selected_objectives_weights if available
+        custom_weight = weights.get(str(objective.id))
+        
+        # Get effective weight (custom weight if set, otherwise original weight)
+        effective_weight = custom_weight if custom_weight is not None else objective.weight
+        
+        # Initiatives, measures and activities are already limited to the planner's organization
+        initiatives_data = []
+        for initiative in objective.initiatives.all():
+            initiatives_data.append({
+                'id': initiative.id,
+                'name': initiative.name,
+                'weight': float(initiative.weight),
+                'organization_name': initiative.organization.name if initiative.organization else None,
+                'performance_measures': PerformanceMeasureSerializer(
+                    initiative.performance_measures.all(), many=True
+                ).data,
+                'main_activities': MainActivitySerializer(
+                    initiative.main_activities.all(), many=True
+                ).data
+            })
+        
+        objectives_data.append({
+            'id': objective.id,
+            'title': objective.title,
+            'description': objective.description,
+            'weight': float(objective.weight),
+            'planner_weight': float(custom_weight) if custom_weight is not None else None,
+            'effective_weight': float(effective_weight),
+            'is_default': objective.is_default,
+            'initiatives': initiatives_data
+        })
+    
+    return objectives_data
+
+def create_plan_snapshot(plan):
+    """Freeze the plan's current objectives tree as its next snapshot version"""
+    latest_version = plan.snapshots.aggregate(latest=Max('version'))['latest'] or 0
+    # Round-trip through the API encoder so the stored document matches the live response
+    data = json.loads(json.dumps(build_plan_tree(plan), cls=JSONEncoder))
+    return PlanSnapshot.objects.create(
+        plan=plan,
+        version=latest_version + 1,
+        data=data
+    )
+
+class PlanSummarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Plan header row for list views; totals come from annotate_plan_budget_totals"""
+    organization_name = serializers.CharField(source='organization.name', read_only=True)
+    strategic_objective_title = serializers.CharField(source='strategic_objective.title', read_only=True)
+    reviews = PlanReviewSerializer(many=True, read_only=True)
+    total_budget = serializers.DecimalField(max_digits=20, decimal_places=2, coerce_to_string=False, read_only=True)
+    total_funding = serializers.DecimalField(max_digits=20, decimal_places=2, coerce_to_string=False, read_only=True)
+    funding_gap = serializers.DecimalField(max_digits=20, decimal_places=2, coerce_to_string=False, read_only=True)
+    
+    expandable_fields = ('reviews',)
+    select_fields = {'organization_name': 'organization', 'strategic_objective_title': 'strategic_objective'}
+    prefetch_fields = {'reviews': 'reviews__evaluator__user'}
+    # Filled by annotate_plan_budget_totals
+    budget_total_fields = ('total_budget', 'total_funding', 'funding_gap')
+    
+    class Meta:
+        model = Plan
+        fields = [
+            'id', 'organization', 'organization_name', 'planner_name', 'executive_name',
+            'type', 'strategic_objective', 'strategic_objective_title', 'fiscal_year',
+            'from_date', 'to_date', 'status', 'submitted_at', 'created_at', 'updated_at',
+            'reviews', 'total_budget', 'total_funding', 'funding_gap'
+        ]
+
+class PlanSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     organization_name = serializers.CharField(source='organization.name', read_only=True)
     strategic_objective_title = serializers.CharField(source='strategic_objective.title', read_only=True)
     program_name = serializers.CharField(source='program.name', read_only=True)
@@ -162,74 +322,31 @@ class PlanSerializer(serializers.ModelSerializer):
     selected_objectives_data = serializers.SerializerMethodField()
     objectives = serializers.SerializerMethodField()
     
+    # Plans in these states are frozen and served from their submit-time snapshot
+    SNAPSHOT_STATUSES = ('SUBMITTED', 'APPROVED', 'REJECTED')
+    
+    expandable_fields = ('reviews', 'selected_objectives_data', 'objectives')
+    select_fields = {
+        'organization_name': 'organization',
+        'strategic_objective_title': 'strategic_objective',
+        'program_name': 'program',
+    }
+    prefetch_fields = {'reviews': 'reviews__evaluator__user'}
+    
     class Meta:
         model = Plan
         fields = '__all__'
     
     def get_selected_objectives_data(self, obj):
         """Get complete data for all selected objectives with their custom weights"""
-        try:
-            selected_objectives = obj.selected_objectives.all()
-            objectives_data = []
-            
-            for objective in selected_objectives:
-                # Get custom weight from selected_objectives_weights if available
-                custom_weight = None
-                if obj.selected_objectives_weights and str(objective.id) in obj.selected_objectives_weights:
-                    custom_weight = obj.selected_objectives_weights[str(objective.id)]
-                
-                # Get effective weight (custom weight if set, otherwise original weight)
-                effective_weight = custom_weight if custom_weight is not None else objective.weight
-                
-                # Get initiatives for this objective - ONLY show planner's organization initiatives
-                from django.db import models
-                initiatives = objective.initiatives.filter(
-                    models.Q(is_default=True) | 
-                    models.Q(organization=obj.organization)
-                ).exclude(
-                    models.Q(organization__isnull=False) & ~models.Q(organization=obj.organization)
-                )
-                
-                initiatives_data = []
-                for initiative in initiatives:
-                    # Get performance measures - ONLY from planner's organization
-                    measures = initiative.performance_measures.filter(
-                        models.Q(organization=obj.organization)
-                    ).exclude(
-                        models.Q(organization__isnull=False) & ~models.Q(organization=obj.organization)
-                    )
-                    
-                    # Get main activities - ONLY from planner's organization
-                    activities = initiative.main_activities.filter(
-                        models.Q(organization=obj.organization)
-                    ).exclude(
-                        models.Q(organization__isnull=False) & ~models.Q(organization=obj.organization)
-                    )
-                    
-                    initiatives_data.append({
-                        'id': initiative.id,
-                        'name': initiative.name,
-                        'weight': float(initiative.weight),
-                        'organization_name': initiative.organization.name if initiative.organization else None,
-                        'performance_measures': PerformanceMeasureSerializer(measures, many=True).data,
-                        'main_activities': MainActivitySerializer(activities, many=True).data
-                    })
-                
-                objectives_data.append({
-                    'id': objective.id,
-                    'title': objective.title,
-                    'description': objective.description,
-                    'weight': float(objective.weight),
-                    'planner_weight': float(custom_weight) if custom_weight is not None else None,
-                    'effective_weight': float(effective_weight),
-                    'is_default': objective.is_default,
-                    'initiatives': initiatives_data
-                })
-            
-            return objectives_data
-        except Exception as e:
-            print(f"Error in get_selected_objectives_data: {str(e)}")
-            return []
+        # The tree is built once per plan and shared with the `objectives` alias
+        cache = self.__dict__.setdefault('_plan_tree_cache', {})
+        if obj.pk not in cache:
+            snapshot = None
+            if obj.status in self.SNAPSHOT_STATUSES:
+                snapshot = obj.snapshots.only('data').first()
+            cache[obj.pk] = snapshot.data if snapshot else build_plan_tree(obj)
+        return cache[obj.pk]
     
     def get_objectives(self, obj):
         """Alias for selected_objectives_data for backward compatibility"""
@@ -315,79 +432,89 @@ class PlanSerializer(serializers.ModelSerializer):
             print(f"Traceback: {traceback.format_exc()}")
             raise serializers.ValidationError(f"Failed to update plan: {str(e)}")
 
-class InitiativeFeedSerializer(serializers.ModelSerializer):
+class InitiativeFeedSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     strategic_objective_title = serializers.CharField(source='strategic_objective.title', read_only=True)
     
+    select_fields = {'strategic_objective_title': 'strategic_objective'}
+    
     class Meta:
         model = InitiativeFeed
         fields = '__all__'
 
 # Location-related serializers
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = '__all__'
 
-class LandTransportSerializer(serializers.ModelSerializer):
+class LandTransportSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     origin_name = serializers.CharField(source='origin.name', read_only=True)
     destination_name = serializers.CharField(source='destination.name', read_only=True)
     
+    select_fields = {'origin_name': 'origin', 'destination_name': 'destination'}
+    
     class Meta:
         model = LandTransport
         fields = '__all__'
 
-class AirTransportSerializer(serializers.ModelSerializer):
+class AirTransportSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     origin_name = serializers.CharField(source='origin.name', read_only=True)
     destination_name = serializers.CharField(source='destination.name', read_only=True)
     
+    select_fields = {'origin_name': 'origin', 'destination_name': 'destination'}
+    
     class Meta:
         model = AirTransport
         fields = '__all__'
 
-class PerDiemSerializer(serializers.ModelSerializer):
+class PerDiemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     location_name = serializers.CharField(source='location.name', read_only=True)
     
+    select_fields = {'location_name': 'location'}
+    
     class Meta:
         model = PerDiem
         fields = '__all__'
 
-class AccommodationSerializer(serializers.ModelSerializer):
+class AccommodationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     location_name = serializers.CharField(source='location.name', read_only=True)
     service_type_display = serializers.CharField(source='get_service_type_display', read_only=True)
     
+    select_fields = {'location_name': 'location'}
+    
     class Meta:
         model = Accommodation
         fields = '__all__'
 
-class ParticipantCostSerializer(serializers.ModelSerializer):
+class ParticipantCostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     cost_type_display = serializers.CharField(source='get_cost_type_display', read_only=True)
     
     class Meta:
         model = ParticipantCost
         fields = '__all__'
 
-class SessionCostSerializer(serializers.ModelSerializer):
+class SessionCostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     cost_type_display = serializers.CharField(source='get_cost_type_display', read_only=True)
     
     class Meta:
         model = SessionCost
         fields = '__all__'
 
-class PrintingCostSerializer(serializers.ModelSerializer):
+class PrintingCostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     document_type_display = serializers.CharField(source='get_document_type_display', read_only=True)
     
     class Meta:
         model = PrintingCost
         fields = '__all__'
 
-class SupervisorCostSerializer(serializers.ModelSerializer):
+class SupervisorCostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     cost_type_display = serializers.CharField(source='get_cost_type_display', read_only=True)
     
     class Meta:
         model = SupervisorCost
         fields = '__all__'
 
-class ProcurementItemSerializer(serializers.ModelSerializer):
+class ProcurementItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category_display = serializers.CharField(source='get_category_display', read_only=True)
     unit_display = serializers.CharField(source='get_unit_display', read_only=True)
     
@@ -0,0 +1,127 @@
+"""
+Signal handlers that keep derived data (budget rollups, the organization
+ancestry index, weight ledgers, table versions) in step with writes. They run inside the writer's transaction.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Organization, StrategicInitiative, PerformanceMeasure, MainActivity, SubActivity
+from .org_tree import add_organization, move_organization, detach_organization_children, is_in_subtree
+from .rollups import ensure_budget_rollups, refresh_budget_rollups
+from .weight_ledger import release_weight
+from .costing_data import CACHED_RATE_MODELS
+from .recosting import index_costing_dependencies, queue_recost, rate_keys_of
+from .table_versions import VERSIONED_MODELS, table_changed
+
+
+@receiver(pre_save, sender=Organization)
+def remember_organization_parent(sender, instance, raw=False, **kwargs):
+    instance._previous_parent_id = None
+    if instance.pk and not raw:
+        instance._previous_parent_id = Organization.objects.filter(pk=instance.pk).values_list(
+            'parent_id', flat=True
+        ).first()
+        if (
+            instance.parent_id
+            and instance.parent_id != instance._previous_parent_id
+            and is_in_subtree(instance.parent_id, instance.pk)
+        ):
+            raise ValidationError('An organization cannot be placed under itself or one of its descendants')
+
+
+@receiver(post_save, sender=Organization)
+def organization_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        add_organization(instance)
+    elif instance.parent_id != getattr(instance, '_previous_parent_id', instance.parent_id):
+        move_organization(instance)
+
+
+@receiver(pre_delete, sender=Organization)
+def organization_deleting(sender, instance, **kwargs):
+    detach_organization_children(instance)
+
+
+@receiver(pre_save, sender=MainActivity)
+def remember_main_activity_parent(sender, instance, raw=False, **kwargs):
+    """Keep the previous (initiative, organization) so a moved activity leaves its old rollup"""
+    instance._previous_rollup_key = None
+    if instance.pk and not raw:
+        instance._previous_rollup_key = MainActivity.objects.filter(pk=instance.pk).values_list(
+            'initiative_id', 'organization_id'
+        ).first()
+
+
+@receiver(post_save, sender=MainActivity)
+def main_activity_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ensure_budget_rollups([instance])
+    previous_key = getattr(instance, '_previous_rollup_key', None)
+    refresh_budget_rollups([instance.pk], [previous_key] if previous_key else [])
+
+
+@receiver(post_delete, sender=MainActivity)
+def main_activity_deleted(sender, instance, **kwargs):
+    refresh_budget_rollups(initiative_keys=[(instance.initiative_id, instance.organization_id)])
+
+
+@receiver(post_save, sender=SubActivity)
+@receiver(post_delete, sender=SubActivity)
+def sub_activity_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_budget_rollups([instance.main_activity_id])
+
+
+@receiver(post_delete, sender=StrategicInitiative)
+@receiver(post_delete, sender=PerformanceMeasure)
+@receiver(post_delete, sender=MainActivity)
+def weighted_child_deleted(sender, instance, **kwargs):
+    release_weight(instance)
+
+
+@receiver(post_save, sender=SubActivity)
+def costed_row_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_costing_dependencies([instance])
+
+
+def remember_rate_keys(sender, instance, raw=False, **kwargs):
+    """Keep the natural key a rate row had before the save; rows costed with it are stale too"""
+    instance._previous_rate_keys = set()
+    if instance.pk and not raw:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._previous_rate_keys = rate_keys_of(previous)
+
+
+def rate_table_changed(sender, instance, **kwargs):
+    # The costing data version moves with the rate tables' table versions (see versioned_table_changed)
+    keys = rate_keys_of(instance) | getattr(instance, '_previous_rate_keys', set())
+    transaction.on_commit(lambda: queue_recost(keys))
+
+
+for rate_model in CACHED_RATE_MODELS:
+    pre_save.connect(remember_rate_keys, sender=rate_model, dispatch_uid=f'costing_data_{rate_model.__name__}_saving')
+    post_save.connect(rate_table_changed, sender=rate_model, dispatch_uid=f'costing_data_{rate_model.__name__}_saved')
+    post_delete.connect(rate_table_changed, sender=rate_model, dispatch_uid=f'costing_data_{rate_model.__name__}_deleted')
+
+
+def versioned_table_changed(sender, **kwargs):
+    table_changed(sender)
+
+
+for versioned_model in VERSIONED_MODELS:
+    post_save.connect(
+        versioned_table_changed, sender=versioned_model, dispatch_uid=f'table_version_{versioned_model.__name__}_saved'
+    )
+    post_delete.connect(
+        versioned_table_changed, sender=versioned_model,
+        dispatch_uid=f'table_version_{versioned_model.__name__}_deleted'
+    )
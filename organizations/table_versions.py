@@ -0,0 +1,109 @@
+"""
+Per-table version counters shared by every worker.
+
+Each TableVersion row counts the committed writes to one model's table.
+Saves and deletes of VERSIONED_MODELS bump it through signals (see
+signals.py); bulk writes, which send no signals, call table_changed
+themselves. Bumps run once the writer's transaction commits, so the short
+UPDATE never holds a lock for the length of a request.
+
+The bump runs after the write is committed, so it must not fail it: a bump
+that keeps hitting lock errors is logged instead of raised (the next write
+to the table moves its version on).
+
+Reading the versions of any number of tables is one indexed query, which
+makes them cheap validators for ETags and cache keys. A version is the
+(counter, time of the last bump) pair, so a restored database or a rolled
+back test never hands out a version already used for other data.
+"""
+import logging
+import threading
+import time
+
+from django.db import transaction, DatabaseError
+from django.db.models import F
+from django.db.models.functions import Now
+
+from .models import (
+    Organization, OrganizationUser, StrategicObjective, Program, InitiativeFeed, StrategicInitiative,
+    PerformanceMeasure, MainActivity, SubActivity, Plan, PlanReview, Location, LandTransport, AirTransport,
+    PerDiem, Accommodation, ParticipantCost, SessionCost, PrintingCost, SupervisorCost, ProcurementItem,
+    ActivityCostingAssumption, TableVersion
+)
+
+# Models whose writes are counted; only these can be asked for their version
+VERSIONED_MODELS = [
+    Organization, OrganizationUser, StrategicObjective, Program, InitiativeFeed, StrategicInitiative,
+    PerformanceMeasure, MainActivity, SubActivity, Plan, PlanReview,
+    # rate tables (organizations.costing_data)
+    Location, LandTransport, AirTransport, PerDiem, Accommodation, ParticipantCost, SessionCost,
+    PrintingCost, SupervisorCost, ProcurementItem, ActivityCostingAssumption,
+]
+
+logger = logging.getLogger(__name__)
+
+# Tables written in the current thread's transaction, bumped when it commits
+_pending = threading.local()
+
+# Attempts at a bump that hits lock errors (deadlock, lock timeout, locked database)
+BUMP_ATTEMPTS = 5
+
+
+def _table(model):
+    return model._meta.label
+
+
+def bump_table_versions(tables):
+    """Increment the counters of the given table labels, creating missing rows"""
+    tables = sorted(set(tables))
+    bump = {'version': F('version') + 1, 'updated_at': Now()}
+    if TableVersion.objects.filter(table__in=tables).update(**bump) < len(tables):
+        existing = set(TableVersion.objects.filter(table__in=tables).values_list('table', flat=True))
+        missing = [table for table in tables if table not in existing]
+        TableVersion.objects.bulk_create([TableVersion(table=table) for table in missing], ignore_conflicts=True)
+        TableVersion.objects.filter(table__in=missing).update(**bump)
+
+
+def _bump_pending():
+    tables = getattr(_pending, 'tables', set())
+    _pending.tables = set()
+    if not tables:
+        return
+    for attempt in range(1, BUMP_ATTEMPTS + 1):
+        try:
+            bump_table_versions(tables)
+            return
+        except DatabaseError:
+            if attempt == BUMP_ATTEMPTS:
+                logger.exception('Could not bump the table versions of %s', ', '.join(sorted(tables)))
+                return
+            time.sleep(0.005 * attempt)
+
+
+def table_changed(*models):
+    """Bump the versions of the models' tables once the current transaction commits; others are ignored"""
+    tables = {_table(model) for model in models if model in VERSIONED_MODELS}
+    if not tables:
+        return
+    if not hasattr(_pending, 'tables'):
+        _pending.tables = set()
+    _pending.tables.update(tables)
+    # Every write registers the callback; the first one to run bumps all pending tables at once
+    transaction.on_commit(_bump_pending)
+
+
+def table_versions(models):
+    """[(table, version)] for the given models, in one query"""
+    unversioned = [model.__name__ for model in models if model not in VERSIONED_MODELS]
+    if unversioned:
+        raise ValueError(f"No table version is kept for {', '.join(unversioned)}")
+    tables = [_table(model) for model in models]
+    if not tables:
+        return []
+    versions = {
+        table: (version, updated_at)
+        for table, version, updated_at in TableVersion.objects.filter(table__in=tables).values_list(
+            'table', 'version', 'updated_at'
+        )
+    }
+    return [(table, versions.get(table, (0, None))) for table in tables]
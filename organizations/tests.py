@@ -0,0 +1,1022 @@
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, DatabaseError
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .bulk import bulk_insert
+from .costing import CostingError, quote
+from .costing_data import costing_data_version
+from .serializers import build_plan_tree
+from .models import (
+    Organization, StrategicObjective, StrategicInitiative, PerformanceMeasure, MainActivity, SubActivity,
+    Plan, InitiativeWeightLedger, OrganizationUser, Location, LandTransport, AirTransport,
+    ProcurementItem, CostingDependency, CostingLineItem
+)
+from .rate_cache import rate_index
+from . import scenarios
+
+
+class BulkPerformanceMeasureTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        self.initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=self.organization
+        )
+        self.measure = PerformanceMeasure.objects.create(
+            initiative=self.initiative, name='Measure', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=self.organization
+        )
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def test_bulk_update_existing_row(self):
+        response = self.client.post('/api/performance-measures/bulk/', [{
+            'id': self.measure.pk,
+            'initiative': self.initiative.pk,
+            'name': 'Measure',
+            'weight': '6',
+            'selected_quarters': ['Q1'],
+            'annual_target': 0,
+        }], format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.measure.refresh_from_db()
+        self.assertEqual(self.measure.weight, Decimal('6'))
+        ledger = InitiativeWeightLedger.objects.get(initiative=self.initiative)
+        self.assertEqual(ledger.measures_weight, Decimal('6'))
+
+
+class ConcurrentWeightLedgerTests(TransactionTestCase):
+    """Writers on their own connections must not over-allocate an initiative between them"""
+    writers = 4
+    attempts = 20
+
+    def setUp(self):
+        objective = StrategicObjective.objects.create(title='Objective', weight=Decimal('100'))
+        self.initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=Decimal('100'), strategic_objective=objective
+        )
+
+    def save_concurrently(self, model):
+        outcomes = {'saved': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(self.writers)
+
+        def writer(number):
+            start.wait()
+            try:
+                for attempt in range(self.attempts):
+                    row = model(
+                        initiative_id=self.initiative.pk, name=f'Writer {number} row {attempt}', weight=Decimal('1'),
+                        selected_quarters=['Q1'], q1_target=Decimal('1'), annual_target=Decimal('1')
+                    )
+                    outcome = 'errors'
+                    for retry in range(200):
+                        try:
+                            row.save()
+                            outcome = 'saved'
+                            break
+                        except ValidationError:
+                            outcome = 'rejected'
+                            break
+                        except DatabaseError:
+                            # A lock error rolled the save back; try the row again
+                            row.pk = None
+                            time.sleep(0.001 * min(retry + 1, 20))
+                    with lock:
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(number,)) for number in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def assert_cap_held(self, model, ledger_field):
+        cap = model.weight_cap(self.initiative)
+        outcomes = self.save_concurrently(model)
+
+        stored = sum(model.objects.filter(initiative=self.initiative).values_list('weight', flat=True), Decimal('0'))
+        ledger = InitiativeWeightLedger.objects.get(initiative=self.initiative)
+        self.assertEqual(stored, cap)
+        self.assertEqual(getattr(ledger, ledger_field), stored)
+        self.assertEqual(
+            outcomes, {'saved': int(cap), 'rejected': self.writers * self.attempts - int(cap), 'errors': 0}
+        )
+
+    def test_concurrent_measures_stay_within_cap(self):
+        self.assert_cap_held(PerformanceMeasure, 'measures_weight')
+
+    def test_concurrent_activities_stay_within_cap(self):
+        self.assert_cap_held(MainActivity, 'activities_weight')
+
+
+class BulkInsertTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        self.initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+
+    def measures(self, count):
+        return [
+            PerformanceMeasure(
+                initiative=self.initiative, name=f'Measure {index}', weight=1,
+                selected_quarters=['Q1'], annual_target=0
+            )
+            for index in range(count)
+        ]
+
+    def test_ids_read_back_without_returning_insert(self):
+        # MySQL cannot return ids from a multi-row INSERT; the rows are re-selected by batch key
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert',
+            new_callable=mock.PropertyMock, return_value=False
+        ):
+            with self.assertNumQueries(3):
+                small = bulk_insert(PerformanceMeasure, self.measures(3))
+            with self.assertNumQueries(3):
+                large = bulk_insert(PerformanceMeasure, self.measures(40))
+
+        for instance in small + large:
+            self.assertEqual(PerformanceMeasure.objects.get(pk=instance.pk).name, instance.name)
+        self.assertEqual(len({instance.pk for instance in small + large}), 43)
+
+
+class LegacyBudgetTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        self.activity = MainActivity.objects.create(
+            initiative=initiative, name='Activity', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=organization
+        )
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def post_budget(self, cost):
+        return self.client.post(f'/api/main-activities/{self.activity.pk}/budget/', {
+            'activity_type': 'Other',
+            'budget_calculation_type': 'WITHOUT_TOOL',
+            'estimated_cost_without_tool': cost,
+            'government_treasury': 0,
+        }, format='json')
+
+    def test_budget_survives_rename(self):
+        self.assertEqual(self.post_budget(700).status_code, 201)
+        self.activity.name = 'Renamed activity'
+        self.activity.save()
+
+        response = self.post_budget(900)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        budgets = SubActivity.objects.filter(main_activity=self.activity)
+        self.assertEqual(budgets.count(), 1)
+        self.assertTrue(budgets.get().is_legacy_budget)
+        self.assertEqual(budgets.get().estimated_cost_without_tool, Decimal('900'))
+
+    def test_zero_cost_budget_is_accepted(self):
+        response = self.post_budget(0)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(SubActivity.objects.get(main_activity=self.activity).estimated_cost, 0)
+
+    def test_funding_over_cost_is_rejected(self):
+        response = self.client.post(f'/api/main-activities/{self.activity.pk}/budget/', {
+            'activity_type': 'Other',
+            'budget_calculation_type': 'WITHOUT_TOOL',
+            'estimated_cost_without_tool': 100,
+            'government_treasury': 150,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(SubActivity.objects.filter(main_activity=self.activity).exists())
+
+
+class PlanCloneTests(TestCase):
+    def setUp(self):
+        self.source = Organization.objects.create(name='Source', type='MINISTER')
+        self.target = Organization.objects.create(name='Target', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        self.initiative = StrategicInitiative.objects.create(
+            name='Default initiative', weight=20, strategic_objective=objective, is_default=True
+        )
+        self.plan = Plan.objects.create(
+            organization=self.source, planner_name='Planner', type='LEO/EO Plan', strategic_objective=objective,
+            fiscal_year='2026', from_date='2026-07-01', to_date='2027-06-30'
+        )
+        self.plan.selected_objectives.set([objective])
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def clone(self, **data):
+        return self.client.post(f'/api/plans/{self.plan.pk}/clone/', {
+            'fiscal_year': '2027', 'from_date': '2027-07-01', 'to_date': '2028-06-30', **data
+        }, format='json')
+
+    def test_clone_over_shared_initiative_cap_is_rejected(self):
+        PerformanceMeasure.objects.create(
+            initiative=self.initiative, name='Measure', weight=30, selected_quarters=['Q1'],
+            annual_target=0, organization=self.source
+        )
+
+        response = self.clone(organization=self.target.pk)
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(Plan.objects.count(), 1)
+        self.assertFalse(PerformanceMeasure.objects.filter(organization=self.target).exists())
+        ledger = InitiativeWeightLedger.objects.get(initiative=self.initiative)
+        self.assertEqual(ledger.measures_weight, Decimal('30'))
+
+    def test_clone_with_malformed_organization(self):
+        response = self.clone(organization=['not', 'an', 'id'])
+
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_clone_for_another_organization_copies_the_tree(self):
+        measure = PerformanceMeasure.objects.create(
+            initiative=self.initiative, name='Measure', weight=5, selected_quarters=['Q1'],
+            annual_target=0, organization=self.source
+        )
+
+        response = self.clone(organization=self.target.pk)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(response.data['header_only'])
+        self.assertEqual(response.data['copied']['performance_measures'], 1)
+        copy = PerformanceMeasure.objects.get(organization=self.target)
+        self.assertNotEqual(copy.pk, measure.pk)
+        self.assertEqual(copy.name, 'Measure')
+
+    def test_same_organization_clone_is_refused(self):
+        response = self.clone()
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual(Plan.objects.count(), 1)
+
+    def test_same_organization_header_only_clone(self):
+        PerformanceMeasure.objects.create(
+            initiative=self.initiative, name='Measure', weight=5, selected_quarters=['Q1'],
+            annual_target=0, organization=self.source
+        )
+
+        response = self.clone(header_only=True)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(response.data['header_only'])
+        self.assertIsNone(response.data['copied'])
+        self.assertEqual(Plan.objects.filter(organization=self.source, fiscal_year='2027').count(), 1)
+        self.assertEqual(PerformanceMeasure.objects.count(), 1)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        self.activity = MainActivity.objects.create(
+            initiative=initiative, name='Activity', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=organization
+        )
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_related_write_changes_etag(self):
+        url = f'/api/main-activities/{self.activity.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SubActivity.objects.create(main_activity=self.activity, name='Sub', activity_type='Other')
+
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_detail_etag_follows_the_row(self):
+        url = f'/api/main-activities/{self.activity.pk}/'
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        not_modified = self.revalidate(url, etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+        self.activity.name = 'Renamed'
+        self.activity.save()
+
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['name'], 'Renamed')
+
+        other = APIClient()
+        other.force_login(User.objects.create_user('reviewer', 'reviewer@example.com', 'pw'))
+        self.assertNotEqual(other.get(url)['ETag'], response['ETag'])
+
+    def test_related_tables_cost_one_query(self):
+        url = f'/api/main-activities/{self.activity.pk}/'
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.revalidate(url, etag).status_code, 304)
+        self.assertEqual(
+            len([query for query in queries.captured_queries if 'tableversion' in query['sql']]), 1
+        )
+
+    def test_list_revalidates_from_table_versions_only(self):
+        etag = self.client.get('/api/main-activities/')['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.revalidate('/api/main-activities/', etag).status_code, 304)
+        self.assertFalse([
+            query for query in queries.captured_queries if '"organizations_mainactivity"' in query['sql']
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.activity.name = 'Renamed'
+            self.activity.save()
+        self.assertEqual(self.revalidate('/api/main-activities/', etag).status_code, 200)
+
+    def test_costing_reference_revalidates(self):
+        response = self.client.get('/api/costing-reference/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        self.assertEqual(self.revalidate('/api/costing-reference/', response['ETag']).status_code, 304)
+
+    def test_rate_write_changes_costing_reference(self):
+        etag = self.client.get('/api/costing-reference/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Location.objects.create(name='Adama', region='Oromia')
+
+        response = self.revalidate('/api/costing-reference/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([row['name'] for row in response.json()['tables']['locations']], ['Adama'])
+
+
+class CostingDataVersionTests(TestCase):
+    def test_version_is_read_from_the_database(self):
+        version = costing_data_version()
+        # Another worker's cache knows nothing of this one's
+        cache.clear()
+        self.assertEqual(costing_data_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Location.objects.create(name='Adama', region='Oromia')
+
+        self.assertNotEqual(costing_data_version(), version)
+        self.assertEqual([row['name'] for row in rate_index('locations').values()], ['Adama'])
+
+
+class CostingDependencyTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        self.activity = MainActivity.objects.create(
+            initiative=initiative, name='Activity', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=organization
+        )
+
+    def test_malformed_details_save_without_dependencies(self):
+        sub_activity = SubActivity.objects.create(
+            main_activity=self.activity, name='Training', activity_type='Training',
+            budget_calculation_type='WITH_TOOL', estimated_cost_with_tool=1200,
+            training_details=['free-form', 'notes']
+        )
+
+        sub_activity.refresh_from_db()
+        self.assertEqual(sub_activity.estimated_cost_with_tool, Decimal('1200'))
+        self.assertFalse(CostingDependency.objects.filter(sub_activity=sub_activity).exists())
+        self.assertFalse(CostingLineItem.objects.filter(sub_activity=sub_activity).exists())
+
+
+class ScenarioTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        self.activity = MainActivity.objects.create(
+            initiative=initiative, name='Activity', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=organization
+        )
+        SubActivity.objects.create(
+            main_activity=self.activity, name='Training', activity_type='Training',
+            budget_calculation_type='WITH_TOOL', estimated_cost_with_tool=1200, training_details='notes'
+        )
+        plan = Plan.objects.create(
+            organization=organization, planner_name='Planner', type='LEO/EO Plan', strategic_objective=objective,
+            fiscal_year='2026', from_date='2026-07-01', to_date='2027-06-30'
+        )
+        plan.selected_objectives.set([objective])
+        scenarios._local_bases.clear()
+
+    def test_malformed_details_keep_their_stored_cost(self):
+        result = scenarios.run_scenario('2026', {'categories': {'other_costs': 2}})
+
+        self.assertEqual(result['totals']['baseline_cost'], Decimal('1200.00'))
+        self.assertEqual(result['totals']['scenario_cost'], Decimal('2400.00'))
+
+    def test_loaded_bases_are_bounded(self):
+        for year in range(2020, 2020 + scenarios.SCENARIO_BASE_LIMIT + 2):
+            scenarios.run_scenario(str(year))
+        scenarios.run_scenario('2026')
+
+        self.assertEqual(len(scenarios._local_bases), scenarios.SCENARIO_BASE_LIMIT)
+        self.assertEqual(next(reversed(scenarios._local_bases)), '2026')
+
+    def test_multipliers_apply_per_category_and_activity_type(self):
+        SubActivity.objects.create(
+            main_activity=self.activity, name='Printing', activity_type='Printing',
+            budget_calculation_type='WITH_TOOL', estimated_cost_with_tool=4000,
+            printing_details={'documentType': 'Booklet', 'numberOfPages': 10, 'numberOfCopies': 10}
+        )
+        SubActivity.objects.create(
+            main_activity=self.activity, name='Other', activity_type='Other', estimated_cost_without_tool=500
+        )
+        client = APIClient()
+        client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+        response = client.post('/api/scenarios/simulate/', {
+            'fiscal_year': '2026',
+            'multipliers': {'categories': {'printing': 1.5}, 'activity_types': {'Other': 2}},
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['totals']['baseline_cost'], Decimal('5700.00'))
+        self.assertEqual(response.data['totals']['scenario_cost'], Decimal('8200.00'))
+        categories = {row['category']: row for row in response.data['by_category']}
+        self.assertEqual(categories['printing']['scenario_cost'], Decimal('6000.00'))
+
+        response = client.post('/api/scenarios/simulate/', {
+            'fiscal_year': '2026', 'multipliers': {'categories': {'catering': 2}},
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PlanBudgetTotalsTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Org', type='MINISTER')
+        other = Organization.objects.create(name='Other', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        initiatives = [
+            StrategicInitiative.objects.create(name='Default', weight=10, strategic_objective=objective, is_default=True),
+            StrategicInitiative.objects.create(
+                name='Own', weight=10, strategic_objective=objective, organization=self.organization
+            ),
+            StrategicInitiative.objects.create(name='Foreign', weight=10, strategic_objective=objective, organization=other),
+        ]
+        for initiative, cost in zip(initiatives, (100, 200, 400)):
+            activity = MainActivity.objects.create(
+                initiative=initiative, name=f'{initiative.name} activity', weight=2, selected_quarters=['Q1'],
+                annual_target=0, organization=self.organization
+            )
+            SubActivity.objects.create(
+                main_activity=activity, name='Sub', activity_type='Other',
+                estimated_cost_without_tool=cost, government_treasury=50
+            )
+        self.plan = Plan.objects.create(
+            organization=self.organization, planner_name='Planner', type='LEO/EO Plan', strategic_objective=objective,
+            fiscal_year='2026', from_date='2026-07-01', to_date='2027-06-30'
+        )
+        self.plan.selected_objectives.set([objective])
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def test_list_totals_match_budget_summary(self):
+        listed = self.client.get('/api/plans/').data['results'][0]
+        summary = self.client.get(f'/api/plans/{self.plan.pk}/budget-summary/').data['totals']
+
+        self.assertEqual(Decimal(str(summary['estimated_cost'])), Decimal('300'))
+        self.assertEqual(Decimal(str(listed['total_budget'])), Decimal(str(summary['estimated_cost'])))
+        self.assertEqual(Decimal(str(listed['total_funding'])), Decimal(str(summary['total_funding'])))
+        self.assertEqual(Decimal(str(listed['funding_gap'])), Decimal(str(summary['funding_gap'])))
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/plans/')
+        return response.data['results'], len(queries.captured_queries)
+
+    def test_list_returns_plan_headers_in_fixed_queries(self):
+        plans, one = self.list_queries()
+        for fiscal_year in ('2027', '2028'):
+            plan = Plan.objects.create(
+                organization=self.organization, planner_name='Planner', type='LEO/EO Plan',
+                strategic_objective=self.plan.strategic_objective, fiscal_year=fiscal_year,
+                from_date=f'{fiscal_year}-07-01', to_date=f'{int(fiscal_year) + 1}-06-30'
+            )
+            plan.selected_objectives.set(self.plan.selected_objectives.all())
+        plans, three = self.list_queries()
+
+        self.assertEqual(three, one)
+        self.assertEqual(len(plans), 3)
+        self.assertNotIn('objectives', plans[0])
+        self.assertEqual({Decimal(str(plan['total_budget'])) for plan in plans}, {Decimal('300')})
+
+        full = self.client.get('/api/plans/', {'view': 'full'}).data['results']
+        self.assertIn('objectives', full[0])
+
+
+class PlanTreeTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Org', type='MINISTER')
+        self.objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        self.plan = Plan.objects.create(
+            organization=self.organization, planner_name='Planner', type='LEO/EO Plan',
+            strategic_objective=self.objective, fiscal_year='2026', from_date='2026-07-01', to_date='2027-06-30'
+        )
+        self.plan.selected_objectives.set([self.objective])
+
+    def add_initiative(self, name):
+        initiative = StrategicInitiative.objects.create(
+            name=name, weight=10, strategic_objective=self.objective, organization=self.organization
+        )
+        PerformanceMeasure.objects.create(
+            initiative=initiative, name=f'{name} measure', weight=5, selected_quarters=['Q1'],
+            annual_target=0, organization=self.organization
+        )
+        activity = MainActivity.objects.create(
+            initiative=initiative, name=f'{name} activity', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=self.organization
+        )
+        SubActivity.objects.create(
+            main_activity=activity, name='Sub', activity_type='Other', estimated_cost_without_tool=100
+        )
+
+    def tree_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            tree = build_plan_tree(self.plan)
+        return tree, len(queries.captured_queries)
+
+    def test_query_count_does_not_grow_with_the_tree(self):
+        self.add_initiative('First')
+        _, one = self.tree_queries()
+        for name in ('Second', 'Third', 'Fourth'):
+            self.add_initiative(name)
+        tree, four = self.tree_queries()
+
+        self.assertEqual(four, one)
+        initiatives = tree[0]['initiatives']
+        self.assertEqual(len(initiatives), 4)
+        self.assertEqual(
+            [activity['name'] for initiative in initiatives for activity in initiative['main_activities']],
+            ['First activity', 'Second activity', 'Third activity', 'Fourth activity']
+        )
+
+    def test_submitted_plan_is_served_from_its_snapshot(self):
+        self.add_initiative('First')
+        client = APIClient()
+        client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+        response = client.post(f'/api/plans/{self.plan.pk}/submit/')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['snapshot_version'], 1)
+        MainActivity.objects.filter(name='First activity').update(name='Edited after submit')
+
+        objectives = client.get(f'/api/plans/{self.plan.pk}/').data['objectives']
+        self.assertEqual(objectives[0]['initiatives'][0]['main_activities'][0]['name'], 'First activity')
+        live = build_plan_tree(self.plan)
+        self.assertEqual(live[0]['initiatives'][0]['main_activities'][0]['name'], 'Edited after submit')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        self.initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        for index in range(5):
+            MainActivity.objects.create(
+                initiative=self.initiative, name=f'Activity {index}', weight=1, selected_quarters=['Q1'],
+                annual_target=0, organization=organization
+            )
+        # Rows written in one batch share created_at; id breaks the tie
+        MainActivity.objects.update(created_at=MainActivity.objects.order_by('pk').first().created_at)
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def test_pages_are_stable_on_equal_created_at(self):
+        ids = list(MainActivity.objects.order_by('pk').values_list('pk', flat=True))
+        seen = []
+        url, params = '/api/main-activities/', {'page_size': 2, 'fields': 'id'}
+        while url:
+            page = self.client.get(url, params).data
+            seen.extend(row['id'] for row in page['results'])
+            if len(seen) == 2:
+                # A row added while paging sorts after the rows already served
+                MainActivity.objects.create(
+                    initiative=self.initiative, name='Late', weight=1, selected_quarters=['Q1'], annual_target=0
+                )
+            url, params = page['next'], {}
+
+        late = MainActivity.objects.get(name='Late').pk
+        self.assertEqual(seen, ids + [late])
+
+
+class MainActivityBudgetTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        self.initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def add_activity(self, name):
+        activity = MainActivity.objects.create(
+            initiative=self.initiative, name=name, weight=1, selected_quarters=['Q1'], annual_target=0
+        )
+        SubActivity.objects.create(
+            main_activity=activity, name='Tool', activity_type='Other', budget_calculation_type='WITH_TOOL',
+            estimated_cost_with_tool=300, estimated_cost_without_tool=999, government_treasury=100
+        )
+        SubActivity.objects.create(
+            main_activity=activity, name='Manual', activity_type='Other',
+            estimated_cost_without_tool=200, sdg_funding=50, partners_funding=25
+        )
+        return activity
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/main-activities/')
+        return response.data['results'], len(queries.captured_queries)
+
+    def test_totals_come_from_one_annotated_query(self):
+        self.add_activity('First')
+        _, one = self.list_queries()
+        self.add_activity('Second')
+        self.add_activity('Third')
+        activities, three = self.list_queries()
+
+        self.assertEqual(three, one)
+        for activity in activities:
+            self.assertEqual(Decimal(str(activity['total_budget'])), Decimal('500'))
+            self.assertEqual(Decimal(str(activity['total_funding'])), Decimal('175'))
+            self.assertEqual(Decimal(str(activity['funding_gap'])), Decimal('325'))
+            self.assertEqual(
+                {source: Decimal(str(value)) for source, value in activity['funding_by_source'].items()},
+                {'government_treasury': 100, 'sdg_funding': 50, 'partners_funding': 25, 'other_funding': 0}
+            )
+
+
+class OrganizationTreeTests(TestCase):
+    def setUp(self):
+        self.ministry = Organization.objects.create(name='Ministry', type='MINISTER')
+        self.state = Organization.objects.create(name='State', type='STATE_MINISTER', parent=self.ministry)
+        self.desk = Organization.objects.create(name='Desk', type='DESK', parent=self.state)
+        self.agency = Organization.objects.create(name='Agency', type='MINISTER')
+        self.objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        self.initiative = StrategicInitiative.objects.create(
+            name='Default initiative', weight=20, strategic_objective=self.objective, is_default=True
+        )
+        self.client = APIClient()
+        self.user = User.objects.create_user('planner', 'planner@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def add_plan(self, organization, cost, funding=0, status='SUBMITTED'):
+        activity = MainActivity.objects.create(
+            initiative=self.initiative, name=f'{organization.name} activity', weight=1, selected_quarters=['Q1'],
+            annual_target=0, organization=organization
+        )
+        SubActivity.objects.create(
+            main_activity=activity, name='Sub', activity_type='Other',
+            estimated_cost_without_tool=cost, government_treasury=funding
+        )
+        plan = Plan.objects.create(
+            organization=organization, planner_name='Planner', type='LEO/EO Plan', strategic_objective=self.objective,
+            fiscal_year='2026', from_date='2026-07-01', to_date='2027-06-30', status=status
+        )
+        plan.selected_objectives.set([self.objective])
+        return plan
+
+    def test_budget_rollup_sums_each_subtree(self):
+        self.add_plan(self.state, 300, funding=100)
+        self.add_plan(self.desk, 200, funding=50)
+        self.add_plan(self.agency, 1000, status='DRAFT')
+
+        response = self.client.get('/api/organizations/budget-rollup/', {'fiscal_year': '2026', 'status': 'SUBMITTED'})
+
+        self.assertEqual(response.status_code, 200, response.content)
+        rows = {row['id']: row for row in response.data['organizations']}
+        self.assertEqual(rows[self.ministry.pk]['own']['estimated_cost'], 0)
+        self.assertEqual(rows[self.ministry.pk]['subtree']['estimated_cost'], Decimal('500'))
+        self.assertEqual(rows[self.ministry.pk]['subtree']['funding_gap'], Decimal('350'))
+        self.assertEqual(rows[self.state.pk]['own']['estimated_cost'], Decimal('300'))
+        self.assertEqual(rows[self.desk.pk]['plan_count'], 1)
+        self.assertEqual(rows[self.agency.pk]['subtree']['estimated_cost'], 0)
+
+    def test_closure_follows_a_reparented_subtree(self):
+        self.state.parent = self.agency
+        self.state.save()
+
+        descendants = self.client.get(f'/api/organizations/{self.ministry.pk}/descendants/')
+        self.assertEqual(descendants.data, [])
+        descendants = self.client.get(f'/api/organizations/{self.agency.pk}/descendants/')
+        self.assertEqual({row['id'] for row in descendants.data}, {self.state.pk, self.desk.pk})
+        ancestors = self.client.get(f'/api/organizations/{self.desk.pk}/ancestors/')
+        self.assertEqual([row['id'] for row in ancestors.data], [self.state.pk, self.agency.pk])
+
+    def test_evaluator_sees_only_plans_in_their_subtree(self):
+        OrganizationUser.objects.create(user=self.user, organization=self.state, role='EVALUATOR')
+        pending = self.add_plan(self.desk, 100)
+        reviewed = self.add_plan(self.state, 100, status='APPROVED')
+        self.add_plan(self.ministry, 100)
+        self.add_plan(self.agency, 100)
+
+        response = self.client.get('/api/plans/pending_reviews/')
+        self.assertEqual([row['id'] for row in response.data['results']], [pending.pk])
+        response = self.client.get('/api/plans/reviewed/')
+        self.assertEqual([row['id'] for row in response.data['results']], [reviewed.pk])
+        response = self.client.get('/api/plans/review_counts/')
+        self.assertEqual(response.data['SUBMITTED'], 1)
+        self.assertEqual(response.data['APPROVED'], 1)
+
+
+class PlanWeightValidationTests(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Org', type='MINISTER')
+        self.objective = StrategicObjective.objects.create(title='Objective', weight=100)
+        self.initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=100, strategic_objective=self.objective, organization=self.organization
+        )
+        PerformanceMeasure.objects.create(
+            initiative=self.initiative, name='Measure', weight=35, selected_quarters=['Q1'],
+            annual_target=0, organization=self.organization
+        )
+        MainActivity.objects.create(
+            initiative=self.initiative, name='Activity', weight=60, selected_quarters=['Q1'],
+            annual_target=0, organization=self.organization
+        )
+        self.plan = Plan.objects.create(
+            organization=self.organization, planner_name='Planner', type='LEO/EO Plan',
+            strategic_objective=self.objective, fiscal_year='2026', from_date='2026-07-01', to_date='2027-06-30'
+        )
+        self.plan.selected_objectives.set([self.objective])
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def test_violations_are_reported_per_rule(self):
+        response = self.client.get(f'/api/plans/{self.plan.pk}/validate/')
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(response.data['is_valid'])
+        self.assertEqual(response.data['initiatives_checked'], 1)
+        [violation] = response.data['violations']
+        self.assertEqual(violation['rule'], 'activities_total')
+        self.assertEqual(violation['id'], self.initiative.pk)
+        self.assertEqual((violation['expected'], violation['actual']), (65.0, 60.0))
+
+    def test_balanced_plan_is_valid(self):
+        MainActivity.objects.filter(initiative=self.initiative).update(weight=65)
+
+        response = self.client.get(f'/api/plans/{self.plan.pk}/validate/')
+
+        self.assertEqual(response.data['violations'], [])
+        self.assertTrue(response.data['is_valid'])
+
+
+class BulkSubActivityTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        self.activity = MainActivity.objects.create(
+            initiative=initiative, name='Activity', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=organization
+        )
+        self.existing = SubActivity.objects.create(
+            main_activity=self.activity, name='Existing', activity_type='Other', estimated_cost_without_tool=100
+        )
+        self.url = f'/api/main-activities/{self.activity.pk}/bulk-sub-activities/'
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def test_rows_are_upserted_in_input_order(self):
+        response = self.client.post(self.url, [
+            {'name': 'New', 'activity_type': 'Other',
+             'budget': {'estimated_cost_without_tool': 300, 'government_treasury': 120}},
+            {'id': self.existing.pk, 'name': 'Existing', 'activity_type': 'Other', 'estimated_cost_without_tool': 250},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual([row['name'] for row in response.data], ['New', 'Existing'])
+        self.assertEqual(response.data[1]['id'], self.existing.pk)
+        created = SubActivity.objects.get(pk=response.data[0]['id'])
+        self.assertEqual((created.estimated_cost, created.total_funding), (Decimal('300'), Decimal('120')))
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.estimated_cost_without_tool, Decimal('250'))
+
+    def test_invalid_budget_rejects_the_whole_batch(self):
+        response = self.client.post(self.url, [
+            {'name': 'Fine', 'activity_type': 'Other', 'estimated_cost_without_tool': 300},
+            {'name': 'Overfunded', 'activity_type': 'Other', 'estimated_cost_without_tool': 100, 'sdg_funding': 150},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertEqual(SubActivity.objects.filter(main_activity=self.activity).count(), 1)
+
+
+class CostingEngineTests(TestCase):
+    """Quotes must match what the costing tools in src/components compute for the same payload"""
+
+    def test_training_multiplies_the_subtotal_by_sessions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            location = Location.objects.create(name='Gambella', region='Gambela', is_hardship_area=True)
+
+        result = quote('Training', {
+            'trainingLocationId': location.pk, 'numberOfDays': 3, 'numberOfParticipants': 10, 'numberOfSessions': 2,
+            'additionalParticipantCosts': [{'costType': 'FLASH_DISK'}],
+            'additionalSessionCosts': [{'costType': 'FLIP_CHART'}], 'otherCosts': 400,
+        })
+
+        # (1100 + 200 hardship) * 10 * 3 + 500 * 10 + 300 * 2 + 400, times 2 sessions
+        self.assertEqual(result['breakdown']['per_diem'], Decimal('39000'))
+        self.assertEqual(result['breakdown']['subtotal'], Decimal('45000'))
+        self.assertEqual(result['total'], Decimal('90000'))
+        self.assertEqual(sum(line['amount'] for line in result['lines']), result['total'])
+
+    def test_printing_uses_the_tool_price_per_page(self):
+        result = quote('Printing', {'documentType': 'Booklet', 'numberOfPages': 20, 'numberOfCopies': 50})
+
+        self.assertEqual(result['total'], Decimal('40000'))
+
+    def test_procurement_sums_catalogue_items(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            chair = ProcurementItem.objects.create(category='FURNITURE', name='Chair', unit='PIECE', unit_price=3000)
+
+        result = quote('Procurement', {
+            'items': [{'itemId': str(chair.pk), 'quantity': 4}, {'itemId': '', 'quantity': 1}], 'otherCosts': 1000,
+        })
+
+        self.assertEqual(result['breakdown']['procurement'], Decimal('12000'))
+        self.assertEqual(result['total'], Decimal('13000'))
+
+    def test_unknown_activity_type_is_rejected(self):
+        with self.assertRaises(CostingError):
+            quote('Other', {})
+
+
+class RouteTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.addis, self.adama, self.hawassa, self.semera = [
+                Location.objects.create(name=name, region=region) for name, region in (
+                    ('Addis Ababa', 'Addis Ababa'), ('Adama', 'Oromia'), ('Hawassa', 'Sidama'), ('Semera', 'Afar')
+                )
+            ]
+            LandTransport.objects.create(origin=self.addis, destination=self.adama, price=1000)
+            LandTransport.objects.create(origin=self.adama, destination=self.hawassa, price=800)
+            LandTransport.objects.create(origin=self.addis, destination=self.hawassa, price=2500)
+            AirTransport.objects.create(origin=self.addis, destination=self.hawassa, price=1500)
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def get_quote(self, **params):
+        return self.client.get('/api/routes/quote/', params)
+
+    def test_land_route_takes_the_cheapest_multi_leg_path(self):
+        response = self.get_quote(origin=self.addis.pk, destination=self.hawassa.pk, mode='land', participants=3)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        [leg] = response.data['legs']
+        self.assertEqual(leg['price'], Decimal('1800.00'))
+        self.assertFalse(leg['direct'])
+        self.assertEqual(
+            [(hop['origin'], hop['destination']) for hop in leg['hops']],
+            [(self.addis.pk, self.adama.pk), (self.adama.pk, self.hawassa.pk)]
+        )
+        self.assertEqual(response.data['total'], Decimal('5400.00'))
+
+    def test_any_mode_prefers_a_cheaper_flight(self):
+        response = self.get_quote(origin=self.hawassa.pk, destination=self.addis.pk)
+
+        [leg] = response.data['legs']
+        self.assertEqual(leg['price'], Decimal('1500.00'))
+        self.assertEqual([hop['mode'] for hop in leg['hops']], ['air'])
+
+    def test_unreachable_destination_is_rejected(self):
+        response = self.get_quote(origin=self.addis.pk, destination=self.semera.pk)
+
+        self.assertEqual(response.status_code, 400)
+
+
+class LineItemTotalsTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        activity = MainActivity.objects.create(
+            initiative=initiative, name='Activity', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=organization
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            adama = Location.objects.create(name='Adama', region='Oromia')
+        with self.captureOnCommitCallbacks(execute=True):
+            SubActivity.objects.create(
+                main_activity=activity, name='Training', activity_type='Training',
+                budget_calculation_type='WITH_TOOL', estimated_cost_with_tool=11000,
+                training_details={'trainingLocationId': adama.pk, 'numberOfDays': 2, 'numberOfParticipants': 5}
+            )
+            SubActivity.objects.create(
+                main_activity=activity, name='Printing', activity_type='Printing',
+                budget_calculation_type='WITH_TOOL', estimated_cost_with_tool=4000,
+                printing_details={'documentType': 'Booklet', 'numberOfPages': 10, 'numberOfCopies': 10}
+            )
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def totals(self, group_by):
+        response = self.client.get('/api/costing/line-item-totals/', {'group_by': group_by})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_totals_group_by_category_and_region(self):
+        by_category = {row['category']: (row['amount'], row['lines']) for row in self.totals('category')}
+        self.assertEqual(by_category, {'per_diem': (Decimal('11000'), 1), 'printing': (Decimal('4000'), 1)})
+
+        by_region = {row['region']: row['amount'] for row in self.totals('region,category')}
+        self.assertEqual(by_region, {'Oromia': Decimal('11000'), None: Decimal('4000')})
+
+    def test_unknown_group_is_rejected(self):
+        response = self.client.get('/api/costing/line-item-totals/', {'group_by': 'colour'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        organization = Organization.objects.create(name='Org', type='MINISTER')
+        objective = StrategicObjective.objects.create(title='Objective', weight=50)
+        self.initiative = StrategicInitiative.objects.create(
+            name='Initiative', weight=20, strategic_objective=objective, organization=organization
+        )
+        activity = MainActivity.objects.create(
+            initiative=self.initiative, name='Activity', weight=2, selected_quarters=['Q1'],
+            annual_target=0, organization=organization
+        )
+        SubActivity.objects.create(
+            main_activity=activity, name='Sub', activity_type='Other', estimated_cost_without_tool=100
+        )
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('planner', 'planner@example.com', 'pw'))
+
+    def list_queries(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/main-activities/', dict(params, initiative=self.initiative.pk))
+        self.assertEqual(response.status_code, 200, response.content)
+        # leave out the session, user and table version lookups every request makes
+        return response.data['results'], [
+            query['sql'] for query in queries.captured_queries
+            if 'organizations_' in query['sql'] and 'tableversion' not in query['sql']
+        ]
+
+    def test_fields_narrow_rows_and_queries(self):
+        rows, queries = self.list_queries({'fields': 'id,name'})
+
+        self.assertEqual([set(row) for row in rows], [{'id', 'name'}])
+        [query] = queries
+        self.assertNotIn('JOIN', query)
+
+    def test_expand_adds_only_the_named_heavy_fields(self):
+        rows, _ = self.list_queries({'expand': 'sub_activities'})
+
+        [row] = rows
+        self.assertNotIn('budget', row)
+        self.assertEqual([sub['name'] for sub in row['sub_activities']], ['Sub'])
+        self.assertEqual(Decimal(str(row['total_budget'])), Decimal('100'))
+
+        rows, _ = self.list_queries({})
+        self.assertIn('budget', rows[0])
+        self.assertIn('sub_activities', rows[0])
@@ -9,7 +9,7 @@ from .views import (
     LocationViewSet, LandTransportViewSet, AirTransportViewSet,
     PerDiemViewSet, AccommodationViewSet, ParticipantCostViewSet,
     SessionCostViewSet, PrintingCostViewSet, SupervisorCostViewSet,
-    ProcurementItemViewSet,login_view, logout_view, check_auth,
+    ProcurementItemViewSet, CostingReferenceViewSet, CostingViewSet, ScenarioViewSet, RouteViewSet, login_view, logout_view, check_auth,
     update_profile, password_change
 )
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_protect
@@ -22,7 +22,7 @@ router.register(r'strategic-initiatives', StrategicInitiativeViewSet)
 router.register(r'performance-measures', PerformanceMeasureViewSet)
 router.register(r'main-activities', MainActivityViewSet)
 router.register(r'sub-activities', SubActivityViewSet)
-router.register(r'activity-budgets', ActivityBudgetViewSet)
+router.register(r'activity-budgets', ActivityBudgetViewSet, basename='activity-budgets')
 router.register(r'activity-costing-assumptions', ActivityCostingAssumptionViewSet)
 router.register(r'plans', PlanViewSet)
 router.register(r'plan-reviews', PlanReviewViewSet)
@@ -37,6 +37,10 @@ router.register(r'session-costs', SessionCostViewSet)
 router.register(r'printing-costs', PrintingCostViewSet)
 router.register(r'supervisor-costs', SupervisorCostViewSet)
 router.register(r'procurement-items', ProcurementItemViewSet)
+router.register(r'costing-reference', CostingReferenceViewSet, basename='costing-reference')
+router.register(r'costing', CostingViewSet, basename='costing')
+router.register(r'scenarios', ScenarioViewSet, basename='scenarios')
+router.register(r'routes', RouteViewSet, basename='routes')
 
 
 # CSRF token endpoint
@@ -1,49 +1,152 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_protect, ensure_csrf_cookie
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import PasswordChangeForm
-from django.db.models import Sum, Q
+from django.db import transaction
+from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_date
+from django.db.models import Sum, Q, Count
 from decimal import Decimal
 import json
+import logging
 
 from .models import (
     Organization, OrganizationUser, StrategicObjective, 
     Program, StrategicInitiative, PerformanceMeasure, MainActivity,
-    ActivityBudget, SubActivity, ActivityCostingAssumption, Plan, PlanReview, InitiativeFeed,
+    SubActivity, InitiativeBudgetRollup, ActivityCostingAssumption, Plan, PlanReview, PlanSnapshot, InitiativeFeed,
     Location, LandTransport, AirTransport, PerDiem, Accommodation,
     ParticipantCost, SessionCost, PrintingCost, SupervisorCost, ProcurementItem
 )
+from .budgets import annotate_main_activity_budgets
+from .weights import validate_plan_weights
+from .plan_clone import clone_plan
+from .bulk import (
+    BulkWriteError, bulk_save_performance_measures, bulk_save_main_activities, bulk_save_sub_activities
+)
+from .org_tree import organization_budget_rollup, descendant_ids, evaluator_organization_ids
+from .plan_tree import annotate_plan_budget_totals, plan_budget_summary
+from .costing_data import costing_bundle
+from .costing import CostingError, quote, quote_sub_activities
+from .rate_cache import RateTables
+from .scenarios import ScenarioError, run_scenario, fiscal_year_sub_activities
+from .line_items import line_item_totals
+from .routes import RouteError, quote_route
+from .conditional import ConditionalGetMixin, conditional_response
+from .table_versions import table_versions
+from .fieldsets import SparseFieldsViewMixin, any_field_included
+from .legacy_budgets import (
+    activity_budgets, legacy_budget_sub_activity, save_budget, has_budget, clear_budget
+)
 from .serializers import (
     OrganizationSerializer, OrganizationUserSerializer, StrategicObjectiveSerializer,
-    ProgramSerializer, StrategicInitiativeSerializer, PerformanceMeasureSerializer,
+    ProgramSerializer, StrategicInitiativeSerializer, InitiativeBudgetRollupSerializer, PerformanceMeasureSerializer,
     MainActivitySerializer, SubActivitySerializer, ActivityBudgetSerializer, ActivityCostingAssumptionSerializer,
-    PlanSerializer, PlanReviewSerializer, InitiativeFeedSerializer,
+    PlanSerializer, PlanSummarySerializer, PlanReviewSerializer, PlanSnapshotSerializer, InitiativeFeedSerializer,
     LocationSerializer, LandTransportSerializer, AirTransportSerializer,
     PerDiemSerializer, AccommodationSerializer, ParticipantCostSerializer,
     SessionCostSerializer, PrintingCostSerializer, SupervisorCostSerializer,
-    ProcurementItemSerializer
+    ProcurementItemSerializer, BulkPerformanceMeasureRowSerializer, BulkMainActivityRowSerializer,
+    BulkSubActivityRowSerializer, create_plan_snapshot
 )
 
-class OrganizationViewSet(viewsets.ModelViewSet):
+logger = logging.getLogger(__name__)
+
+def bulk_write_response(row_serializer_class, save_rows, queryset, serializer_class, data):
+    """Validate a list of rows, save them as one batch and return the saved rows in input order"""
+    rows = row_serializer_class(data=data, many=True)
+    if not rows.is_valid():
+        return Response({'errors': rows.errors}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        saved = save_rows(rows.validated_data)
+    except BulkWriteError as e:
+        return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.exception('Error in bulk write')
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    by_id = queryset.filter(id__in=[instance.pk for instance in saved]).in_bulk()
+    return Response(
+        serializer_class([by_id[instance.pk] for instance in saved], many=True).data,
+        status=status.HTTP_201_CREATED
+    )
+
+# Tables a plan's objective tree and budget totals are built from
+PLAN_TREE_MODELS = (StrategicObjective, StrategicInitiative, PerformanceMeasure, MainActivity, SubActivity)
+
+class OrganizationViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
+    
+    def get_queryset(self):
+        queryset = Organization.objects.all()
+        # Restrict to an organization and all its descendants
+        subtree_of = self.request.query_params.get('subtree_of')
+        if subtree_of is not None and subtree_of.isdigit():
+            queryset = queryset.filter(id__in=descendant_ids(int(subtree_of)))
+        return queryset
+    
+    @action(detail=True, methods=['get'])
+    def descendants(self, request, pk=None):
+        """Get every organization below this one"""
+        organization = self.get_object()
+        queryset = Organization.objects.filter(id__in=descendant_ids(organization.pk, include_self=False))
+        return Response(OrganizationSerializer(queryset, many=True).data)
+    
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, pk=None):
+        """Get the chain of organizations above this one, nearest first"""
+        organization = self.get_object()
+        queryset = Organization.objects.filter(
+            descendant_links__descendant=organization, descendant_links__depth__gt=0
+        ).order_by('descendant_links__depth')
+        return Response(OrganizationSerializer(queryset, many=True).data)
+    
+    @action(detail=False, methods=['get'], url_path='budget-rollup')
+    def budget_rollup(self, request):
+        """Get budget and funding gap totals for every organization and its subtree for a fiscal year"""
+        fiscal_year = request.query_params.get('fiscal_year')
+        if not fiscal_year:
+            return Response(
+                {'error': 'Must specify fiscal_year parameter'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Optional comma-separated plan statuses, e.g. ?status=SUBMITTED,APPROVED
+        status_param = request.query_params.get('status')
+        statuses = [value.strip() for value in status_param.split(',') if value.strip()] if status_param else None
+        
+        return conditional_response(
+            request,
+            table_versions((Organization, Plan, *PLAN_TREE_MODELS)),
+            lambda: Response({
+                'fiscal_year': fiscal_year,
+                'organizations': organization_budget_rollup(fiscal_year, statuses)
+            })
+        )
 
-class OrganizationUserViewSet(viewsets.ModelViewSet):
+class OrganizationUserViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = OrganizationUser.objects.all()
     serializer_class = OrganizationUserSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (Organization,)
+    pagination_class = None
 
-class StrategicObjectiveViewSet(viewsets.ModelViewSet):
+class StrategicObjectiveViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = StrategicObjective.objects.all()
     serializer_class = StrategicObjectiveSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
     
     @action(detail=False, methods=['get'])
     def weight_summary(self, request):
@@ -65,10 +168,12 @@ class StrategicObjectiveViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class ProgramViewSet(viewsets.ModelViewSet):
+class ProgramViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Program.objects.all()
     serializer_class = ProgramSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (StrategicObjective,)
+    pagination_class = None
     
     def get_queryset(self):
         queryset = Program.objects.all()
@@ -77,10 +182,11 @@ class ProgramViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(strategic_objective=strategic_objective)
         return queryset
 
-class StrategicInitiativeViewSet(viewsets.ModelViewSet):
+class StrategicInitiativeViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = StrategicInitiative.objects.all()
     serializer_class = StrategicInitiativeSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (Organization, StrategicObjective, Program, InitiativeFeed)
     
     def get_queryset(self):
         queryset = StrategicInitiative.objects.all()
@@ -174,6 +280,22 @@ class StrategicInitiativeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=True, methods=['get'])
+    def budget_rollup(self, request, pk=None):
+        """Get the persisted budget totals of an initiative per organization (?organization= to narrow)"""
+        initiative = self.get_object()
+        rollups = InitiativeBudgetRollup.objects.filter(initiative=initiative).select_related('organization')
+        
+        organization_id = request.query_params.get('organization')
+        if organization_id:
+            rollups = rollups.filter(organization_id=organization_id)
+        
+        return conditional_response(
+            request,
+            [initiative.pk, table_versions((Organization, MainActivity, SubActivity))],
+            lambda: Response(InitiativeBudgetRollupSerializer(rollups, many=True).data)
+        )
+    
     @action(detail=False, methods=['post'])
     def validate_initiatives_weight(self, request):
         """Validate that initiatives weight matches parent weight"""
@@ -317,10 +439,11 @@ class StrategicInitiativeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class PerformanceMeasureViewSet(viewsets.ModelViewSet):
+class PerformanceMeasureViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = PerformanceMeasure.objects.all()
     serializer_class = PerformanceMeasureSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (StrategicInitiative, Organization)
     
     def get_queryset(self):
         queryset = PerformanceMeasure.objects.all()
@@ -329,6 +452,17 @@ class PerformanceMeasureViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(initiative=initiative)
         return queryset
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create or update a list of performance measures in one transaction"""
+        return bulk_write_response(
+            BulkPerformanceMeasureRowSerializer,
+            bulk_save_performance_measures,
+            PerformanceMeasure.objects.select_related('initiative', 'organization'),
+            PerformanceMeasureSerializer,
+            request.data
+        )
+    
     @action(detail=False, methods=['get'])
     def weight_summary(self, request):
         """Get weight summary for performance measures based on initiative"""
@@ -422,18 +556,52 @@ class PerformanceMeasureViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class MainActivityViewSet(viewsets.ModelViewSet):
+class MainActivityViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = MainActivity.objects.all()
     serializer_class = MainActivitySerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (StrategicInitiative, Organization, SubActivity)
+    
+    @staticmethod
+    def queryset_with_budgets():
+        return annotate_main_activity_budgets(MainActivity.objects.all()).select_related(
+            'initiative', 'organization'
+        ).prefetch_related('sub_activities')
     
     def get_queryset(self):
-        queryset = MainActivity.objects.all()
+        # Budget totals are a grouped join over sub-activities; skip it when none is rendered
+        if any_field_included(MainActivitySerializer.budget_total_fields, MainActivitySerializer, self.request):
+            queryset = self.queryset_with_budgets()
+        else:
+            queryset = MainActivity.objects.all()
         initiative = self.request.query_params.get('initiative', None)
         if initiative is not None:
             queryset = queryset.filter(initiative=initiative)
         return queryset
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create or update a list of main activities in one transaction"""
+        return bulk_write_response(
+            BulkMainActivityRowSerializer,
+            bulk_save_main_activities,
+            MainActivityViewSet.queryset_with_budgets(),
+            MainActivitySerializer,
+            request.data
+        )
+    
+    @action(detail=True, methods=['post'], url_path='bulk-sub-activities')
+    def bulk_sub_activities(self, request, pk=None):
+        """Create or update a list of sub-activities with their budgets in one transaction"""
+        main_activity = self.get_object()
+        return bulk_write_response(
+            BulkSubActivityRowSerializer,
+            lambda rows: bulk_save_sub_activities(main_activity, rows),
+            SubActivity.objects.select_related('main_activity'),
+            SubActivitySerializer,
+            request.data
+        )
+    
     @action(detail=False, methods=['get'])
     def weight_summary(self, request):
         """Get weight summary for main activities based on initiative"""
@@ -527,39 +695,35 @@ class MainActivityViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=True, methods=['post'])
+    @action(detail=True, methods=['post'], url_path='budget')
     def update_budget(self, request, pk=None):
-        """Update or create budget for a main activity (legacy endpoint)"""
+        """Update or create the activity-level budget of a main activity (legacy endpoint)"""
         try:
             activity = self.get_object()
-            budget_data = request.data
+            sub_activity = legacy_budget_sub_activity(activity, request.data)
+            created = sub_activity.pk is None
+            save_budget(sub_activity, request.data)
             
-            # Get or create the budget
-            budget, created = ActivityBudget.objects.get_or_create(
-                activity=activity,
-                defaults=budget_data
+            serializer = ActivityBudgetSerializer(sub_activity)
+            return Response(
+                serializer.data,
+                status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
             )
             
-            if not created:
-                # Update existing budget
-                for key, value in budget_data.items():
-                    if hasattr(budget, key):
-                        setattr(budget, key, value)
-                budget.save()
-            
-            serializer = ActivityBudgetSerializer(budget)
-            return Response(serializer.data)
-            
+        except serializers.ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            logger.exception('Error updating activity budget')
             return Response(
                 {'error': str(e)}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class SubActivityViewSet(viewsets.ModelViewSet):
+class SubActivityViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = SubActivity.objects.all()
     serializer_class = SubActivitySerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (MainActivity,)
     
     def get_queryset(self):
         queryset = SubActivity.objects.all()
@@ -568,65 +732,63 @@ class SubActivityViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(main_activity=main_activity)
         return queryset
     
-    @action(detail=True, methods=['post'])
+    @action(detail=False, methods=['get'], url_path='verify-costs')
+    def verify_costs(self, request):
+        """Recompute costing-tool sub-activities server-side and compare with the stored cost"""
+        try:
+            queryset = self.get_queryset().filter(budget_calculation_type='WITH_TOOL')
+            page = self.paginate_queryset(queryset)
+            rows = page if page is not None else queryset
+            quotes = quote_sub_activities(rows, RateTables())
+            if page is not None:
+                return self.get_paginated_response(quotes)
+            return Response(quotes)
+        except Exception as e:
+            logger.exception('Error verifying sub-activity costs')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=True, methods=['post'], url_path='add-budget')
     def add_budget(self, request, pk=None):
         """Add budget for a sub-activity"""
         try:
-            sub_activity = self.get_object()
-            budget_data = request.data
-            
-            # Create budget for this sub-activity
-            budget = ActivityBudget.objects.create(
-                sub_activity=sub_activity,
-                **budget_data
-            )
-            
-            serializer = ActivityBudgetSerializer(budget)
+            sub_activity = save_budget(self.get_object(), request.data)
+            serializer = ActivityBudgetSerializer(sub_activity)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
+        except serializers.ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            logger.exception('Error adding sub-activity budget')
             return Response(
                 {'error': str(e)}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=True, methods=['put'])
+    @action(detail=True, methods=['put'], url_path='update-budget')
     def update_budget(self, request, pk=None):
         """Update budget for a sub-activity"""
         try:
-            sub_activity = self.get_object()
-            budget_data = request.data
-            
-            # Get or create the budget
-            budget, created = ActivityBudget.objects.get_or_create(
-                sub_activity=sub_activity,
-                defaults=budget_data
-            )
-            
-            if not created:
-                # Update existing budget
-                for key, value in budget_data.items():
-                    if hasattr(budget, key):
-                        setattr(budget, key, value)
-                budget.save()
-            
-            serializer = ActivityBudgetSerializer(budget)
+            sub_activity = save_budget(self.get_object(), request.data)
+            serializer = ActivityBudgetSerializer(sub_activity)
             return Response(serializer.data)
             
+        except serializers.ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            logger.exception('Error updating sub-activity budget')
             return Response(
                 {'error': str(e)}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=True, methods=['delete'])
+    @action(detail=True, methods=['delete'], url_path='delete-budget')
     def delete_budget(self, request, pk=None):
-        """Delete budget for a sub-activity"""
+        """Clear the budget of a sub-activity"""
         try:
             sub_activity = self.get_object()
             
-            if hasattr(sub_activity, 'budget'):
-                sub_activity.budget.delete()
+            if has_budget(sub_activity):
+                clear_budget(sub_activity)
                 return Response({'message': 'Budget deleted successfully'})
             else:
                 return Response(
@@ -639,40 +801,78 @@ class SubActivityViewSet(viewsets.ModelViewSet):
                 {'error': str(e)}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-class ActivityBudgetViewSet(viewsets.ModelViewSet):
-    queryset = ActivityBudget.objects.all()
+
+class ActivityBudgetViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    """
+    Legacy activity budgets, served from the budget columns of sub-activities;
+    a budget's id is its sub-activity's id and deleting it clears those columns
+    """
+    queryset = SubActivity.objects.all()
     serializer_class = ActivityBudgetSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = ActivityBudget.objects.all()
+        queryset = SubActivity.objects.all()
         sub_activity = self.request.query_params.get('sub_activity', None)
         if sub_activity is not None:
-            queryset = queryset.filter(sub_activity=sub_activity)
-        # Keep legacy activity filtering for backward compatibility
+            queryset = queryset.filter(pk=sub_activity)
+        # Legacy activity filtering returns the activity-level budget
         activity = self.request.query_params.get('activity', None)
         if activity is not None and not sub_activity:
-            queryset = queryset.filter(activity=activity)
+            queryset = activity_budgets(activity)
         return queryset
+    
+    def create(self, request, *args, **kwargs):
+        try:
+            if request.data.get('sub_activity'):
+                sub_activity = SubActivity.objects.get(pk=request.data['sub_activity'])
+            elif request.data.get('activity'):
+                activity = MainActivity.objects.get(pk=request.data['activity'])
+                sub_activity = legacy_budget_sub_activity(activity, request.data)
+            else:
+                return Response(
+                    {'error': 'Must specify sub_activity or activity'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            save_budget(sub_activity, request.data)
+            return Response(self.get_serializer(sub_activity).data, status=status.HTTP_201_CREATED)
+        except (SubActivity.DoesNotExist, MainActivity.DoesNotExist, ValueError):
+            return Response({'error': 'Activity not found'}, status=status.HTTP_404_NOT_FOUND)
+        except serializers.ValidationError as e:
+            return Response({'error': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+    
+    def perform_update(self, serializer):
+        save_budget(serializer.instance, self.request.data)
+    
+    def perform_destroy(self, instance):
+        clear_budget(instance)
 
-class ActivityCostingAssumptionViewSet(viewsets.ModelViewSet):
+class ActivityCostingAssumptionViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = ActivityCostingAssumption.objects.all()
     serializer_class = ActivityCostingAssumptionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
 
-class PlanViewSet(viewsets.ModelViewSet):
+class PlanViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Plan.objects.all()
     serializer_class = PlanSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (Organization, Program, PlanReview, OrganizationUser, *PLAN_TREE_MODELS)
     
     def get_queryset(self):
-        queryset = Plan.objects.all()
+        queryset = Plan.objects.select_related(
+            'organization', 'strategic_objective', 'program'
+        ).prefetch_related('reviews__evaluator__user')
         
         # Filter by status if provided
         status_param = self.request.query_params.get('status')
         if status_param:
             queryset = queryset.filter(status=status_param)
         
+        statuses_param = self.request.query_params.get('status__in')
+        if statuses_param:
+            queryset = queryset.filter(status__in=[value.strip() for value in statuses_param.split(',') if value.strip()])
+        
         # Filter by organization if provided
         organization_param = self.request.query_params.get('organization__in')
         if organization_param:
@@ -680,8 +880,62 @@ class PlanViewSet(viewsets.ModelViewSet):
             if org_ids:
                 queryset = queryset.filter(organization__in=org_ids)
         
+        if self._is_summary_list() and any_field_included(
+            PlanSummarySerializer.budget_total_fields, PlanSummarySerializer, self.request
+        ):
+            queryset = annotate_plan_budget_totals(queryset)
+        
         return queryset
     
+    # List-style actions that return plan headers rather than full trees
+    SUMMARY_ACTIONS = ('list', 'pending_reviews', 'reviewed')
+    
+    def _is_summary_list(self):
+        # Lists return plan headers unless the full tree is requested with ?view=full
+        return self.action in self.SUMMARY_ACTIONS and self.request.query_params.get('view') != 'full'
+    
+    def get_serializer_class(self):
+        if self._is_summary_list():
+            return PlanSummarySerializer
+        return PlanSerializer
+    
+    def _evaluator_plans(self):
+        """Plans of every organization (and its subtree) where the current user is an evaluator"""
+        return self.get_queryset().filter(organization_id__in=evaluator_organization_ids(self.request.user))
+    
+    def _paginated_plans(self, queryset):
+        queryset = self.filter_queryset(queryset)
+        
+        def build():
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+        return conditional_response(self.request, self.list_state(), build)
+    
+    @action(detail=False, methods=['get'])
+    def pending_reviews(self, request):
+        """Get submitted plans awaiting review by the current evaluator"""
+        return self._paginated_plans(self._evaluator_plans().filter(status='SUBMITTED'))
+    
+    @action(detail=False, methods=['get'])
+    def reviewed(self, request):
+        """Get approved and rejected plans in the current evaluator's scope"""
+        return self._paginated_plans(self._evaluator_plans().filter(status__in=['APPROVED', 'REJECTED']))
+    
+    @action(detail=False, methods=['get'])
+    def review_counts(self, request):
+        """Get the number of plans per status in the current evaluator's scope"""
+        def build():
+            counts = {value: 0 for value, _ in Plan.PLAN_STATUS}
+            rows = Plan.objects.filter(
+                organization_id__in=evaluator_organization_ids(request.user)
+            ).order_by().values('status').annotate(count=Count('id'))
+            for row in rows:
+                counts[row['status']] = row['count']
+            return Response(counts)
+        return conditional_response(request, table_versions((Plan, Organization, OrganizationUser)), build)
+    
     @action(detail=True, methods=['post'])
     def submit(self, request, pk=None):
         """Submit plan for review"""
@@ -694,10 +948,17 @@ class PlanViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            plan.status = 'SUBMITTED'
-            plan.save()
+            with transaction.atomic():
+                plan.status = 'SUBMITTED'
+                plan.save()
+                
+                # Freeze what was submitted so reviewers read a stable document
+                snapshot = create_plan_snapshot(plan)
             
-            return Response({'message': 'Plan submitted successfully'})
+            return Response({
+                'message': 'Plan submitted successfully',
+                'snapshot_version': snapshot.version
+            })
             
         except Exception as e:
             return Response(
@@ -705,6 +966,98 @@ class PlanViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=True, methods=['post'])
+    def clone(self, request, pk=None):
+        """
+        Copy the plan and its tree into a new DRAFT plan of another organization for another fiscal year.
+        header_only copies the plan header alone, which is the only clone allowed for the same organization.
+        """
+        plan = self.get_object()
+        fiscal_year = request.data.get('fiscal_year')
+        try:
+            from_date = parse_date(str(request.data.get('from_date') or ''))
+            to_date = parse_date(str(request.data.get('to_date') or ''))
+            organization_id = int(request.data.get('organization') or plan.organization_id)
+        except (TypeError, ValueError):
+            from_date = to_date = organization_id = None
+        if not fiscal_year or not from_date or not to_date or not organization_id:
+            return Response(
+                {'error': 'fiscal_year, from_date and to_date (YYYY-MM-DD) are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not Organization.objects.filter(pk=organization_id).exists():
+            return Response({'error': 'Organization not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            new_plan, copied = clone_plan(
+                plan, fiscal_year, from_date, to_date, organization_id, bool(request.data.get('header_only'))
+            )
+        except ValidationError as e:
+            return Response({'error': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.exception('Error cloning plan')
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        new_plan = annotate_plan_budget_totals(
+            Plan.objects.select_related('organization').prefetch_related('reviews__evaluator__user')
+        ).get(pk=new_plan.pk)
+        return Response({
+            'plan': PlanSummarySerializer(new_plan).data,
+            'header_only': copied is None,
+            'copied': copied
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get', 'post'])
+    def validate(self, request, pk=None):
+        """Check all weight rules of the plan at once and list the violations"""
+        try:
+            plan = self.get_object()
+            return Response(dict(plan=plan.pk, **validate_plan_weights(plan)))
+        except Exception as e:
+            logger.exception('Error validating plan weights')
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    @action(detail=True, methods=['get'], url_path='budget-summary')
+    def budget_summary(self, request, pk=None):
+        """Get budget totals and funding by source grouped by objective, initiative and activity type"""
+        plan = self.get_object()
+        return conditional_response(
+            request,
+            [plan.pk, plan.updated_at, table_versions(PLAN_TREE_MODELS)],
+            lambda: Response(plan_budget_summary(plan))
+        )
+    
+    @action(detail=True, methods=['get'])
+    def snapshot(self, request, pk=None):
+        """Get the latest (or ?version=N) submit-time snapshot of a plan"""
+        plan = self.get_object()
+        snapshots = PlanSnapshot.objects.filter(plan=plan)
+        
+        version = request.query_params.get('version')
+        if version:
+            if not version.isdigit():
+                return Response(
+                    {'error': 'version must be a positive integer'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            snapshots = snapshots.filter(version=int(version))
+        
+        snapshot = snapshots.first()
+        if snapshot is None:
+            return Response(
+                {'error': 'No snapshot found for this plan'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(PlanSnapshotSerializer(snapshot).data)
+    
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         """Approve a plan"""
@@ -769,15 +1122,19 @@ class PlanViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class PlanReviewViewSet(viewsets.ModelViewSet):
+class PlanReviewViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = PlanReview.objects.all()
     serializer_class = PlanReviewSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (OrganizationUser,)
+    keyset_ordering = ('reviewed_at', 'id')
 
-class InitiativeFeedViewSet(viewsets.ModelViewSet):
+class InitiativeFeedViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = InitiativeFeed.objects.all()
     serializer_class = InitiativeFeedSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (StrategicObjective,)
+    pagination_class = None
     
     def get_queryset(self):
         queryset = InitiativeFeed.objects.all()
@@ -787,55 +1144,69 @@ class InitiativeFeedViewSet(viewsets.ModelViewSet):
         return queryset
 
 # Location-related ViewSets
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
 
-class LandTransportViewSet(viewsets.ModelViewSet):
+class LandTransportViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = LandTransport.objects.all()
     serializer_class = LandTransportSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (Location,)
+    pagination_class = None
 
-class AirTransportViewSet(viewsets.ModelViewSet):
+class AirTransportViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = AirTransport.objects.all()
     serializer_class = AirTransportSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (Location,)
+    pagination_class = None
 
-class PerDiemViewSet(viewsets.ModelViewSet):
+class PerDiemViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = PerDiem.objects.all()
     serializer_class = PerDiemSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (Location,)
+    pagination_class = None
 
-class AccommodationViewSet(viewsets.ModelViewSet):
+class AccommodationViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Accommodation.objects.all()
     serializer_class = AccommodationSerializer
     permission_classes = [IsAuthenticated]
+    conditional_models = (Location,)
+    pagination_class = None
 
-class ParticipantCostViewSet(viewsets.ModelViewSet):
+class ParticipantCostViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = ParticipantCost.objects.all()
     serializer_class = ParticipantCostSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
 
-class SessionCostViewSet(viewsets.ModelViewSet):
+class SessionCostViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = SessionCost.objects.all()
     serializer_class = SessionCostSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
 
-class PrintingCostViewSet(viewsets.ModelViewSet):
+class PrintingCostViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = PrintingCost.objects.all()
     serializer_class = PrintingCostSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
 
-class SupervisorCostViewSet(viewsets.ModelViewSet):
+class SupervisorCostViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = SupervisorCost.objects.all()
     serializer_class = SupervisorCostSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
 
-class ProcurementItemViewSet(viewsets.ModelViewSet):
+class ProcurementItemViewSet(ConditionalGetMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = ProcurementItem.objects.all()
     serializer_class = ProcurementItemSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = None
     
     def get_queryset(self):
         queryset = ProcurementItem.objects.all()
@@ -844,6 +1215,126 @@ class ProcurementItemViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(category=category)
         return queryset
 
+class CostingViewSet(viewsets.ViewSet):
+    """Server-side cost quotes from costing tool detail payloads"""
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        """
+        Quote {activity_type, details}, or a list of them against one set of rates.
+        Returns {total, breakdown} per entry.
+        """
+        try:
+            many = isinstance(request.data, list)
+            entries = request.data if many else [request.data]
+            rates = RateTables()
+            quotes, errors = [], []
+            for index, entry in enumerate(entries):
+                try:
+                    if not isinstance(entry, dict):
+                        raise CostingError('Each quote needs activity_type and details')
+                    quotes.append(quote(entry.get('activity_type'), entry.get('details'), rates))
+                except CostingError as e:
+                    errors.append({'index': index, 'errors': [str(e)]})
+            if errors:
+                return Response({'errors': errors} if many else {'error': errors[0]['errors'][0]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(quotes if many else quotes[0])
+        except Exception as e:
+            logger.exception('Error quoting costs')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'], url_path='line-item-totals')
+    def line_item_totals(self, request):
+        """
+        Costing line item totals grouped by ?group_by=category,region,... (default category),
+        optionally limited to a fiscal_year and/or organization.
+        """
+        try:
+            group_by = [name for name in request.query_params.get('group_by', 'category').split(',') if name]
+            fiscal_year = request.query_params.get('fiscal_year')
+            organization_id = request.query_params.get('organization')
+            sub_activities = fiscal_year_sub_activities(fiscal_year) if fiscal_year else None
+            if organization_id:
+                sub_activities = (sub_activities if sub_activities is not None else SubActivity.objects.all()).filter(
+                    main_activity__organization_id=organization_id
+                )
+            return Response(line_item_totals(group_by, sub_activities))
+        except CostingError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.exception('Error totalling costing line items')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class RouteViewSet(viewsets.ViewSet):
+    """Cheapest transport routes between locations, including multi-leg trips"""
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get', 'post'])
+    def quote(self, request):
+        """
+        GET ?origin=&destination= or POST {stops: [location ids]}, with optional
+        mode (land, air, any), trip_type (SINGLE, ROUND) and participants.
+        """
+        try:
+            params = request.data if request.method == 'POST' else request.query_params
+            if not hasattr(params, 'get'):
+                raise RouteError('Route must be an object')
+            stops = params.get('stops') if request.method == 'POST' else [
+                params.get('origin'), params.get('destination')
+            ]
+            return Response(quote_route(
+                stops, params.get('mode'), params.get('trip_type'), params.get('participants')
+            ))
+        except RouteError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.exception('Error quoting route')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ScenarioViewSet(viewsets.ViewSet):
+    """What-if budget scenarios over every plan of a fiscal year"""
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['post'])
+    def simulate(self, request):
+        """
+        Apply {fiscal_year, multipliers: {categories, locations, activity_types}} to the
+        fiscal year's budgets; include_sub_activities adds per sub-activity figures.
+        """
+        try:
+            if not isinstance(request.data, dict):
+                raise ScenarioError('Scenario must be an object')
+            return Response(run_scenario(
+                request.data.get('fiscal_year'),
+                request.data.get('multipliers'),
+                bool(request.data.get('include_sub_activities'))
+            ))
+        except ScenarioError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.exception('Error simulating budget scenario')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class CostingReferenceViewSet(viewsets.ViewSet):
+    """All costing rate tables in one response, revalidated with If-None-Match"""
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        try:
+            bundle = costing_bundle()
+            return conditional_response(
+                request, [bundle['etag']],
+                lambda: HttpResponse(bundle['body'], content_type='application/json')
+            )
+        except Exception as e:
+            logger.exception('Error building costing reference data')
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 # Authentication views
 @csrf_protect
 def login_view(request):
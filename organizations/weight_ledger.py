@@ -0,0 +1,179 @@
+"""
+Per-parent weight ledgers: the weight already allocated to the performance
+measures and main activities of each initiative, and to the initiatives of
+each strategic objective.
+
+A child write locks its parent's ledger row with select_for_update, checks
+the cap against it and records the new weight in the same transaction, so
+two planners saving at once cannot both pass the check and over-allocate.
+"""
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import (
+    StrategicObjective, StrategicInitiative, PerformanceMeasure, MainActivity,
+    InitiativeWeightLedger, ObjectiveWeightLedger
+)
+
+# child model -> (parent id attribute, ledger model, ledger field)
+LEDGER_SPECS = {
+    StrategicInitiative: ('strategic_objective_id', ObjectiveWeightLedger, 'initiatives_weight'),
+    PerformanceMeasure: ('initiative_id', InitiativeWeightLedger, 'measures_weight'),
+    MainActivity: ('initiative_id', InitiativeWeightLedger, 'activities_weight'),
+}
+
+# ledger model -> parent id attribute of the ledger row
+LEDGER_KEYS = {
+    ObjectiveWeightLedger: 'strategic_objective_id',
+    InitiativeWeightLedger: 'initiative_id',
+}
+
+
+def _weight(value):
+    return Decimal(str(value)) if value is not None else Decimal('0')
+
+
+def initial_allocations(ledger_model, parent_ids):
+    """{parent_id: {ledger field: summed child weight}} computed from the child rows"""
+    allocations = {parent_id: {} for parent_id in parent_ids}
+    for child_model, (parent_attr, child_ledger, field) in LEDGER_SPECS.items():
+        if child_ledger is not ledger_model:
+            continue
+        rows = child_model.objects.filter(**{f'{parent_attr}__in': parent_ids}).order_by().values(
+            parent_attr
+        ).annotate(total=Sum('weight'))
+        totals = {row[parent_attr]: row['total'] or Decimal('0') for row in rows}
+        for parent_id in parent_ids:
+            allocations[parent_id][field] = totals.get(parent_id, Decimal('0'))
+    return allocations
+
+
+def lock_ledgers(ledger_model, parent_ids):
+    """
+    Return {parent_id: ledger} for the given parents, creating missing ledgers
+    from the child rows. Inside a transaction the rows stay locked until it ends.
+    """
+    key = LEDGER_KEYS[ledger_model]
+    parent_ids = sorted(set(parent_ids) - {None})
+    if not parent_ids:
+        return {}
+
+    def fetch(ids):
+        queryset = ledger_model.objects.filter(**{f'{key}__in': ids}).order_by(key)
+        # Outside a transaction (e.g. a form's full_clean) there is nothing to hold a lock for
+        if transaction.get_connection().in_atomic_block:
+            queryset = queryset.select_for_update()
+        return {getattr(ledger, key): ledger for ledger in queryset}
+
+    ledgers = fetch(parent_ids)
+    missing = [parent_id for parent_id in parent_ids if parent_id not in ledgers]
+    if missing:
+        allocations = initial_allocations(ledger_model, missing)
+        ledger_model.objects.bulk_create(
+            [ledger_model(**{key: parent_id}, **allocations[parent_id]) for parent_id in missing],
+            ignore_conflicts=True
+        )
+        ledgers.update(fetch(missing))
+    return ledgers
+
+
+def lock_parent_ledgers(child):
+    """
+    Lock the ledger of the child's parent, and of its previous parent when the
+    child moves, remembering the child's stored (parent_id, weight) for record_weight.
+    """
+    parent_attr, ledger_model, _ = LEDGER_SPECS[type(child)]
+    previous = None
+    if child.pk:
+        previous = type(child).objects.filter(pk=child.pk).values_list(parent_attr, 'weight').first()
+    child._weight_ledger_previous = previous
+
+    parent_ids = [getattr(child, parent_attr)]
+    if previous:
+        parent_ids.append(previous[0])
+    return lock_ledgers(ledger_model, parent_ids)
+
+
+def allocated_to_siblings(child):
+    """Weight allocated to the other children of the child's parent, read from its locked ledger row"""
+    parent_attr, _, field = LEDGER_SPECS[type(child)]
+    ledgers = lock_parent_ledgers(child)
+    parent_id = getattr(child, parent_attr)
+    if parent_id is None:
+        return Decimal('0')
+
+    allocated = getattr(ledgers[parent_id], field)
+    previous = child._weight_ledger_previous
+    if previous and previous[0] == parent_id:
+        allocated -= _weight(previous[1])
+    return allocated
+
+
+def _adjust(ledger_model, parent_id, field, delta):
+    if parent_id is None or not delta:
+        return
+    ledger_model.objects.filter(**{LEDGER_KEYS[ledger_model]: parent_id}).update(**{field: F(field) + delta})
+
+
+def record_weight(child):
+    """After the child row is written, move its previous weight out of the ledger and add the new one"""
+    parent_attr, ledger_model, field = LEDGER_SPECS[type(child)]
+    previous = getattr(child, '_weight_ledger_previous', None)
+    if previous:
+        _adjust(ledger_model, previous[0], field, -_weight(previous[1]))
+    _adjust(ledger_model, getattr(child, parent_attr), field, _weight(child.weight))
+    child._weight_ledger_previous = (getattr(child, parent_attr), child.weight)
+
+
+def release_weight(child):
+    """Remove a deleted child's weight from its parent's ledger"""
+    parent_attr, ledger_model, field = LEDGER_SPECS[type(child)]
+    _adjust(ledger_model, getattr(child, parent_attr), field, -_weight(child.weight))
+
+
+def apply_weight_deltas(ledgers, field, deltas, caps=None):
+    """
+    Add {parent_id: delta} to ledger rows already locked by lock_ledgers. With
+    caps ({parent_id: cap}) nothing is written and ValidationError is raised
+    when any parent would end up over its cap.
+    """
+    if caps is not None:
+        over = [
+            f'{field} of {LEDGER_KEYS[type(ledger)]} {parent_id} would reach '
+            f'{getattr(ledger, field) + deltas[parent_id]}, above its cap of {caps[parent_id]}'
+            for parent_id, ledger in ledgers.items()
+            if deltas.get(parent_id) and parent_id in caps
+            and getattr(ledger, field) + deltas[parent_id] > caps[parent_id]
+        ]
+        if over:
+            raise ValidationError(over)
+
+    changed = []
+    for parent_id, delta in deltas.items():
+        ledger = ledgers.get(parent_id)
+        if ledger is not None and delta:
+            setattr(ledger, field, getattr(ledger, field) + delta)
+            changed.append(ledger)
+    if changed:
+        type(changed[0]).objects.bulk_update(changed, [field])
+
+
+def rebuild_weight_ledgers():
+    """Recompute every ledger row from the child tables"""
+    parents = {
+        InitiativeWeightLedger: list(StrategicInitiative.objects.values_list('id', flat=True)),
+        ObjectiveWeightLedger: list(StrategicObjective.objects.values_list('id', flat=True)),
+    }
+    with transaction.atomic():
+        for ledger_model, parent_ids in parents.items():
+            key = LEDGER_KEYS[ledger_model]
+            allocations = initial_allocations(ledger_model, parent_ids)
+            ledger_model.objects.all().delete()
+            ledger_model.objects.bulk_create(
+                [ledger_model(**{key: parent_id}, **allocations[parent_id]) for parent_id in parent_ids],
+                batch_size=1000
+            )
+    return {ledger_model.__name__: len(parent_ids) for ledger_model, parent_ids in parents.items()}
@@ -0,0 +1,122 @@
+"""
+Weight rules of the planning hierarchy checked with grouped aggregates:
+
+- the plan's selected objective weights sum to 100
+- the initiatives of each objective sum to the objective's effective weight
+- the performance measures of each initiative sum to 35% of its weight
+- the main activities of each initiative sum to 65% of its weight
+"""
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from .plan_tree import scoped_initiatives, scoped_performance_measures, scoped_main_activities
+
+WEIGHT_TOLERANCE = Decimal('0.01')
+MEASURES_SHARE = Decimal('0.35')
+ACTIVITIES_SHARE = Decimal('0.65')
+
+
+def _weight(value):
+    return Decimal(str(value)) if value is not None else Decimal('0')
+
+
+def _as_number(value):
+    return float(round(value, 2))
+
+
+def _violation(rule, level, obj_id, name, expected, actual, message):
+    return {
+        'rule': rule,
+        'level': level,
+        'id': obj_id,
+        'name': name,
+        'expected': _as_number(expected),
+        'actual': _as_number(actual),
+        'message': message,
+    }
+
+
+def plan_objective_weights(plan, objectives):
+    """Effective weight of each selected objective, preferring the planner's weights stored on the plan"""
+    custom = plan.selected_objectives_weights or {}
+    weights = {}
+    for objective in objectives:
+        value = custom.get(str(objective.id), custom.get(objective.id))
+        weights[objective.id] = _weight(value) if value not in (None, '') else _weight(objective.get_effective_weight())
+    return weights
+
+
+def weight_totals_by_initiative(queryset):
+    """{initiative_id: summed weight} for measures or activities in one grouped query"""
+    return {
+        row['initiative_id']: row['total'] or Decimal('0')
+        for row in queryset.order_by().values('initiative_id').annotate(total=Sum('weight'))
+    }
+
+
+def validate_plan_weights(plan):
+    """
+    Check every weight rule of a plan in four queries and return
+    {'is_valid', 'violations', 'objectives_checked', 'initiatives_checked'}.
+    """
+    organization_id = plan.organization_id
+    objectives = list(plan.selected_objectives.all())
+    objective_weights = plan_objective_weights(plan, objectives)
+    violations = []
+
+    total = sum(objective_weights.values(), Decimal('0'))
+    if abs(total - 100) > WEIGHT_TOLERANCE:
+        violations.append(_violation(
+            'objectives_total', 'plan', plan.pk, 'Plan', Decimal('100'), total,
+            f'Selected objectives weight ({_as_number(total)}%) must equal 100%'
+        ))
+
+    initiatives = list(
+        scoped_initiatives(organization_id).filter(
+            strategic_objective_id__in=objective_weights.keys()
+        ).values('id', 'name', 'weight', 'strategic_objective_id')
+    )
+
+    initiative_totals = {}
+    for initiative in initiatives:
+        objective_id = initiative['strategic_objective_id']
+        initiative_totals[objective_id] = initiative_totals.get(objective_id, Decimal('0')) + initiative['weight']
+
+    for objective in objectives:
+        expected = objective_weights[objective.id]
+        actual = initiative_totals.get(objective.id, Decimal('0'))
+        if abs(actual - expected) > WEIGHT_TOLERANCE:
+            violations.append(_violation(
+                'initiatives_total', 'objective', objective.id, objective.title, expected, actual,
+                f'Initiatives weight ({_as_number(actual)}%) must equal {objective.title} weight ({_as_number(expected)}%)'
+            ))
+
+    initiative_ids = [initiative['id'] for initiative in initiatives]
+    measure_totals = weight_totals_by_initiative(
+        scoped_performance_measures(organization_id).filter(initiative_id__in=initiative_ids)
+    )
+    activity_totals = weight_totals_by_initiative(
+        scoped_main_activities(organization_id).filter(initiative_id__in=initiative_ids)
+    )
+
+    for initiative in initiatives:
+        for rule, share, totals, label in (
+            ('measures_total', MEASURES_SHARE, measure_totals, 'Performance measures'),
+            ('activities_total', ACTIVITIES_SHARE, activity_totals, 'Main activities'),
+        ):
+            expected = initiative['weight'] * share
+            actual = totals.get(initiative['id'], Decimal('0'))
+            if abs(actual - expected) > WEIGHT_TOLERANCE:
+                violations.append(_violation(
+                    rule, 'initiative', initiative['id'], initiative['name'], expected, actual,
+                    f'{label} weight ({_as_number(actual)}%) must equal {int(share * 100)}% of '
+                    f'{initiative["name"]} weight ({_as_number(expected)}%)'
+                ))
+
+    return {
+        'is_valid': not violations,
+        'violations': violations,
+        'objectives_checked': len(objectives),
+        'initiatives_checked': len(initiatives),
+    }
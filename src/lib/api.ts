@@ -44,6 +44,39 @@ api.interceptors.response.use(
   }
 );
 
+// List endpoints are cursor-paginated on the server and return { results, next, previous };
+// a few small reference tables are not paginated and return plain arrays. Lists are read
+// one page at a time: views show a page and load the next one on demand.
+export type Page<T = any> = { results: T[]; next: string | null };
+
+export const toPage = <T = any>(data: any): Page<T> =>
+  Array.isArray(data)
+    ? { results: data, next: null }
+    : { results: data?.results || [], next: data?.next || null };
+
+// Largest page the server returns
+export const MAX_PAGE_SIZE = 500;
+
+// One page of a list endpoint; pass the previous page's next URL to load the following one
+export const getPage = async <T = any>(
+  url: string,
+  params: Record<string, any> = {},
+  next?: string | null
+): Promise<Page<T>> => {
+  const response = next ? await api.get(next) : await api.get(url, { params });
+  return toPage<T>(response.data);
+};
+
+// Child rows of one parent (initiatives of an objective, measures of an initiative, ...) are
+// requested as a single page of up to MAX_PAGE_SIZE rows and returned as a plain array
+const childRows = (response: any, label: string) => {
+  const page = toPage(response.data);
+  if (page.next) {
+    console.warn(`${label}: more than ${MAX_PAGE_SIZE} rows, only the first ${MAX_PAGE_SIZE} were loaded`);
+  }
+  return { ...response, data: page.results };
+};
+
 // Enhanced CSRF token handling
 const ensureCsrfToken = async () => {
   try {
@@ -282,13 +315,78 @@ export const initiativeFeeds = {
   }
 };
 
+// Costing reference data: every rate table in one response. The last bundle and
+// its ETag are kept in memory so reopening a costing tool costs one conditional request.
+let costingBundleCache: { etag: string; tables: Record<string, any[]> } | null = null;
+let costingBundleRequest: Promise<Record<string, any[]>> | null = null;
+
+export const costingReference = {
+  getBundle: async (): Promise<Record<string, any[]>> => {
+    if (!costingBundleRequest) {
+      costingBundleRequest = (async () => {
+        const response = await api.get('/costing-reference/', {
+          headers: costingBundleCache ? { 'If-None-Match': costingBundleCache.etag } : {},
+          validateStatus: status => (status >= 200 && status < 300) || status === 304
+        });
+        if (response.status === 304 && costingBundleCache) {
+          return costingBundleCache.tables;
+        }
+        costingBundleCache = { etag: response.headers['etag'] || response.data.etag, tables: response.data.tables };
+        return costingBundleCache.tables;
+      })().finally(() => {
+        costingBundleRequest = null;
+      });
+    }
+    return costingBundleRequest;
+  },
+
+  getTable: async (name: string) => {
+    const tables = await costingReference.getBundle();
+    return { data: tables[name] || [] };
+  }
+};
+
+// Server-side cost quotes from costing tool details
+export const costing = {
+  quote: (activityType: string, details: any) => api.post('/costing/quote/', { activity_type: activityType, details }),
+  quoteBatch: (entries: { activity_type: string; details: any }[]) => api.post('/costing/quote/', entries),
+  // Line item totals, e.g. groupBy ['category', 'region'] for per diem spend by region
+  lineItemTotals: (groupBy: string[] = ['category'], filters: { fiscal_year?: string; organization?: string | number } = {}) =>
+    api.get('/costing/line-item-totals/', { params: { group_by: groupBy.join(','), ...filters } })
+};
+
+// Cheapest transport routes; mode is land, air or any and trip_type SINGLE or ROUND
+type RouteOptions = { mode?: 'land' | 'air' | 'any'; trip_type?: 'SINGLE' | 'ROUND'; participants?: number };
+
+export const routes = {
+  quote: (origin: string | number, destination: string | number, options: RouteOptions = {}) =>
+    api.get('/routes/quote/', { params: { origin, destination, ...options } }),
+  quoteTrip: (stops: (string | number)[], options: RouteOptions = {}) =>
+    api.post('/routes/quote/', { stops, ...options })
+};
+
+// What-if budget scenarios: multipliers per cost category, location id or activity type
+export const scenarios = {
+  simulate: (
+    fiscalYear: string,
+    multipliers: {
+      categories?: Record<string, number>;
+      locations?: Record<string, number>;
+      activity_types?: Record<string, number>;
+    },
+    includeSubActivities = false
+  ) => api.post('/scenarios/simulate/', {
+    fiscal_year: fiscalYear,
+    multipliers,
+    include_sub_activities: includeSubActivities
+  })
+};
+
 // Locations API
 export const locations = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/locations/?_=${timestamp}`);
-      return response;
+      return await costingReference.getTable('locations');
     } catch (error) {
       console.error('Failed to fetch locations:', error);
       return { data: [] };
@@ -310,11 +408,7 @@ export const locations = {
 export const landTransports = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get('/land-transports/', {
-        headers: { 'Cache-Control': 'no-cache, no-store, must-revalidate' }
-      });
-      return response;
+      return await costingReference.getTable('land_transports');
     } catch (error) {
       console.error('Failed to fetch land transports:', error);
       return { data: [] };
@@ -336,11 +430,7 @@ export const landTransports = {
 export const airTransports = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get('/air-transports/', {
-        headers: { 'Cache-Control': 'no-cache, no-store, must-revalidate' }
-      });
-      return response;
+      return await costingReference.getTable('air_transports');
     } catch (error) {
       console.error('Failed to fetch air transports:', error);
       return { data: [] };
@@ -362,9 +452,7 @@ export const airTransports = {
 export const perDiems = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/per-diems/?_=${timestamp}`);
-      return response;
+      return await costingReference.getTable('per_diems');
     } catch (error) {
       console.error('Failed to fetch per diems:', error);
       throw error;
@@ -386,9 +474,7 @@ export const perDiems = {
 export const accommodations = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/accommodations/?_=${timestamp}`);
-      return response;
+      return await costingReference.getTable('accommodations');
     } catch (error) {
       console.error('Failed to fetch accommodations:', error);
       return { data: [] };
@@ -410,9 +496,7 @@ export const accommodations = {
 export const participantCosts = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/participant-costs/?_=${timestamp}`);
-      return response;
+      return await costingReference.getTable('participant_costs');
     } catch (error) {
       console.error('Failed to fetch participant costs:', error);
       return { data: [] };
@@ -434,9 +518,7 @@ export const participantCosts = {
 export const sessionCosts = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/session-costs/?_=${timestamp}`);
-      return response;
+      return await costingReference.getTable('session_costs');
     } catch (error) {
       console.error('Failed to fetch session costs:', error);
       return { data: [] };
@@ -458,9 +540,7 @@ export const sessionCosts = {
 export const printingCosts = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/printing-costs/?_=${timestamp}`);
-      return response;
+      return await costingReference.getTable('printing_costs');
     } catch (error) {
       console.error('Failed to fetch printing costs:', error);
       return { data: [] };
@@ -482,9 +562,7 @@ export const printingCosts = {
 export const supervisorCosts = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/supervisor-costs/?_=${timestamp}`);
-      return response;
+      return await costingReference.getTable('supervisor_costs');
     } catch (error) {
       console.error('Failed to fetch supervisor costs:', error);
       return { data: [] };
@@ -506,9 +584,7 @@ export const supervisorCosts = {
 export const procurementItems = {
   getAll: async () => {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/procurement-items/?_=${timestamp}`);
-      return response;
+      return await costingReference.getTable('procurement_items');
     } catch (error) {
       console.error('Failed to fetch procurement items:', error);
       return { data: [] };
@@ -540,8 +616,7 @@ export const procurementItems = {
 export const organizations = {
   async getAll() {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/organizations/?_=${timestamp}`);
+      const response = await api.get(`/organizations/`);
       return response.data;
     } catch (error) {
       console.error('Failed to get organizations:', error);
@@ -739,22 +814,18 @@ export const initiatives = {
   getAll: async () => {
     try {
       // Production-friendly approach with longer timeout and retry
-      const timestamp = new Date().getTime();
       let response;
       
       try {
         // Try standard API call first with extended timeout
-        response = await api.get(`/strategic-initiatives/?_=${timestamp}`, {
-          timeout: 15000, // 15 second timeout for production
-          headers: { 'Cache-Control': 'no-cache, no-store, must-revalidate' }
+        response = await api.get(`/strategic-initiatives/`, {
+          timeout: 15000 // 15 second timeout for production
         });
       } catch (firstError) {
         console.warn('First attempt failed, trying alternative format:', firstError);
         // Try alternative format
         response = await api.get('/strategic-initiatives/', {
-          params: { _: timestamp },
-          timeout: 10000,
-          headers: { 'Cache-Control': 'no-cache' }
+          timeout: 10000
         });
       }
       
@@ -770,17 +841,15 @@ export const initiatives = {
   
   getById: async (id: string) => {
     try {
-      const timestamp = new Date().getTime();
       let response;
       
       try {
-        response = await api.get(`/strategic-initiatives/${id}/?_=${timestamp}`, {
+        response = await api.get(`/strategic-initiatives/${id}/`, {
           timeout: 10000
         });
       } catch (firstError) {
         console.warn(`First attempt failed for initiative ${id}, trying alternative:`, firstError);
         response = await api.get(`/strategic-initiatives/${id}/`, {
-          params: { _: timestamp },
           timeout: 8000
         });
       }
@@ -795,8 +864,6 @@ export const initiatives = {
   
   getByObjective: async (objectiveId: string) => {
     try {
-      const timestamp = new Date().getTime();
-      
       console.log(`Fetching initiatives for objective ${objectiveId} in production mode`);
       
       let response;
@@ -807,25 +874,24 @@ export const initiatives = {
         try {
           if (retryCount === 0) {
             // First attempt: standard format with extended timeout
-            response = await api.get(`/strategic-initiatives/?objective=${objectiveId}&_=${timestamp}`, {
-              timeout: 12000,
-              headers: { 'Cache-Control': 'no-cache, no-store, must-revalidate' }
+            response = await api.get(`/strategic-initiatives/?objective=${objectiveId}`, {
+              params: { page_size: MAX_PAGE_SIZE },
+              timeout: 12000
             });
           } else if (retryCount === 1) {
             // Second attempt: alternative parameter format
             response = await api.get('/strategic-initiatives/', {
               params: { 
                 objective: objectiveId,
-                _: timestamp + retryCount
+                page_size: MAX_PAGE_SIZE
               },
-              timeout: 8000,
-              headers: { 'Cache-Control': 'no-cache' }
+              timeout: 8000
             });
           } else {
             // Third attempt: simplified call
             response = await api.get(`/strategic-initiatives/`, {
               timeout: 5000,
-              params: { objective: objectiveId }
+              params: { objective: objectiveId, page_size: MAX_PAGE_SIZE }
             });
           }
           
@@ -846,7 +912,7 @@ export const initiatives = {
         }
       }
       
-      return response;
+      return childRows(response, `Initiatives of objective ${objectiveId}`);
     } catch (error) {
       console.warn(`Failed to fetch initiatives for objective ${objectiveId} after ${maxRetries} attempts:`, error);
       return { data: [] };
@@ -855,8 +921,10 @@ export const initiatives = {
   
   getByProgram: async (programId: string) => {
     try {
-      const response = await api.get(`/strategic-initiatives/?program=${programId}`);
-      return response;
+      const response = await api.get(`/strategic-initiatives/?program=${programId}`, {
+        params: { page_size: MAX_PAGE_SIZE }
+      });
+      return childRows(response, `Initiatives of program ${programId}`);
     } catch (error) {
       console.error(`Failed to fetch initiatives for program ${programId}:`, error);
       throw error;
@@ -865,8 +933,10 @@ export const initiatives = {
   
   getBySubProgram: async (subProgramId: string) => {
     try {
-      const response = await api.get(`/strategic-initiatives/?subprogram=${subProgramId}`);
-      return response;
+      const response = await api.get(`/strategic-initiatives/?subprogram=${subProgramId}`, {
+        params: { page_size: MAX_PAGE_SIZE }
+      });
+      return childRows(response, `Initiatives of subprogram ${subProgramId}`);
     } catch (error) {
       console.error(`Failed to fetch initiatives for subprogram ${subProgramId}:`, error);
       throw error;
@@ -946,7 +1016,6 @@ export const performanceMeasures = {
       
       console.log(`Fetching performance measures for initiative ${initiativeId} in production mode`);
       
-      const timestamp = new Date().getTime();
       const id = String(initiativeId);
       
       let response;
@@ -957,9 +1026,9 @@ export const performanceMeasures = {
         try {
           if (retryCount === 0) {
             // First attempt: standard format with extended timeout
-            response = await api.get(`/performance-measures/?initiative=${id}&_=${timestamp}`, {
-              timeout: 12000,
-              headers: { 'Cache-Control': 'no-cache, no-store, must-revalidate' }
+            response = await api.get(`/performance-measures/?initiative=${id}`, {
+              params: { page_size: MAX_PAGE_SIZE },
+              timeout: 12000
             });
           } else if (retryCount === 1) {
             // Second attempt: alternative parameter format
@@ -967,16 +1036,15 @@ export const performanceMeasures = {
               params: { 
                 initiative: id,
                 initiative_id: id, // Try both parameter names
-                _: timestamp + retryCount
+                page_size: MAX_PAGE_SIZE
               },
-              timeout: 8000,
-              headers: { 'Cache-Control': 'no-cache' }
+              timeout: 8000
             });
           } else {
             // Third attempt: simplified call with different endpoint approach
             response = await api.get(`/performance-measures/`, {
               timeout: 5000,
-              params: { initiative: id }
+              params: { initiative: id, page_size: MAX_PAGE_SIZE }
             });
           }
           
@@ -1007,7 +1075,7 @@ export const performanceMeasures = {
         return { data: [] };
       }
       
-      return response;
+      return childRows(response, `Performance measures of initiative ${id}`);
     } catch (error) {
       console.warn(`Failed to get performance measures for initiative ${initiativeId} after retries:`, error);
       return { data: [] };
@@ -1102,6 +1170,17 @@ export const performanceMeasures = {
       console.error('Failed to validate performance measures weight:', error);
       throw error;
     }
+  },
+  
+  async bulkSave(rows: any[]) {
+    try {
+      await ensureCsrfToken();
+      const response = await api.post('/performance-measures/bulk/', rows);
+      return response;
+    } catch (error) {
+      console.error('Failed to save performance measures:', error);
+      throw error;
+    }
   }
 };
 
@@ -1116,7 +1195,6 @@ export const mainActivities = {
       
       console.log(`Fetching main activities for initiative ${initiativeId} in production mode`);
       
-      const timestamp = new Date().getTime();
       const id = String(initiativeId);
       
       let response;
@@ -1127,9 +1205,9 @@ export const mainActivities = {
         try {
           if (retryCount === 0) {
             // First attempt: standard format with extended timeout
-            response = await api.get(`/main-activities/?initiative=${id}&_=${timestamp}`, {
-              timeout: 12000,
-              headers: { 'Cache-Control': 'no-cache, no-store, must-revalidate' }
+            response = await api.get(`/main-activities/?initiative=${id}`, {
+              params: { page_size: MAX_PAGE_SIZE },
+              timeout: 12000
             });
           } else if (retryCount === 1) {
             // Second attempt: alternative parameter format
@@ -1137,16 +1215,15 @@ export const mainActivities = {
               params: { 
                 initiative: id,
                 initiative_id: id, // Try both parameter names
-                _: timestamp + retryCount
+                page_size: MAX_PAGE_SIZE
               },
-              timeout: 8000,
-              headers: { 'Cache-Control': 'no-cache' }
+              timeout: 8000
             });
           } else {
             // Third attempt: simplified call
             response = await api.get(`/main-activities/`, {
               timeout: 5000,
-              params: { initiative: id }
+              params: { initiative: id, page_size: MAX_PAGE_SIZE }
             });
           }
           
@@ -1177,7 +1254,7 @@ export const mainActivities = {
         return { data: [] };
       }
       
-      return response;
+      return childRows(response, `Main activities of initiative ${id}`);
     } catch (error) {
       console.warn(`Failed to get main activities for initiative ${initiativeId} after retries:`, error);
       return { data: [] };
@@ -1271,6 +1348,28 @@ export const mainActivities = {
     }
   },
   
+  async bulkSave(rows: any[]) {
+    try {
+      await ensureCsrfToken();
+      const response = await api.post('/main-activities/bulk/', rows);
+      return response;
+    } catch (error) {
+      console.error('Failed to save main activities:', error);
+      throw error;
+    }
+  },
+  
+  async bulkSaveSubActivities(activityId: string, rows: any[]) {
+    try {
+      await ensureCsrfToken();
+      const response = await api.post(`/main-activities/${activityId}/bulk-sub-activities/`, rows);
+      return response;
+    } catch (error) {
+      console.error('Failed to save sub-activities:', error);
+      throw error;
+    }
+  },
+  
   async updateBudget(activityId: string, budgetData: any) {
     try {
       await ensureCsrfToken();
@@ -1287,8 +1386,10 @@ export const mainActivities = {
 export const activityBudgets = {
   async getByActivity(activityId: string) {
     try {
-      const response = await api.get(`/activity-budgets/?activity=${activityId}`);
-      return response;
+      const response = await api.get(`/activity-budgets/?activity=${activityId}`, {
+        params: { page_size: MAX_PAGE_SIZE }
+      });
+      return childRows(response, `Budgets of activity ${activityId}`);
     } catch (error) {
       console.error(`Failed to get budget for activity ${activityId}:`, error);
       throw error;
@@ -1352,19 +1453,22 @@ export const subActivities = {
   create: (data: any) => api.post('/sub-activities/', data),
   update: (id: string, data: any) => api.put(`/sub-activities/${id}/`, data),
   delete: (id: string) => api.delete(`/sub-activities/${id}/`),
-  getByMainActivity: (mainActivityId: string) => api.get('/sub-activities/', { params: { main_activity: mainActivityId } }),
+  getByMainActivity: async (mainActivityId: string) => childRows(
+    await api.get('/sub-activities/', { params: { main_activity: mainActivityId, page_size: MAX_PAGE_SIZE } }),
+    `Sub-activities of main activity ${mainActivityId}`
+  ),
   addBudget: (id: string, data: any) => api.post(`/sub-activities/${id}/add-budget/`, data),
   updateBudget: (id: string, data: any) => api.put(`/sub-activities/${id}/update-budget/`, data),
-  deleteBudget: (id: string) => api.delete(`/sub-activities/${id}/delete-budget/`)
+  deleteBudget: (id: string) => api.delete(`/sub-activities/${id}/delete-budget/`),
+  verifyCosts: (mainActivityId: string) => api.get('/sub-activities/verify-costs/', { params: { main_activity: mainActivityId } })
 };
 
 // Plans service
 export const plans = {
-  async getAll() {
+  // One page of plan headers; pass the previous page's next URL to load more
+  async list(params: Record<string, any> = {}, next?: string | null) {
     try {
-      const timestamp = new Date().getTime();
-      const response = await api.get(`/plans/?_=${timestamp}`);
-      return response;
+      return await getPage('/plans/', params, next);
     } catch (error) {
       console.error('Failed to get plans:', error);
       throw error;
@@ -1380,7 +1484,38 @@ export const plans = {
       throw error;
     }
   },
-  
+
+  async getBudgetSummary(id: string) {
+    try {
+      const response = await api.get(`/plans/${id}/budget-summary/`);
+      return response.data;
+    } catch (error) {
+      console.error(`Failed to get budget summary for plan ${id}:`, error);
+      throw error;
+    }
+  },
+
+  async validate(id: string) {
+    try {
+      const response = await api.get(`/plans/${id}/validate/`);
+      return response.data;
+    } catch (error) {
+      console.error(`Failed to validate plan ${id}:`, error);
+      throw error;
+    }
+  },
+
+  async clone(id: string, data: { fiscal_year: string; from_date: string; to_date: string; organization?: number; header_only?: boolean }) {
+    try {
+      await ensureCsrfToken();
+      const response = await api.post(`/plans/${id}/clone/`, data);
+      return response.data;
+    } catch (error) {
+      console.error(`Failed to clone plan ${id}:`, error);
+      throw error;
+    }
+  },
+
   async create(data: any) {
     try {
       console.log('=== PLANS API CREATE START ===');
@@ -1654,15 +1789,34 @@ export const plans = {
     }
   },
   
-  async getPendingReviews() {
+  async getPendingReviews(next?: string | null) {
     try {
       await ensureCsrfToken();
-      const response = await api.get(`/plans/pending_reviews/`);
-      return response;
+      return await getPage('/plans/pending_reviews/', {}, next);
     } catch (error) {
       console.error('Failed to get pending reviews:', error);
       throw error;
     }
+  },
+  
+  // Number of plans per status in the current evaluator's scope
+  async getReviewCounts() {
+    try {
+      const response = await api.get('/plans/review_counts/');
+      return response.data as Record<string, number>;
+    } catch (error) {
+      console.error('Failed to get review counts:', error);
+      throw error;
+    }
+  },
+  
+  async getReviewed(next?: string | null) {
+    try {
+      return await getPage('/plans/reviewed/', {}, next);
+    } catch (error) {
+      console.error('Failed to get reviewed plans:', error);
+      throw error;
+    }
   }
 };
 
@@ -10,36 +10,32 @@ import MetadataForm from '../components/MetadataForm';
 import type { Organization } from '../types/organization';
 import { useNavigate } from 'react-router-dom';
 import { AuthState } from '../types/user';
-import { useQuery } from '@tanstack/react-query';
+import { useInfiniteQuery } from '@tanstack/react-query';
 import { plans } from '../lib/api';
 
 // Component to display submitted plans
 const SubmittedPlansTable: React.FC<{ userOrgId: number }> = ({ userOrgId }) => {
-  const { data: submittedPlans, isLoading, error, refetch } = useQuery({
+  const {
+    data,
+    isLoading,
+    error,
+    refetch,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage
+  } = useInfiniteQuery({
     queryKey: ['plans', 'submitted', userOrgId],
-    queryFn: async () => {
-      try {
-        console.log('Fetching submitted plans for organization:', userOrgId);
-        const response = await plans.getAll();
-        const allPlans = response?.data || [];
-        console.log('All plans fetched:', allPlans.length);
-        
-        // Filter plans for the user's organization
-        const userPlans = allPlans.filter(plan => 
-          plan.organization === userOrgId && 
-          ['SUBMITTED', 'APPROVED', 'REJECTED'].includes(plan.status)
-        );
-        
-        console.log('Filtered user plans:', userPlans.length);
-        return userPlans;
-      } catch (error) {
-        console.error('Error fetching submitted plans:', error);
-        throw error;
-      }
-    },
+    // The organization's submitted and reviewed plans, filtered on the server and read a page at a time
+    queryFn: ({ pageParam }) => plans.list(
+      { organization__in: userOrgId, status__in: 'SUBMITTED,APPROVED,REJECTED' },
+      pageParam
+    ),
+    initialPageParam: null as string | null,
+    getNextPageParam: lastPage => lastPage.next,
     enabled: !!userOrgId,
     retry: 2
   });
+  const submittedPlans = data?.pages.flatMap(page => page.results);
 
   // Auto-refresh when component mounts or userOrgId changes
   React.useEffect(() => {
@@ -150,6 +146,18 @@ const SubmittedPlansTable: React.FC<{ userOrgId: number }> = ({ userOrgId }) =>
           ))}
         </tbody>
       </table>
+      {hasNextPage && (
+        <div className="flex justify-center py-4">
+          <button
+            onClick={() => fetchNextPage()}
+            disabled={isFetchingNextPage}
+            className="inline-flex items-center px-4 py-2 border border-gray-300 rounded-md text-sm font-medium text-gray-700 bg-white hover:bg-gray-50 disabled:opacity-50"
+          >
+            {isFetchingNextPage && <Loader className="h-4 w-4 animate-spin mr-2" />}
+            Load more plans
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { useNavigate } from 'react-router-dom';
 import { Bell, Calendar, Eye, Building2, CheckCircle, XCircle, AlertCircle, Loader, RefreshCw, BarChart3, PieChart, DollarSign, LayoutGrid } from 'lucide-react';
 import { useLanguage } from '../lib/i18n/LanguageContext';
@@ -97,101 +97,87 @@ const EvaluatorDashboard: React.FC = () => {
     fetchOrganizations();
   }, []);
 
-  // Fetch pending plans for review (filtered by evaluator's organizations)
-  const { data: pendingPlans, isLoading, refetch } = useQuery({
+  // Name each plan's organization from the organizations map
+  const withOrganizationNames = (plans: any[]) => {
+    plans.forEach((plan: any) => {
+      if (plan.organization && organizationsMap[plan.organization]) {
+        plan.organizationName = organizationsMap[plan.organization];
+      }
+    });
+    return plans;
+  };
+
+  // Fetch pending plans for review (filtered by evaluator's organizations), a page at a time
+  const {
+    data: pendingPages,
+    isLoading,
+    refetch,
+    fetchNextPage: fetchMorePending,
+    hasNextPage: hasMorePending,
+    isFetchingNextPage: isFetchingMorePending
+  } = useInfiniteQuery({
     queryKey: ['plans', 'pending-reviews', userOrgIds],
-    queryFn: async () => {
+    queryFn: async ({ pageParam }) => {
       console.log('Fetching pending plans for evaluator organizations:', userOrgIds);
       try {
         await auth.getCurrentUser();
         
-        // Get ONLY submitted plans for evaluator's organizations
-        const response = await api.get('/plans/', {
-          params: {
-            status: 'SUBMITTED',
-            organization__in: userOrgIds.join(',')
-          }
-        });
-        
-        console.log('Pending plans response for evaluator:', response.data?.length || 0);
-        
-        const plans = response.data?.results || response.data || [];
-        
-        // Plans are already filtered by organization at API level
-        const filteredPlans = plans.filter(plan => 
-          plan.status === 'SUBMITTED' && 
-          userOrgIds.includes(Number(plan.organization))
-        );
-        
-        console.log(`Filtered ${plans.length} total plans to ${filteredPlans.length} for evaluator orgs:`, userOrgIds);
-        
-        // Map organization names
-        if (Array.isArray(filteredPlans)) {
-          filteredPlans.forEach((plan: any) => {
-            if (plan.organization && organizationsMap[plan.organization]) {
-              plan.organizationName = organizationsMap[plan.organization];
-            }
-          });
-        }
-        
-        return { data: filteredPlans };
+        // Submitted plans of the evaluator's organizations and their subtrees, scoped on the server
+        return await plans.getPendingReviews(pageParam);
       } catch (error) {
         console.error('Error fetching pending reviews:', error);
         throw error;
       }
     },
+    initialPageParam: null as string | null,
+    getNextPageParam: lastPage => lastPage.next,
     enabled: userOrgIds.length > 0,
     retry: 2,
     refetchInterval: 30000,
     refetchOnWindowFocus: true
   });
+  const pendingPlans = pendingPages && {
+    data: withOrganizationNames(pendingPages.pages.flatMap(page => page.results))
+  };
 
-  // Fetch reviewed plans (approved/rejected) for evaluator's organizations
-  const { data: reviewedPlans, isLoading: isLoadingReviewed } = useQuery({
+  // Fetch reviewed plans (approved/rejected) for evaluator's organizations, a page at a time
+  const {
+    data: reviewedPages,
+    isLoading: isLoadingReviewed,
+    fetchNextPage: fetchMoreReviewed,
+    hasNextPage: hasMoreReviewed,
+    isFetchingNextPage: isFetchingMoreReviewed
+  } = useInfiniteQuery({
     queryKey: ['plans', 'reviewed', userOrgIds],
-    queryFn: async () => {
+    queryFn: async ({ pageParam }) => {
       console.log('Fetching reviewed plans for evaluator organizations:', userOrgIds);
       try {
         await auth.getCurrentUser();
         
-        // Get ONLY approved and rejected plans for evaluator's organizations
-        const response = await api.get('/plans/', {
-          params: {
-            status__in: 'APPROVED,REJECTED',
-            organization__in: userOrgIds.join(',')
-          }
-        });
-        
-        console.log('Reviewed plans response for evaluator:', response.data?.length || 0);
-        
-        const plans = response.data?.results || response.data || [];
-        
-        // Filter to ensure only approved/rejected plans from evaluator's organizations
-        const filteredPlans = plans.filter(plan => 
-          ['APPROVED', 'REJECTED'].includes(plan.status) &&
-          userOrgIds.includes(Number(plan.organization))
-        );
-        
-        console.log(`Filtered ${plans.length} total plans to ${filteredPlans.length} reviewed plans for evaluator orgs:`, userOrgIds);
-        
-        // Map organization names
-        if (Array.isArray(filteredPlans)) {
-          filteredPlans.forEach((plan: any) => {
-            if (plan.organization && organizationsMap[plan.organization]) {
-              plan.organizationName = organizationsMap[plan.organization];
-            }
-          });
-        }
-        
-        return { data: filteredPlans };
+        // Approved and rejected plans of the evaluator's organizations and their subtrees
+        return await plans.getReviewed(pageParam);
       } catch (error) {
         console.error('Error fetching reviewed plans:', error);
         throw error;
       }
     },
+    initialPageParam: null as string | null,
+    getNextPageParam: lastPage => lastPage.next,
     enabled: userOrgIds.length > 0,
     retry: 2
   });
+  const reviewedPlans = reviewedPages && {
+    data: withOrganizationNames(reviewedPages.pages.flatMap(page => page.results))
+  };
+
+  // Plan counts per status across the evaluator's whole scope
+  const { data: reviewCounts, refetch: refetchCounts } = useQuery({
+    queryKey: ['plans', 'review-counts', userOrgIds],
+    queryFn: () => plans.getReviewCounts(),
+    enabled: userOrgIds.length > 0,
+    refetchInterval: 30000,
+    refetchOnWindowFocus: true
+  });
 
   // Manual refresh function
   const handleRefresh = async () => {
@@ -201,7 +187,7 @@ const EvaluatorDashboard: React.FC = () => {
       // Ensure CSRF token is fresh
       await auth.getCurrentUser();
       
-      await refetch();
+      await Promise.all([refetch(), refetchCounts()]);
       
       setSuccess('Plans refreshed successfully');
       setTimeout(() => setSuccess(null), 3000);
@@ -263,6 +249,8 @@ const EvaluatorDashboard: React.FC = () => {
     onSuccess: () => {
       console.log('Review submitted successfully, refreshing data...');
       queryClient.invalidateQueries({ queryKey: ['plans', 'pending-reviews'] });
+      queryClient.invalidateQueries({ queryKey: ['plans', 'reviewed'] });
+      queryClient.invalidateQueries({ queryKey: ['plans', 'review-counts'] });
       queryClient.invalidateQueries({ queryKey: ['plans', 'all'] });
       setShowReviewModal(false);
       setSelectedPlan(null);
@@ -374,10 +362,11 @@ const EvaluatorDashboard: React.FC = () => {
   };
 
   // Calculate summary statistics from evaluator's data
-  const pendingCount = pendingPlans?.data?.length || 0;
-  const reviewedCount = reviewedPlans?.data?.length || 0;
-  const approvedCount = reviewedPlans?.data?.filter((p: any) => p.status === 'APPROVED').length || 0;
-  const rejectedCount = reviewedPlans?.data?.filter((p: any) => p.status === 'REJECTED').length || 0;
+  // Lists hold only the pages loaded so far, so the totals come from the server
+  const pendingCount = reviewCounts?.SUBMITTED ?? pendingPlans?.data?.length ?? 0;
+  const approvedCount = reviewCounts?.APPROVED ?? 0;
+  const rejectedCount = reviewCounts?.REJECTED ?? 0;
+  const reviewedCount = approvedCount + rejectedCount;
 
   if (isLoading) {
     return (
@@ -612,6 +601,18 @@ const EvaluatorDashboard: React.FC = () => {
                     ))}
                   </tbody>
                 </table>
+                {hasMorePending && (
+                  <div className="flex justify-center py-4">
+                    <button
+                      onClick={() => fetchMorePending()}
+                      disabled={isFetchingMorePending}
+                      className="inline-flex items-center px-4 py-2 border border-gray-300 rounded-md text-sm font-medium text-gray-700 bg-white hover:bg-gray-50 disabled:opacity-50"
+                    >
+                      {isFetchingMorePending && <Loader className="h-4 w-4 animate-spin mr-2" />}
+                      Load more plans
+                    </button>
+                  </div>
+                )}
               </div>
             )}
           </div>
@@ -714,6 +715,18 @@ const EvaluatorDashboard: React.FC = () => {
                     ))}
                   </tbody>
                 </table>
+                {hasMoreReviewed && (
+                  <div className="flex justify-center py-4">
+                    <button
+                      onClick={() => fetchMoreReviewed()}
+                      disabled={isFetchingMoreReviewed}
+                      className="inline-flex items-center px-4 py-2 border border-gray-300 rounded-md text-sm font-medium text-gray-700 bg-white hover:bg-gray-50 disabled:opacity-50"
+                    >
+                      {isFetchingMoreReviewed && <Loader className="h-4 w-4 animate-spin mr-2" />}
+                      Load more plans
+                    </button>
+                  </div>
+                )}
               </div>
             )}
           </div>
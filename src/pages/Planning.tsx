@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { useNavigate } from 'react-router-dom';
 import { 
   Target, 
@@ -39,7 +39,7 @@ import {
   plans, 
   auth,
   activityBudgets,
-  api
+  MAX_PAGE_SIZE
 } from '../lib/api';
 import type { 
   Organization, 
@@ -253,32 +253,18 @@ const PlansTable: React.FC<PlansTableProps> = ({ onCreateNewPlan, userOrgId }) =
     fetchOrganizations();
   }, []);
 
-  // Fetch user's plans
-  const { data: userPlans, isLoading, refetch } = useQuery({
+  // Fetch user's plans, a page at a time
+  const {
+    data: userPlanPages,
+    isLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage
+  } = useInfiniteQuery({
     queryKey: ['user-plans', userOrgId],
-    queryFn: async () => {
-      if (!userOrgId) return { data: [] };
-      
-      try {
-        const response = await api.get('/plans/', {
-          params: { organization: userOrgId }
-        });
-        
-        const plansData = response.data?.results || response.data || [];
-        
-        // Map organization names
-        plansData.forEach((plan: any) => {
-          if (plan.organization && organizationsMap[plan.organization]) {
-            plan.organizationName = organizationsMap[plan.organization];
-          }
-        });
-        
-        return { data: plansData };
-      } catch (error) {
-        console.error('Error fetching user plans:', error);
-        return { data: [] };
-      }
-    },
+    queryFn: ({ pageParam }) => plans.list({ organization__in: userOrgId }, pageParam),
+    initialPageParam: null as string | null,
+    getNextPageParam: lastPage => lastPage.next,
     enabled: !!userOrgId && Object.keys(organizationsMap).length > 0,
     retry: 2
   });
@@ -318,7 +304,11 @@ const PlansTable: React.FC<PlansTableProps> = ({ onCreateNewPlan, userOrgId }) =
     );
   }
 
-  const plans = userPlans?.data || [];
+  // Map organization names
+  const userPlans = (userPlanPages?.pages.flatMap(page => page.results) || []).map((plan: any) => ({
+    ...plan,
+    organizationName: organizationsMap[plan.organization] || plan.organizationName
+  }));
 
   return (
     <div className="bg-white rounded-lg shadow-sm border border-gray-200">
@@ -334,7 +324,7 @@ const PlansTable: React.FC<PlansTableProps> = ({ onCreateNewPlan, userOrgId }) =
           </button>
         </div>
 
-        {plans.length === 0 ? (
+        {userPlans.length === 0 ? (
           <div className="text-center py-12 bg-gray-50 rounded-lg border-2 border-dashed border-gray-200">
             <FileSpreadsheet className="h-12 w-12 text-gray-400 mx-auto mb-4" />
             <h3 className="text-lg font-medium text-gray-900 mb-2">No Plans Created</h3>
@@ -370,7 +360,7 @@ const PlansTable: React.FC<PlansTableProps> = ({ onCreateNewPlan, userOrgId }) =
                 </tr>
               </thead>
               <tbody className="bg-white divide-y divide-gray-200">
-                {plans.map((plan: any) => (
+                {userPlans.map((plan: any) => (
                   <tr key={plan.id} className="hover:bg-gray-50">
                     <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-900">
                       {plan.type}
@@ -401,6 +391,18 @@ const PlansTable: React.FC<PlansTableProps> = ({ onCreateNewPlan, userOrgId }) =
                 ))}
               </tbody>
             </table>
+            {hasNextPage && (
+              <div className="flex justify-center py-4">
+                <button
+                  onClick={() => fetchNextPage()}
+                  disabled={isFetchingNextPage}
+                  className="inline-flex items-center px-4 py-2 border border-gray-300 rounded-md text-sm font-medium text-gray-700 bg-white hover:bg-gray-50 disabled:opacity-50"
+                >
+                  {isFetchingNextPage && <Loader className="h-4 w-4 animate-spin mr-2" />}
+                  Load more plans
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -471,16 +473,17 @@ const Planning: React.FC = () => {
       if (!userOrgId) return;
       
       try {
-        const response = await api.get('/plans/', {
-          params: { organization: userOrgId }
+        // Only the organization's submitted, approved or rejected plans matter here, so filter on the server
+        const page = await plans.list({
+          organization__in: userOrgId,
+          status__in: 'SUBMITTED,APPROVED,REJECTED',
+          page_size: MAX_PAGE_SIZE
         });
         
-        const plans = response.data?.results || response.data || [];
-        
         // Check for existing plans
-        const submittedPlan = plans.find((p: any) => p.status === 'SUBMITTED');
-        const approvedPlan = plans.find((p: any) => p.status === 'APPROVED');
-        const rejectedPlan = plans.find((p: any) => p.status === 'REJECTED');
+        const submittedPlan = page.results.find((p: any) => p.status === 'SUBMITTED');
+        const approvedPlan = page.results.find((p: any) => p.status === 'APPROVED');
+        const rejectedPlan = page.results.find((p: any) => p.status === 'REJECTED');
         
         if (approvedPlan) {
           setPlanStatusInfo({
@@ -825,11 +828,11 @@ const Planning: React.FC = () => {
       
       // Check for existing plans before submitting
       try {
-        const existingPlansResponse = await api.get('/plans/', {
-          params: { organization: userOrgId }
-        });
-        
-        const existingPlans = existingPlansResponse.data?.results || existingPlansResponse.data || [];
+        const existingPlans = (await plans.list({
+          organization__in: userOrgId,
+          status__in: 'SUBMITTED,APPROVED',
+          page_size: MAX_PAGE_SIZE
+        })).results;
         const submittedPlan = existingPlans.find((p: any) => p.status === 'SUBMITTED');
         const approvedPlan = existingPlans.find((p: any) => p.status === 'APPROVED');
         